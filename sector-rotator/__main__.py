@@ -0,0 +1,70 @@
+"""
+__main__.py
+-----------
+One entry point for every script: `python . <command> [args]` from the
+project directory (or `python path/to/sector-rotator <command>`).
+
+Nothing is imported up front. A command runs its script as __main__
+(runpy), so it loads only what that script needs — pandas for most,
+cvxpy / sklearn / matplotlib only on the paths that use them — and the
+dispatcher itself costs no more than a bare interpreter. Index and
+benchmark series are read from the local cache (store/indices.py); only
+`fetch`, `fetch-indices` and `fundamentals` go to the network.
+
+    python . flags
+    python . analyze --rolling 63,252
+    python . fetch-indices --end 2025-04-01
+"""
+
+import os
+import runpy
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+COMMANDS = {
+    "fetch":         ("scripts/fetch_prices.py",      "refresh data/raw from a price source"),
+    "fetch-indices": ("scripts/fetch_indices.py",     "refresh the index / benchmark cache"),
+    "fundamentals":  ("scripts/pull_fund_data.py",    "refresh P/E and fundamentals"),
+    "ingest":        ("scripts/ingest_prices.py",     "build the price store from data/raw"),
+    "factors":       ("scripts/factor_engineer.py",   "factor panel and snapshot"),
+    "pick":          ("scripts/stock_picker.py",      "one stock per sector (or walk-forward)"),
+    "flags":         ("scripts/generate_flags.py",    "sector flags"),
+    "allocate":      ("scripts/run_optimizer.py",     "rule-based sector weights"),
+    "mvo":           ("optimizer/mean_variance.py",   "mean-variance sector weights"),
+    "backtest":      ("backtest/run_backtest.py",     "adaptive-vol-stop backtest"),
+    "analyze":       ("scripts/analyze_backtests.py", "metrics, regimes, benchmark, bootstrap"),
+    "pipeline":      ("scripts/run_pipeline.py",      "incremental end-to-end run"),
+    "sweep":         ("scripts/run_sweep.py",         "parameter sweep"),
+    "results":       ("scripts/query_results.py",     "query recorded runs"),
+    "book":          ("scripts/run_book.py",          "multi-name sector book"),
+    "stream":        ("scripts/stream_flags.py",      "streaming flags"),
+    "daily":         ("scripts/daily_update.py",      "incremental daily update"),
+    "bench":         ("scripts/run_benchmarks.py",    "synthetic-universe benchmarks"),
+    "stub-server":   ("scripts/price_stub_server.py", "local price / fundamentals vendor"),
+}
+
+
+def usage() -> str:
+    lines = ["usage: python . <command> [args]", "", "commands:"]
+    lines += [f"  {name:<14} {help}" for name, (_, help) in COMMANDS.items()]
+    return "\n".join(lines)
+
+
+def main(argv: list) -> None:
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return
+    name, args = argv[0], argv[1:]
+    if name not in COMMANDS:
+        sys.exit(f"unknown command: {name}\n\n{usage()}")
+    path = os.path.join(ROOT, COMMANDS[name][0])
+    # What `python <script>` would set up: argv, and the script's directory
+    # (scripts/ holds config.py) first on the path
+    sys.argv = [path] + args
+    sys.path[:0] = [os.path.dirname(path), ROOT]
+    runpy.run_path(path, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,162 @@
+"""
+montecarlo.py
+-------------
+Block-bootstrap confidence intervals for analyze_backtests' metrics.
+
+The realized daily returns are resampled in blocks, so volatility
+clustering and short-range autocorrelation survive inside each block:
+
+  stationary   block lengths ~ Geometric(1 / block) (Politis & Romano)
+  circular     fixed-length blocks, wrapping around the end of the sample
+
+Every path of a chunk comes from one (paths × days) index array built
+with cumulative sums; no path is built in a Python loop. The benchmark,
+when given, is taken with the same indices, so each resampled day keeps
+its (portfolio, benchmark) pair and alpha / beta are a per-path OLS
+over the days that have both. Paths run in chunks sized to `memory_mb`
+and optionally in a process pool. Chunk c draws from the c-th child of
+SeedSequence(seed), so the result does not depend on `workers`.
+
+    mc = bootstrap(equity, benchmark_returns, n_paths=10_000, block=20)
+    mc.table          # metric × [point, mean, std, lo, hi]
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from backtest.simulate import INITIAL_CAPITAL
+
+N_PATHS = 10_000
+BLOCK = 20          # mean block length in days (~ one trading month)
+METRICS = ["final_value", "total_return", "cagr", "volatility", "sharpe", "max_drawdown",
+           "var_95", "cvar_95", "wins", "losses", "win_loss", "alpha", "beta"]
+
+
+@dataclass
+class MonteCarlo:
+    table: pd.DataFrame       # one row per metric: point, mean, std, lo, hi
+    paths: pd.DataFrame       # one row per path, one column per metric
+    kind: str
+    block: float
+    level: float
+
+
+# ── resampling ────────────────────────────────────────────────────
+def block_indices(rng: np.random.Generator, n_paths: int, n_days: int, n_obs: int,
+                  block: float = BLOCK, kind: str = "stationary") -> np.ndarray:
+    """(n_paths × n_days) indices into a sample of n_obs days, drawn in blocks."""
+    t = np.arange(n_days)
+    if kind == "circular":
+        starts = rng.integers(0, n_obs, size=(n_paths, -(-n_days // int(block))))
+        return (starts[:, t // int(block)] + t % int(block)) % n_obs
+    if kind != "stationary":
+        raise ValueError(f"unknown bootstrap kind: {kind!r}")
+    new = rng.random((n_paths, n_days)) < 1.0 / block
+    new[:, 0] = True
+    # Day at which each day's block began, then that block's random start
+    began = np.maximum.accumulate(np.where(new, t, 0), axis=1)
+    starts = rng.integers(0, n_obs, size=(n_paths, n_days))
+    return (np.take_along_axis(starts, began, axis=1) + t - began) % n_obs
+
+
+def path_metrics(returns: np.ndarray, start_value: float, benchmark: np.ndarray = None,
+                 initial_capital: float = INITIAL_CAPITAL) -> dict:
+    """
+    backtest.simulate.summarize for every row of (paths × days) daily
+    returns, each path starting from start_value; alpha / beta against the
+    matching rows of `benchmark` (NaN days skipped).
+    """
+    P, D = returns.shape
+    equity = start_value * np.cumprod(1 + returns, axis=1)
+    final_value = equity[:, -1]
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), start_value)
+    var_95 = np.percentile(returns, 5, axis=1)
+    tail = returns <= var_95[:, None]
+    wins, losses = (returns > 0).sum(axis=1), (returns < 0).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cagr = (final_value / initial_capital) ** (252 / D) - 1
+        volatility = returns.std(axis=1, ddof=1) * np.sqrt(252)
+        out = {
+            "final_value": final_value,
+            "total_return": final_value - initial_capital,
+            "cagr": cagr,
+            "volatility": volatility,
+            "sharpe": cagr / volatility,
+            "max_drawdown": np.minimum((equity / peak - 1).min(axis=1), 0.0),
+            "var_95": var_95,
+            "cvar_95": np.where(tail, returns, 0).sum(axis=1) / tail.sum(axis=1),
+            "wins": wins.astype(float),
+            "losses": losses.astype(float),
+            "win_loss": np.where(losses != 0, wins / np.maximum(losses, 1), np.nan),
+        }
+        if benchmark is not None:
+            both = np.isfinite(benchmark)
+            n = both.sum(axis=1)
+            x, y = np.where(both, benchmark, 0.0), np.where(both, returns, 0.0)
+            mx, my = x.sum(axis=1) / n, y.sum(axis=1) / n
+            sxy = (x * y).sum(axis=1) - n * mx * my
+            sxx = (x * x).sum(axis=1) - n * mx * mx
+            out["beta"] = sxy / sxx
+            out["alpha"] = my - out["beta"] * mx
+    return out
+
+
+def _chunk(returns: np.ndarray, benchmark, start_value: float, initial_capital: float, n_paths: int,
+           block: float, kind: str, seed) -> dict:
+    rng = np.random.default_rng(seed)
+    idx = block_indices(rng, n_paths, len(returns), len(returns), block, kind)
+    return path_metrics(returns[idx], start_value, None if benchmark is None else benchmark[idx], initial_capital)
+
+
+def _chunk_paths(n_days: int, memory_mb: float) -> int:
+    # Index, resampled returns, equity and peak arrays, plus temporaries
+    return max(1, int(memory_mb * 2 ** 20 // (n_days * 8 * 8)))
+
+
+# ── driver ────────────────────────────────────────────────────────
+def bootstrap(equity: pd.Series, benchmark_returns: pd.Series = None, n_paths: int = N_PATHS,
+              block: float = BLOCK, kind: str = "stationary", level: float = 0.95, seed: int = 0,
+              workers: int = 1, memory_mb: float = 256,
+              initial_capital: float = INITIAL_CAPITAL) -> MonteCarlo:
+    """
+    Resample the equity curve's daily returns n_paths times and summarize
+    every path. benchmark_returns (date-indexed) is aligned to the
+    portfolio's return dates and resampled jointly with them. `level` is
+    the two-sided percentile interval.
+    """
+    returns = equity.pct_change().dropna()
+    bench = None
+    if benchmark_returns is not None:
+        bench = benchmark_returns.reindex(returns.index).to_numpy(dtype=float)
+    r = returns.to_numpy(dtype=float)
+    start_value = float(equity.iloc[0])
+
+    per_chunk = min(_chunk_paths(len(r), memory_mb), n_paths)
+    sizes = [min(per_chunk, n_paths - a) for a in range(0, n_paths, per_chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(r, bench, start_value, initial_capital, n, block, kind, s) for n, s in zip(sizes, seeds)]
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(args) == 1:
+        parts = [_chunk(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(args))) as pool:
+            parts = list(pool.map(_chunk, *zip(*args)))
+    paths = pd.DataFrame({m: np.concatenate([p[m] for p in parts]) for m in parts[0]})
+    paths = paths[[m for m in METRICS if m in paths]]
+
+    point = path_metrics(r[None, :], start_value, None if bench is None else bench[None, :], initial_capital)
+    lo, hi = (1 - level) / 2, (1 + level) / 2
+    table = pd.DataFrame({
+        "point": {m: point[m][0] for m in paths},
+        "mean": paths.mean(),
+        "std": paths.std(),
+        "lo": paths.quantile(lo),
+        "hi": paths.quantile(hi),
+    })
+    table.index.name = "metric"
+    return MonteCarlo(table, paths, kind, block, level)
@@ -0,0 +1,187 @@
+"""
+ranges.py
+---------
+Performance statistics of an equity curve over arbitrary date ranges,
+each answered in O(1) from an index built once in O(n log n):
+
+  prefix sums of daily returns and squared returns → volatility
+  log equity                                       → return / CAGR
+  a disjoint sparse table over log equity          → range max / min and
+                                                     max drawdown
+
+The sparse table stores, at every level h, for each 2^h-point block,
+suffix aggregates running left from the block's midpoint and prefix
+aggregates running right from it. A range [i, j] sits across the
+midpoint of exactly one block (level = highest bit of i ^ j), so its
+max / min come from one suffix and one prefix entry, and its max
+drawdown is the worst of the suffix's, the prefix's and (suffix peak →
+prefix trough). Ordinary overlapping sparse tables cannot do the last
+part: the overlap would pair a later peak with an earlier trough.
+
+Queries take arrays of ranges, so thousands of regimes, every calendar
+period and every (start, end) pair of a heatmap are one vectorized call.
+A range covers the equity points from the first date ≥ start to the
+last date ≤ end; like analyze_backtests' regime table, CAGR uses
+(points / 252) years and Sharpe is CAGR / volatility.
+
+    ix = PerformanceIndex(equity)
+    ix.stats({"COVID Crash": ("2020-02-01", "2020-04-30")})
+    ix.stats(pd.DataFrame({"start": starts, "end": ends}))    # thousands at once
+    ix.monthly()          # year × month returns
+    ix.heatmap("Y")       # CAGR from the start of one year to the end of another
+"""
+
+import numpy as np
+import pandas as pd
+
+PERIODS = 252
+STATS = ["start", "end", "days", "total_return", "cagr", "volatility", "sharpe", "max_drawdown"]
+
+
+class PerformanceIndex:
+    """Range-query index over one equity curve (date-indexed Series)."""
+
+    def __init__(self, equity: pd.Series, periods: int = PERIODS):
+        self.dates = pd.DatetimeIndex(equity.index)
+        self.periods = periods
+        values = equity.to_numpy(dtype=float)
+        self.values = values
+        self.log = np.log(values)
+        returns = np.concatenate([[0.0], values[1:] / values[:-1] - 1])
+        self._s1 = np.cumsum(returns)
+        self._s2 = np.cumsum(returns ** 2)
+        self._build()
+
+    def __len__(self):
+        return len(self.values)
+
+    # ── index ─────────────────────────────────────────────────────
+    def _build(self) -> None:
+        n = len(self.log)
+        levels = max(1, int(np.ceil(np.log2(max(n, 2)))))
+        size = 1 << levels
+        x = np.full(size, np.nan)
+        x[:n] = self.log
+        self._max, self._min, self._dd = (np.empty((levels + 1, size)) for _ in range(3))
+        for h in range(1, levels + 1):
+            blocks = x.reshape(-1, 1 << h)
+            half = 1 << (h - 1)
+            left, right = blocks[:, :half][:, ::-1], blocks[:, half:]    # both run away from the midpoint
+            # Left half, read right to left: aggregates of [i, mid)
+            l_max = np.fmax.accumulate(left, axis=1)
+            l_min = np.fmin.accumulate(left, axis=1)
+            l_dd = np.fmax.accumulate(left - np.fmin.accumulate(left, axis=1), axis=1)
+            # Right half, left to right: aggregates of [mid, j]
+            r_max = np.fmax.accumulate(right, axis=1)
+            r_min = np.fmin.accumulate(right, axis=1)
+            r_dd = np.fmax.accumulate(r_max - right, axis=1)
+            for table, l, r in ((self._max, l_max, r_max), (self._min, l_min, r_min), (self._dd, l_dd, r_dd)):
+                table[h] = np.concatenate([l[:, ::-1], r], axis=1).ravel()
+
+    def _aggregate(self, i: np.ndarray, j: np.ndarray) -> tuple:
+        """(max, min, max drop) of log equity over points [i, j], i ≤ j."""
+        same = i == j
+        h = np.where(same, 1, np.frexp(np.bitwise_xor(i, j).astype(float))[1])
+        hi = np.fmax(self._max[h, i], self._max[h, j])
+        lo = np.fmin(self._min[h, i], self._min[h, j])
+        dd = np.fmax(np.fmax(self._dd[h, i], self._dd[h, j]), self._max[h, i] - self._min[h, j])
+        point = self.log[i]
+        return np.where(same, point, hi), np.where(same, point, lo), np.where(same, 0.0, dd)
+
+    def positions(self, starts, ends) -> tuple:
+        """Point ranges for date ranges: first date ≥ start, last date ≤ end."""
+        starts = pd.DatetimeIndex(np.atleast_1d(pd.to_datetime(starts)))
+        ends = pd.DatetimeIndex(np.atleast_1d(pd.to_datetime(ends)))
+        i = np.searchsorted(self.dates, starts, side="left")
+        j = np.searchsorted(self.dates, ends, side="right") - 1
+        return i, j
+
+    # ── queries ───────────────────────────────────────────────────
+    def query(self, i, j) -> dict:
+        """Stats (arrays) for point ranges [i, j]; empty ranges give NaN."""
+        i, j = np.atleast_1d(np.asarray(i, dtype=np.int64)), np.atleast_1d(np.asarray(j, dtype=np.int64))
+        ok = (i <= j) & (i >= 0) & (j < len(self))
+        a, b = np.where(ok, i, 0), np.where(ok, j, 0)
+        points = np.where(ok, b - a + 1, 0)
+        m = b - a                                        # daily returns inside the range
+        _, _, drop = self._aggregate(a, b)
+        s1 = self._s1[b] - self._s1[a]
+        s2 = self._s2[b] - self._s2[a]
+        growth = self.log[b] - self.log[a]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            var = np.clip(s2 - s1 * s1 / m, 0.0, None) / (m - 1)
+            vol = np.where(m > 1, np.sqrt(var) * np.sqrt(self.periods), np.nan)
+            cagr = np.exp(growth * self.periods / points) - 1
+            out = {
+                "days": points,
+                "total_return": np.expm1(growth),
+                "cagr": cagr,
+                "volatility": vol,
+                "sharpe": cagr / vol,
+                "max_drawdown": np.expm1(-drop) + 0.0,       # no -0.0 for flat ranges
+            }
+        return {k: np.where(ok, v, np.nan) if k != "days" else v for k, v in out.items()}
+
+    def range_max(self, i, j) -> np.ndarray:
+        """Highest equity value over point ranges [i, j]."""
+        return np.exp(self._aggregate(np.asarray(i), np.asarray(j))[0])
+
+    def range_min(self, i, j) -> np.ndarray:
+        """Lowest equity value over point ranges [i, j]."""
+        return np.exp(self._aggregate(np.asarray(i), np.asarray(j))[1])
+
+    def stats(self, ranges) -> pd.DataFrame:
+        """
+        One row per range: a {name: (start, end)} dict, or a DataFrame with
+        start / end columns (its index names the rows).
+        """
+        if isinstance(ranges, dict):
+            ranges = pd.DataFrame(list(ranges.values()), index=list(ranges), columns=["start", "end"])
+        i, j = self.positions(ranges["start"], ranges["end"])
+        out = pd.DataFrame(self.query(i, j), index=ranges.index)
+        out.insert(0, "start", ranges["start"].values)
+        out.insert(1, "end", ranges["end"].values)
+        return out[STATS]
+
+    # ── calendar tables ───────────────────────────────────────────
+    def _period_ends(self, freq: str) -> tuple:
+        """(period labels, last point of each period)."""
+        periods = self.dates.to_period(freq)
+        last = np.flatnonzero(np.append(periods[1:] != periods[:-1], True))
+        return periods[last], last
+
+    def periods_table(self, freq: str = "M") -> pd.DataFrame:
+        """
+        Stats of every calendar period. A period runs from the previous
+        period's last close (the first point, for the first period), so
+        period returns chain to the whole-curve return.
+        """
+        labels, last = self._period_ends(freq)
+        first = np.concatenate([[0], last[:-1]])
+        out = pd.DataFrame(self.query(first, last), index=pd.Index(labels, name="period"))
+        out.insert(0, "start", self.dates[first])
+        out.insert(1, "end", self.dates[last])
+        return out[STATS]
+
+    def monthly(self) -> pd.DataFrame:
+        """Year × month table of monthly returns, plus the year's return."""
+        table = self.periods_table("M")
+        wide = pd.DataFrame({"year": table.index.year, "month": table.index.month,
+                             "ret": table["total_return"].values})
+        wide = wide.pivot(index="year", columns="month", values="ret")
+        yearly = self.periods_table("Y")["total_return"]
+        wide["total"] = yearly.values
+        return wide
+
+    def heatmap(self, freq: str = "Y", metric: str = "cagr") -> pd.DataFrame:
+        """
+        `metric` from the start of every period (rows) to the end of every
+        later period (columns), all pairs in one query; NaN below the diagonal.
+        """
+        labels, last = self._period_ends(freq)
+        first = np.concatenate([[0], last[:-1]])
+        a, b = np.meshgrid(first, last, indexing="ij")
+        values = self.query(a.ravel(), b.ravel())[metric].reshape(a.shape)
+        upper = np.triu(np.ones(a.shape, dtype=bool))
+        return pd.DataFrame(np.where(upper, values, np.nan), index=pd.Index(labels, name="from"),
+                            columns=pd.Index(labels, name="to"))
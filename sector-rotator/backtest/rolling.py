@@ -0,0 +1,233 @@
+"""
+rolling.py
+----------
+Rolling risk metrics over (T × C) daily returns — one column per curve
+(portfolio, sweep point, bootstrap path, ...) — for any number of window
+lengths, each computed in one pass over the rows:
+
+  vol / sharpe       annualized stdev and mean / stdev (0% risk-free),
+                     from signals.lib's block-scan rolling sums
+  drawdown           equity / peak of the trailing window - 1
+  max_drawdown       worst peak-to-trough drop inside the window
+  var / cvar         historical VaR (np.percentile's linear rule, as in
+                     summarize) and the mean of the returns at or below it
+  alpha / beta       OLS of the curve on a benchmark, from rolling sums
+                     of x, y, xy and x²
+
+The window max drawdown uses the block decomposition of lib's rolling
+max: a window of w returns spans w + 1 equity points, which are a suffix
+of one (w + 1)-point block plus a prefix of the next, and its drawdown is
+the worst of the suffix's own, the prefix's own and (suffix peak →
+prefix trough). All of those are ufunc scans over log equity, so it is
+O(T) per window with no loop over rows. VaR / CVaR slide a sorted copy
+of each window, one insert and one delete per row, compiled with numba
+when installed; the NumPy fallback partitions strided windows in row
+chunks.
+
+A window holding a NaN gives NaN, like pandas' rolling(window).
+
+    metrics = rolling_metrics(returns, windows=(63, 252), benchmark=nifty)
+    metrics[252]["cvar"]                                   # (T × C)
+    frame = rolling_frame(portfolio_returns, (63, 252), nifty_returns)
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from signals import lib
+
+METRICS = ["vol", "sharpe", "drawdown", "max_drawdown", "var", "cvar", "alpha", "beta"]
+PERIODS = 252
+ROW_CHUNK = 512     # windows partitioned together by the NumPy VaR path
+
+
+# ── moments ───────────────────────────────────────────────────────
+def rolling_vol(returns, window: int, periods: int = PERIODS) -> np.ndarray:
+    return lib.rolling_std(returns, window) * np.sqrt(periods)
+
+
+def rolling_sharpe(returns, window: int, periods: int = PERIODS) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return lib.rolling_mean(returns, window) / lib.rolling_std(returns, window) * np.sqrt(periods)
+
+
+def rolling_beta(returns, benchmark, window: int) -> tuple:
+    """(alpha, beta) of each column on the benchmark (T,) or (T × C); alpha is per day."""
+    y, squeeze = lib._panel(returns)
+    x = np.broadcast_to(lib._panel(benchmark)[0], y.shape)
+    both = np.isfinite(x) & np.isfinite(y)
+    x, y = np.where(both, x, np.nan), np.where(both, y, np.nan)
+    sx, sy = lib.rolling_sum(x, window), lib.rolling_sum(y, window)
+    sxy, sxx = lib.rolling_sum(x * y, window), lib.rolling_sum(x * x, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = (sxy - sx * sy / window) / (sxx - sx * sx / window)
+    alpha = (sy - beta * sx) / window
+    return lib._out(alpha, squeeze), lib._out(beta, squeeze)
+
+
+# ── drawdowns ─────────────────────────────────────────────────────
+def _levels(r: np.ndarray) -> np.ndarray:
+    """Log equity points: row 0 is the start (0), row k + 1 follows return row k."""
+    return np.vstack([np.zeros((1, r.shape[1])), np.cumsum(np.log1p(np.where(np.isfinite(r), r, 0.0)), axis=0)])
+
+
+def rolling_drawdown(returns, window: int) -> np.ndarray:
+    """Equity over its peak across the window's w + 1 equity points, minus 1."""
+    r, squeeze = lib._panel(returns)
+    level = _levels(r)
+    peak = lib.rolling_max(level, window + 1)[1:]
+    return lib._out(np.where(lib._full(r, window), np.expm1(level[1:] - peak), np.nan), squeeze)
+
+
+def rolling_max_drawdown(returns, window: int) -> np.ndarray:
+    """Max drawdown (≤ 0) of the equity path over each trailing window of returns."""
+    r, squeeze = lib._panel(returns)
+    T, C = r.shape
+    out = np.full((T, C), np.nan)
+    if T < window:
+        return lib._out(out, squeeze)
+    level = _levels(r)
+    m = window + 1                                          # equity points per window
+    blocks, n = lib._blocks(level, m, np.nan)               # nb × m × C
+
+    # Prefix (block start → row): lowest point and worst drop so far
+    pre_min = np.fmin.accumulate(blocks, axis=1)
+    pre_dd = np.fmax.accumulate(np.fmax.accumulate(blocks, axis=1) - blocks, axis=1)
+    # Suffix (row → block end): highest point and worst drop within it
+    rev = blocks[:, ::-1]
+    suf_max = np.fmax.accumulate(rev, axis=1)[:, ::-1]
+    suf_dd = np.fmax.accumulate(rev - np.fmin.accumulate(rev, axis=1), axis=1)[:, ::-1]
+    pre_min, pre_dd, suf_max, suf_dd = (a.reshape(-1, C)[:n] for a in (pre_min, pre_dd, suf_max, suf_dd))
+
+    end = np.arange(m - 1, n)                               # last point of each window
+    s = end - m + 1
+    dd = np.fmax(np.fmax(suf_dd[s], pre_dd[end]), suf_max[s] - pre_min[end])
+    aligned = s % m == 0                                    # the window is one whole block
+    dd[aligned] = pre_dd[end[aligned]]
+    out[window - 1:] = np.expm1(-dd)
+    return lib._out(np.where(lib._full(r, window), out, np.nan), squeeze)
+
+
+# ── VaR / CVaR ────────────────────────────────────────────────────
+def _var_loop(x, window, q, var, cvar):
+    # One sorted buffer per column: drop the row leaving the window, insert
+    # the new one (NaN kept as +inf, counted), read the order statistics
+    T, C = x.shape
+    pos = q * (window - 1)
+    lo = int(math.floor(pos))
+    hi = min(lo + 1, window - 1)
+    frac = pos - lo
+    buf = np.empty(window + 1)
+    for j in range(C):
+        n = 0
+        nans = 0
+        for t in range(T):
+            v = x[t, j]
+            if v != v:
+                v = np.inf
+                nans += 1
+            k = np.searchsorted(buf[:n], v)
+            buf[k + 1:n + 1] = buf[k:n].copy()
+            buf[k] = v
+            n += 1
+            if t >= window:
+                old = x[t - window, j]
+                if old != old:
+                    old = np.inf
+                    nans -= 1
+                k = np.searchsorted(buf[:n], old)
+                buf[k:n - 1] = buf[k + 1:n].copy()
+                n -= 1
+            if n == window and nans == 0:
+                level = buf[lo] + frac * (buf[hi] - buf[lo])
+                total = 0.0
+                count = 0
+                for i in range(window):
+                    if buf[i] > level:
+                        break
+                    total += buf[i]
+                    count += 1
+                var[t, j] = level
+                cvar[t, j] = total / count
+    return var, cvar
+
+
+def _var_numpy(x, window, q, var, cvar):
+    pos = q * (window - 1)
+    lo = int(math.floor(pos))
+    hi = min(lo + 1, window - 1)
+    windows = sliding_window_view(x, window, axis=0)        # (T - w + 1) × C × w
+    for a in range(0, len(windows), ROW_CHUNK):
+        win = windows[a:a + ROW_CHUNK]
+        part = np.partition(win, [lo, hi], axis=-1)
+        level = part[..., lo] + (pos - lo) * (part[..., hi] - part[..., lo])
+        tail = win <= level[..., None]
+        var[window - 1 + a:window - 1 + a + len(win)] = level
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cvar[window - 1 + a:window - 1 + a + len(win)] = np.where(tail, win, 0).sum(axis=-1) / tail.sum(axis=-1)
+    return var, cvar
+
+
+def rolling_var(returns, window: int, level: float = 0.95, compiled=None) -> tuple:
+    """(VaR, CVaR) at `level` over each trailing window; both are returns (negative for losses)."""
+    r, squeeze = lib._panel(returns)
+    var = np.full(r.shape, np.nan)
+    cvar = np.full(r.shape, np.nan)
+    if len(r) >= window:
+        kernel = lib.jit(_var_loop) if compiled is not False else None
+        if compiled is None:
+            compiled = kernel is not None
+        if compiled:
+            if kernel is None:
+                raise ImportError("compiled VaR kernel needs numba")
+            kernel(np.ascontiguousarray(r), window, 1 - level, var, cvar)
+        else:
+            _var_numpy(r, window, 1 - level, var, cvar)
+    full = lib._full(r, window)
+    return lib._out(np.where(full, var, np.nan), squeeze), lib._out(np.where(full, cvar, np.nan), squeeze)
+
+
+# ── all together ──────────────────────────────────────────────────
+def rolling_metrics(returns, windows=(63, 252), benchmark=None, level: float = 0.95,
+                    periods: int = PERIODS, compiled=None) -> dict:
+    """
+    {window: {metric: array shaped like returns}} for every window length;
+    alpha / beta only with a benchmark (T,) or matching returns' shape.
+    """
+    out = {}
+    for w in windows:
+        var, cvar = rolling_var(returns, w, level, compiled)
+        out[w] = {
+            "vol": rolling_vol(returns, w, periods),
+            "sharpe": rolling_sharpe(returns, w, periods),
+            "drawdown": rolling_drawdown(returns, w),
+            "max_drawdown": rolling_max_drawdown(returns, w),
+            "var": var,
+            "cvar": cvar,
+        }
+        if benchmark is not None:
+            out[w]["alpha"], out[w]["beta"] = rolling_beta(returns, benchmark, w)
+    return out
+
+
+def rolling_frame(returns, windows=(63, 252), benchmark=None, level: float = 0.95,
+                  periods: int = PERIODS, compiled=None) -> pd.DataFrame:
+    """
+    rolling_metrics on a date-indexed Series / DataFrame of returns (a
+    Series benchmark is aligned to it). Columns are (window, metric) for a
+    Series and (window, metric, series) for a DataFrame.
+    """
+    frame = returns.to_frame() if isinstance(returns, pd.Series) else returns
+    bench = None if benchmark is None else benchmark.reindex(frame.index).to_numpy(dtype=float)
+    metrics = rolling_metrics(frame.to_numpy(dtype=float), windows, bench, level, periods, compiled)
+    parts = {}
+    for w, values in metrics.items():
+        for name, arr in values.items():
+            for j, col in enumerate(frame.columns):
+                parts[(w, name, col)] = arr[:, j]
+    out = pd.DataFrame(parts, index=frame.index)
+    out.columns.names = ["window", "metric", "series"]
+    return out.droplevel("series", axis=1) if isinstance(returns, pd.Series) else out
@@ -0,0 +1,206 @@
+"""
+simulate.py
+-----------
+The backtest of run_backtest.py on in-memory inputs:
+
+    weights (D-1 rows) × selected stocks' returns → adaptive-vol stop → equity
+
+Weight row i earns return row i of the last D bars (D = shortest flag
+series); the final bar has no weights yet and earns 0. `summarize` gives
+analyze_backtests' headline metrics for an equity curve. simulate_book is
+the same for a book of several names per sector.
+
+    result = simulate(weights, flags, selected, load_panel())
+    save(result)
+"""
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from store.prices import simple_returns
+from backtest.stops import apply_stops
+
+OUT_DIR = "data/backtest"
+REPORT_DIR = "report"
+INITIAL_CAPITAL = 1_000_000
+
+
+@dataclass
+class Backtest:
+    equity: pd.Series         # PortfolioValue, stops applied
+    returns: pd.Series        # daily portfolio returns, stops applied
+    active: pd.Series         # 1 while the stop lets the portfolio trade
+    rolling_30d: pd.Series    # 30-day equity change in %
+    flat_days: pd.Series      # weight rows with no exposure
+
+
+def simulate(weights: pd.DataFrame, flags: dict, selected: dict, panel, k: float = 0.125,
+             lookback: int = 30, initial_capital: float = INITIAL_CAPITAL, verbose: bool = True) -> Backtest:
+    flat_days = weights.abs().sum(axis=1) == 0
+    min_signal_len = min(len(f) for f in flags.values())
+
+    # Collect returns
+    available = {}
+    for sector, symbol in selected.items():
+        if symbol not in panel.symbols:
+            if verbose:
+                print(f"⚠ Missing data for {symbol}, skipping.")
+            continue
+        available[sector] = symbol
+
+    prices = panel.select(available.values())
+    ret = simple_returns(prices.field("close"))
+    ret[0] = 0
+    rets = {sector: ret[-min_signal_len:, j] for j, sector in enumerate(available)}
+    sample_dates = pd.Series(pd.to_datetime(prices.dates[-min_signal_len:]), name="date")
+
+    rets_df = pd.DataFrame(rets).reset_index(drop=True)
+
+    # Align to signal length
+    weights = weights.iloc[-min_signal_len:].reset_index(drop=True)
+    rets_df = rets_df.iloc[-min_signal_len:].reset_index(drop=True)
+
+    # Portfolio returns and equity
+    portfolio_returns = (weights * rets_df).sum(axis=1)
+    return _overlay(portfolio_returns, sample_dates, flat_days, k, lookback, initial_capital)
+
+
+def simulate_book(weights: pd.DataFrame, flags: dict, book: dict, panel, k: float = 0.125,
+                  lookback: int = 30, initial_capital: float = INITIAL_CAPITAL, verbose: bool = True) -> Backtest:
+    """
+    simulate() for a multi-name book ({sector: [lead, ...]}) and the name-level
+    weights of optimizer.hierarchical.book_allocate. The calendar is the
+    leads' common dates; a name without a bar that day earns 0.
+
+    Weight row d is estimated from the returns before book_allocate's row
+    d (its rets[1:]), so it earns the return of the next date: returns are
+    cut the same way here and never reach back into their window.
+    """
+    from optimizer.hierarchical import book_returns
+
+    flat_days = weights.abs().sum(axis=1) == 0
+    min_signal_len = min(len(f) for f in flags.values())
+
+    sectors = []
+    for sector, names in book.items():
+        if not names or names[0] not in panel.symbols:
+            if verbose:
+                print(f"⚠ Missing data for {sector} lead, skipping.")
+            continue
+        sectors.append(sector)
+
+    dates, names, _, ret = book_returns(book, panel, sectors)
+    n = min(min_signal_len, len(ret) - 1)
+    ret = np.nan_to_num(ret[1:][-n:])
+    sample_dates = pd.Series(pd.to_datetime(dates[1:][-n:]), name="date")
+
+    w = weights.reindex(columns=names, fill_value=0.0).values[-n:]
+    portfolio_returns = pd.Series(np.einsum("dn,dn->d", w, ret[:len(w)]))
+    portfolio_returns = portfolio_returns.reindex(range(len(ret)), fill_value=0.0)
+    return _overlay(portfolio_returns, sample_dates, flat_days, k, lookback, initial_capital)
+
+
+def _overlay(portfolio_returns: pd.Series, sample_dates: pd.Series, flat_days: pd.Series, k: float,
+             lookback: int, initial_capital: float) -> Backtest:
+    equity_curve = (1 + portfolio_returns).cumprod()
+    equity_curve.name = "PortfolioValue"
+    equity_curve.index = sample_dates
+    equity_curve.index.name = "Date"
+    portfolio_returns.index = sample_dates
+
+    # Risk overlays: adaptive drawdown stop at k × `lookback`-day annualized vol,
+    # back in at a new equity high
+    active = apply_stops(portfolio_returns.values, kind="adaptive_vol", k=k, lookback=lookback)[:, 0, 0]
+    active = pd.Series(active, index=equity_curve.index)
+
+    # Apply stops
+    portfolio_returns = portfolio_returns * active
+    equity_curve = (1 + portfolio_returns).cumprod()
+    equity_curve = equity_curve * initial_capital
+
+    # Rolling 30-day returns
+    rolling_30d_return = equity_curve.pct_change(periods=30, fill_method=None) * 100
+    rolling_30d_return = rolling_30d_return.dropna()
+    rolling_30d_return.name = "Rolling30dReturn"
+
+    return Backtest(equity_curve, portfolio_returns, active, rolling_30d_return, flat_days)
+
+
+def save(result: Backtest, out_dir: str = OUT_DIR) -> str:
+    """Write portfolio_value.csv and rolling_30d_return.csv; returns the former's path."""
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = f"{out_dir}/portfolio_value.csv"
+    result.equity.to_frame(name="PortfolioValue").to_csv(out_path)
+    result.rolling_30d.to_csv(f"{out_dir}/rolling_30d_return.csv")
+    return out_path
+
+
+def load(out_dir: str = OUT_DIR) -> pd.Series:
+    """The saved equity curve."""
+    equity = pd.read_csv(f"{out_dir}/portfolio_value.csv", parse_dates=["date"]).set_index("date")
+    return equity["PortfolioValue"]
+
+
+def plot(result: Backtest, report_dir: str = REPORT_DIR) -> list:
+    """Daily-return and rolling-30d charts under report_dir; returns the paths."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    os.makedirs(report_dir, exist_ok=True)
+    rolling_30d_return = result.rolling_30d
+    avg_full = rolling_30d_return.mean()
+
+    # Plot daily returns
+    plt.figure(figsize=(10, 4))
+    result.returns.plot(color="green", title="Daily Portfolio Returns")
+    plt.axhline(0, linestyle="--", color="gray")
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig(f"{report_dir}/daily_returns.png")
+    plt.close()
+
+    # Plot rolling 30-day return
+    plt.figure(figsize=(10, 4))
+    plt.plot(rolling_30d_return, color='orange', label="30-Day Rolling Return (%)")
+    plt.axhline(0, linestyle='--', color='gray')
+    plt.axhline(avg_full, linestyle='--', color='blue', label=f"Avg: {avg_full:.2f}%")
+    plt.title("Rolling 30-Day Portfolio Return")
+    plt.xlabel("Days")
+    plt.ylabel("Return (%)")
+    plt.legend()
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig(f"{report_dir}/rolling_30d_return.png")
+    plt.close()
+    return [f"{report_dir}/daily_returns.png", f"{report_dir}/rolling_30d_return.png"]
+
+
+def summarize(equity: pd.Series, initial_capital: float = INITIAL_CAPITAL) -> dict:
+    """analyze_backtests' performance summary of one equity curve."""
+    returns = equity.pct_change().dropna()
+    final_value = equity.iloc[-1]
+    n_years = len(returns) / 252
+    cagr = (final_value / initial_capital) ** (1 / n_years) - 1
+    volatility = returns.std() * np.sqrt(252)
+    drawdown = equity / equity.cummax() - 1
+    var_95 = np.percentile(returns, 5)
+    wins = (returns > 0).sum()
+    losses = (returns < 0).sum()
+    return {
+        "initial_capital": initial_capital,
+        "final_value": final_value,
+        "total_return": final_value - initial_capital,
+        "cagr": cagr,
+        "volatility": volatility,
+        "sharpe": cagr / volatility,
+        "max_drawdown": drawdown.min(),
+        "var_95": var_95,
+        "cvar_95": returns[returns <= var_95].mean(),
+        "wins": wins,
+        "losses": losses,
+        "win_loss": wins / losses if losses != 0 else np.nan,
+    }
@@ -0,0 +1,353 @@
+"""
+stops.py
+--------
+Trailing-stop overlays for equity curves.
+
+A stop looks at the *unstopped* curve of each strategy and decides, bar
+by bar, whether the strategy is invested (1) or in cash (0). Exit and
+re-entry conditions are computed for every bar up front as arrays; only
+the in-cash / invested state machine is sequential, and it runs over all
+curves × parameter sets at once (NumPy across columns, or a compiled
+per-column loop when numba is installed).
+
+Exit rules (`kind`):
+  adaptive_vol   drawdown < -k × rolling `lookback`-day annualized vol
+  fixed_pct      drawdown < -pct
+  time           drawdown < -pct, and re-enter after `hold` bars in cash
+  rsi            RSI(equity, rsi_window) < rsi_exit; re-enter when > rsi_entry
+
+Every kind except rsi also re-enters at a new equity high, and any kind
+re-enters after `hold` bars when hold > 0. The exit bar itself is already
+flat, as in the original run_backtest loop.
+"""
+
+import inspect
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from signals.lib import jit, rsi
+from signals.streaming import Stateful
+from store.chunks import plan
+
+KINDS = ("adaptive_vol", "fixed_pct", "time", "rsi")
+
+
+def _state_machine_numpy(exit_, reentry, hold, in_cash, count):
+    T, M = exit_.shape
+    active = np.ones((T, M), dtype=np.int8)
+    for i in range(1, T):
+        leave = in_cash & (reentry[i] | ((hold > 0) & (count >= hold)))
+        stay = in_cash & ~leave
+        enter = ~in_cash & exit_[i]
+        count = np.where(stay, count + 1, np.where(enter, 1, 0))
+        in_cash = stay | enter
+        active[i] = ~in_cash
+    return active, in_cash, count
+
+
+def _state_machine_loop(exit_, reentry, hold, in_cash, count):
+    # Same transitions as the NumPy version, one scalar at a time; row-major
+    # so the compiled version walks memory in order
+    T, M = exit_.shape
+    active = np.ones((T, M), dtype=np.int8)
+    for i in range(1, T):
+        for j in range(M):
+            if in_cash[j]:
+                if reentry[i, j] or (hold[j] > 0 and count[j] >= hold[j]):
+                    in_cash[j] = False
+                    count[j] = 0
+                else:
+                    count[j] += 1
+            elif exit_[i, j]:
+                in_cash[j] = True
+                count[j] = 1
+            active[i, j] = 0 if in_cash[j] else 1
+    return active, in_cash, count
+
+
+def state_machine(exit_, reentry, hold=0, in_cash=None, count=None, compiled=None):
+    """
+    Run the stop state machine over (T × M) boolean exit / re-entry
+    arrays. Bar 0 is always invested. `in_cash` / `count` (M,) carry the
+    state in from a previous call and the final state is returned:
+    (active (T × M) int8, in_cash (M,), count (M,)).
+    """
+    exit_ = np.asarray(exit_, dtype=bool)
+    reentry = np.asarray(reentry, dtype=bool)
+    T, M = exit_.shape
+    hold = np.broadcast_to(np.asarray(hold, dtype=np.int64), (M,)).copy()
+    in_cash = np.zeros(M, dtype=bool) if in_cash is None else np.asarray(in_cash, dtype=bool).copy()
+    count = np.zeros(M, dtype=np.int64) if count is None else np.asarray(count, dtype=np.int64).copy()
+    kernel = jit(_state_machine_loop) if compiled is not False else None
+    if compiled is None:
+        compiled = kernel is not None
+    if compiled:
+        if kernel is None:
+            raise ImportError("compiled stop kernel needs numba")
+        return kernel(exit_, reentry, hold, in_cash, count)
+    return _state_machine_numpy(exit_, reentry, hold, in_cash, count)
+
+
+def _grid(params: dict) -> tuple:
+    """Broadcast scalar / 1-D parameter values to a common length P; returns (params, P)."""
+    arrays = {name: np.atleast_1d(np.asarray(v)) for name, v in params.items()}
+    P = max(len(a) for a in arrays.values())
+    for name, a in arrays.items():
+        if len(a) not in (1, P):
+            raise ValueError(f"parameter {name} has {len(a)} values, expected 1 or {P}")
+    return {name: np.broadcast_to(a, (P,)) for name, a in arrays.items()}, P
+
+
+def _equity(r, equity0=None, peak0=None) -> tuple:
+    """Equity (T × C) from returns and its running peak, continuing from equity0 / peak0 (C,)."""
+    C = r.shape[1]
+    start = np.ones((1, C)) if equity0 is None else np.asarray(equity0, dtype="float64").reshape(1, C)
+    peak = np.full((1, C), -np.inf) if peak0 is None else np.asarray(peak0, dtype="float64").reshape(1, C)
+    equity = np.cumprod(np.concatenate([start, 1 + r]), axis=0)[1:]
+    return equity, np.maximum.accumulate(np.concatenate([peak, equity]), axis=0)[1:]
+
+
+def stop_conditions(returns, kind="adaptive_vol", k=0.125, lookback=30, pct=0.10,
+                    hold=0, rsi_window=14, rsi_exit=30, rsi_entry=50, paired=False,
+                    equity0=None, peak0=None):
+    """
+    Exit / re-entry arrays for returns (T × C) under P parameter sets.
+    Scalar parameters are shared; 1-D ones define the parameter axis.
+    Returns exit_ and reentry as (T × C × P) and hold as (C × P).
+    paired=True gives parameter set j to curve j only (P == C) and
+    returns a single parameter column (T × C × 1). equity0 / peak0 (C,)
+    continue curves from an earlier block: their equity and running peak
+    on the bar before returns[0].
+    """
+    if kind not in KINDS:
+        raise ValueError(f"unknown stop kind: {kind}")
+    r = np.asarray(returns, dtype="float64")
+    if r.ndim == 1:
+        r = r[:, None]
+    T, C = r.shape
+    params, P = _grid(dict(k=k, lookback=lookback, pct=pct, hold=hold,
+                           rsi_window=rsi_window, rsi_exit=rsi_exit, rsi_entry=rsi_entry))
+    if paired:
+        if P not in (1, C):
+            raise ValueError(f"paired stops need 1 or {C} parameter sets, got {P}")
+        return _paired_conditions(r, kind, {name: np.broadcast_to(a, (C,)) for name, a in params.items()},
+                                  equity0, peak0)
+
+    equity, rolling_max = _equity(r, equity0, peak0)
+    drawdown = equity / rolling_max - 1
+    new_high = equity >= rolling_max
+
+    exit_ = np.zeros((T, C, P), dtype=bool)
+    reentry = np.zeros((T, C, P), dtype=bool)
+    frame = pd.DataFrame(r)
+
+    if kind == "adaptive_vol":
+        for lb in np.unique(params["lookback"]):
+            cols = np.flatnonzero(params["lookback"] == lb)
+            rolling_vol = frame.rolling(int(lb)).std().fillna(0).values * np.sqrt(252)
+            limit = -params["k"][cols][None, None, :] * rolling_vol[:, :, None]
+            exit_[:, :, cols] = drawdown[:, :, None] < limit
+        reentry[:] = new_high[:, :, None]
+    elif kind in ("fixed_pct", "time"):
+        exit_[:] = drawdown[:, :, None] < -params["pct"][None, None, :]
+        reentry[:] = new_high[:, :, None]
+    else:  # rsi
+        for w in np.unique(params["rsi_window"]):
+            cols = np.flatnonzero(params["rsi_window"] == w)
+            level = rsi(equity, int(w))[:, :, None]
+            exit_[:, :, cols] = level < params["rsi_exit"][cols][None, None, :]
+            reentry[:, :, cols] = level > params["rsi_entry"][cols][None, None, :]
+
+    hold = np.broadcast_to(params["hold"][None, :], (C, P))
+    if kind == "time" and (hold <= 0).any():
+        raise ValueError("kind='time' needs hold > 0")
+    return exit_, reentry, hold
+
+
+def _paired_conditions(r, kind, params, equity0=None, peak0=None):
+    # stop_conditions with parameter set j applied to curve j only
+    T, C = r.shape
+    equity, rolling_max = _equity(r, equity0, peak0)
+    drawdown = equity / rolling_max - 1
+    new_high = equity >= rolling_max
+
+    exit_ = np.zeros((T, C), dtype=bool)
+    reentry = np.zeros((T, C), dtype=bool)
+    frame = pd.DataFrame(r)
+
+    if kind == "adaptive_vol":
+        for lb in np.unique(params["lookback"]):
+            cols = np.flatnonzero(params["lookback"] == lb)
+            rolling_vol = frame.iloc[:, cols].rolling(int(lb)).std().fillna(0).values * np.sqrt(252)
+            exit_[:, cols] = drawdown[:, cols] < -params["k"][cols][None, :] * rolling_vol
+        reentry[:] = new_high
+    elif kind in ("fixed_pct", "time"):
+        exit_[:] = drawdown < -params["pct"][None, :]
+        reentry[:] = new_high
+    else:  # rsi
+        for w in np.unique(params["rsi_window"]):
+            cols = np.flatnonzero(params["rsi_window"] == w)
+            level = rsi(equity[:, cols], int(w))
+            exit_[:, cols] = level < params["rsi_exit"][cols][None, :]
+            reentry[:, cols] = level > params["rsi_entry"][cols][None, :]
+
+    hold = params["hold"][:, None]
+    if kind == "time" and (hold <= 0).any():
+        raise ValueError("kind='time' needs hold > 0")
+    return exit_[:, :, None], reentry[:, :, None], hold
+
+
+def apply_stops(returns, kind="adaptive_vol", compiled=None, memory_mb=None, **params) -> np.ndarray:
+    """
+    Active mask (T × C × P) for every curve in `returns` (T × C, or T)
+    and every parameter set (T × C × 1 with paired=True). See
+    stop_conditions for the parameters. With memory_mb the curves run in
+    blocks of columns and bars sized to it (`returns` may be a memmap);
+    the mask matches the in-memory one, rolling vol / RSI to rounding.
+    """
+    if memory_mb is not None:
+        return _blocked_stops(returns, kind, compiled, memory_mb, params)
+    exit_, reentry, hold = stop_conditions(returns, kind, **params)
+    T, C, P = exit_.shape
+    active, _, _ = state_machine(exit_.reshape(T, C * P), reentry.reshape(T, C * P),
+                                 hold.reshape(C * P), compiled=compiled)
+    return active.reshape(T, C, P)
+
+
+def _blocked_stops(returns, kind, compiled, memory_mb, params):
+    # Each time block is computed from `warm` earlier bars onwards (rolling
+    # windows, plus one bar the state machine treats as bar 0), continuing
+    # the curves' equity / peak and carrying the stop state across blocks
+    r = returns if np.ndim(returns) == 2 else np.asarray(returns)[:, None]
+    T, C = r.shape
+    args = inspect.signature(stop_conditions).bind(r, kind, **params)
+    args.apply_defaults()
+    kw = {name: v for name, v in args.arguments.items() if name not in ("returns", "kind", "equity0", "peak0")}
+    _, P = _grid({name: kw[name] for name in ("k", "lookback", "pct", "hold", "rsi_window", "rsi_exit", "rsi_entry")})
+    if kw["paired"]:
+        P = 1
+    warm = int({"adaptive_vol": np.max(kw["lookback"]), "rsi": np.max(kw["rsi_window"]) + 1}.get(kind, 0))
+    rows, cols = plan(T, C, memory_mb, warm + 1, cell_bytes=96 + 32 * P)
+
+    active = np.empty((T, C, P), dtype=np.int8)
+    for a in range(0, C, cols):
+        cs = slice(a, min(a + cols, C))
+        block_kw = dict(kw)
+        if kw["paired"]:
+            block_kw.update({name: v[cs] for name, v in kw.items() if np.ndim(v) == 1 and len(v) == C})
+        equity0 = peak0 = in_cash = count = None
+        for start in range(0, T, rows):
+            stop = min(start + rows, T)
+            lo = max(0, start - warm - 1)
+            ret = np.asarray(r[lo:stop, cs], dtype="float64")
+            exit_, reentry, hold = stop_conditions(ret, kind, equity0=equity0, peak0=peak0, **block_kw)
+            n = exit_.shape[1] * P
+            skip = start - lo - 1 if start else 0    # rows before the state machine's bar 0
+            step, in_cash, count = state_machine(exit_[skip:].reshape(-1, n), reentry[skip:].reshape(-1, n),
+                                                 hold.reshape(n), in_cash, count, compiled=compiled)
+            active[start:stop, cs] = step[(1 if start else 0):].reshape(stop - start, -1, P)
+            if stop < T:
+                nxt = max(0, stop - warm - 1) - lo     # the next block's first row, within this one
+                equity, peak = _equity(ret[:nxt], equity0, peak0)
+                equity0, peak0 = (equity[-1], peak[-1]) if nxt else (equity0, peak0)
+    return active
+
+
+class _RollingVar(Stateful):
+    """
+    pandas' online rolling variance (roll_var: Welford with Kahan-compensated
+    means) fed one value at a time, so a streamed stop sees exactly the vol
+    that rolling(window).std() gives in stop_conditions.
+    """
+
+    def __init__(self, window: int, ddof: int = 1):
+        self.window, self.ddof = window, ddof
+        self.values = deque(maxlen=window)   # last `window` values, for removal
+        self.nobs = self.mean = self.ssqdm = 0.0
+        self.comp_add = self.comp_remove = 0.0
+        self.same = 0
+        self.prev = None
+
+    def update(self, val: float) -> float:
+        if self.prev is None:
+            self.prev = val
+        if type(self.values) is list:        # a state saved while this was a list
+            self.values = deque(self.values, maxlen=self.window)
+        if len(self.values) == self.window:
+            old = self.values.popleft()
+            self.nobs -= 1
+            if self.nobs:
+                prev_mean = self.mean - self.comp_remove
+                y = old - self.comp_remove
+                t = y - self.mean
+                self.comp_remove = t + self.mean - y
+                self.mean = self.mean - t / self.nobs
+                self.ssqdm = self.ssqdm - (old - prev_mean) * (old - self.mean)
+            else:
+                self.mean = self.ssqdm = 0.0
+        self.values.append(val)
+
+        self.nobs += 1
+        self.same = self.same + 1 if val == self.prev else 1
+        self.prev = val
+        prev_mean = self.mean - self.comp_add
+        y = val - self.comp_add
+        t = y - self.mean
+        self.comp_add = t + self.mean - y
+        self.mean = self.mean + t / self.nobs
+        self.ssqdm = self.ssqdm + (val - prev_mean) * (val - self.mean)
+
+        if self.nobs < self.window or self.nobs <= self.ddof:
+            return math.nan
+        if self.nobs == 1 or self.same >= self.nobs:
+            return 0.0
+        return self.ssqdm / (self.nobs - self.ddof)
+
+
+class AdaptiveVolStop(Stateful):
+    """
+    The adaptive_vol stop one bar at a time: step(r) takes the strategy's
+    next (unstopped) return and says whether that bar is invested. Matches
+    apply_stops(kind="adaptive_vol") bit for bit and checkpoints with
+    state() / Stateful.restore().
+    """
+
+    def __init__(self, k: float = 0.125, lookback: int = 30):
+        self.k = k
+        self.var = _RollingVar(lookback)
+        self.bars = 0
+        self.equity = 1.0
+        self.peak = -math.inf
+        self.in_cash = False
+        self.count = 0
+
+    def step(self, r: float) -> int:
+        self.equity = self.equity * (1 + r)
+        self.peak = max(self.peak, self.equity)
+        drawdown = self.equity / self.peak - 1
+        var = self.var.update(r)
+        vol = 0.0 if math.isnan(var) else math.sqrt(max(var, 0.0)) * math.sqrt(252)
+        i, self.bars = self.bars, self.bars + 1
+        if i == 0:
+            return 1
+        if self.in_cash:
+            if self.equity >= self.peak:
+                self.in_cash, self.count = False, 0
+            else:
+                self.count += 1
+        elif drawdown < -self.k * vol:
+            self.in_cash, self.count = True, 1
+        return 0 if self.in_cash else 1
+
+
+def stopped_equity(returns, active, initial_capital=1.0) -> np.ndarray:
+    """Equity after zeroing returns on flat bars; shaped like `active`."""
+    r = np.asarray(returns, dtype="float64")
+    active = np.asarray(active)
+    if r.ndim == 1:
+        r = r[:, None]
+    if active.ndim == 3:
+        r = r[:, :, None]
+    return np.cumprod(1 + r * active, axis=0) * initial_capital
@@ -0,0 +1,231 @@
+"""
+sweep.py
+--------
+Batched parameter sweep over the whole pipeline:
+
+    sector signals → allocator → cap / normalize → adaptive-vol stop
+
+Every grid point is one full backtest, but nothing is run point by point.
+Each sector's signal runs once per distinct setting of its window
+parameters, with the module's THRESHOLDS for all grid points broadcast
+along a parameter axis in the same signal_panel call. The flags of all
+grid points are stacked into a (P × T × S) array. The optimizer solves
+all P × T days of one allocator and lookback together (one batched QP for
+mvo, one stacked pass for the solver-free ones), and the stop overlay
+runs over the P equity curves together. Grid points are processed in
+chunks sized to `memory_mb`.
+
+Grid keys are "<SECTOR>.<param>" for the signal modules' generate_signal
+keyword arguments, plus
+  lookback        stop volatility window (run_backtest: 30)
+  k               stop multiplier on annualized vol (run_backtest: 0.125)
+  allocator       run_optimizer --method: mvo, hrp, ivp or erc (mvo)
+  mvo_lookback    optimizer moment / covariance window (rule_based: 30)
+validate_grid() rejects any other key before anything runs.
+
+The default grid reproduces generate_flags → run_optimizer → run_backtest.
+
+    from backtest.sweep import run_sweep
+    table = run_sweep({"k": [0.1, 0.125, 0.15], "BANK.fast": [10, 20]})
+"""
+
+import inspect
+import itertools
+from importlib import import_module
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from store.prices import load_panel, simple_returns
+from signals import SECTOR_MODULES
+from optimizer.moments import rolling_moments
+from optimizer.risk_parity import METHODS, risk_weights
+from optimizer.rule_based import batched_allocations, cap_and_normalize
+from backtest.stops import apply_stops
+
+META_FILE = "metadata/selected_current.yaml"
+INITIAL_CAPITAL = 1_000_000
+
+DEFAULT_GRID = {
+    "TECH.period": [2], "TECH.lower": [30], "TECH.upper": [70],
+    "BANK.fast": [20], "BANK.slow": [63],
+    "FMCG.window": [5], "FMCG.band": [2.5],
+    "lookback": [30],
+    "k": [0.125],
+    "allocator": ["mvo"],
+    "mvo_lookback": [30],
+}
+ALLOCATORS = ("mvo",) + METHODS
+
+METRICS = ["final_value", "cagr", "volatility", "sharpe", "max_drawdown",
+           "var_95", "cvar_95", "win_loss", "flat_pct", "stopped_pct"]
+
+
+def validate_grid(grid: dict) -> None:
+    """
+    Raise ValueError for a key that is neither a DEFAULT_GRID key nor
+    "<SECTOR>.<param>" with param in that sector's generate_signal
+    signature, and for an unknown allocator.
+    """
+    for key in grid:
+        if key in DEFAULT_GRID:
+            continue
+        sector, _, name = key.partition(".")
+        if sector not in SECTOR_MODULES:
+            plain = [k for k in DEFAULT_GRID if "." not in k]
+            raise ValueError(f"unknown grid key {key!r}; expected one of {plain} "
+                             f"or <SECTOR>.<param> for a sector in {list(SECTOR_MODULES)}")
+        params = list(inspect.signature(import_module(SECTOR_MODULES[sector]).generate_signal).parameters)[1:]
+        if name not in params:
+            raise ValueError(f"unknown grid key {key!r}; {sector} takes {', '.join(params)}")
+    unknown = set(grid.get("allocator", ())) - set(ALLOCATORS)
+    if unknown:
+        raise ValueError(f"unknown allocator {sorted(unknown)}; expected one of {ALLOCATORS}")
+
+
+def expand_grid(grid: dict = None) -> pd.DataFrame:
+    """Cartesian product of DEFAULT_GRID updated with `grid`; one row per grid point."""
+    validate_grid(grid or {})
+    full = dict(DEFAULT_GRID)
+    full.update(grid or {})
+    keys = list(full)
+    return pd.DataFrame(list(itertools.product(*(full[k] for k in keys))), columns=keys)
+
+
+def load_inputs(meta_file: str = META_FILE):
+    """Selected symbol per sector and its OHLCV frame, plus the price panel."""
+    with open(meta_file) as f:
+        selected = yaml.safe_load(f)
+    panel = load_panel()
+    sectors = [s for s in selected if s in SECTOR_MODULES and selected[s] in panel.symbols]
+    frames = {s: panel.ohlcv(selected[s]) for s in sectors}
+    return selected, panel, frames
+
+
+def _sector_flags(frames: dict, combos: pd.DataFrame):
+    """
+    Flags for every grid point, computed once per distinct parameter set
+    of each sector: one signal_panel call per setting of the module's
+    window parameters, on the sector's single column (the rows
+    generate_signal keeps), with its THRESHOLDS as arrays across the
+    settings that share those windows. Returns {sector: (codes (P,),
+    flags (U × T_s))}.
+    """
+    out = {}
+    for sector, df in frames.items():
+        keys = [c for c in combos.columns if c.startswith(sector + ".")]
+        names = [c.split(".", 1)[1] for c in keys]
+        mod = import_module(SECTOR_MODULES[sector])
+        fields = df[mod.FIELDS].apply(pd.to_numeric, errors="coerce").dropna()
+        columns = [fields[f].to_numpy()[:, None] for f in mod.FIELDS]
+        if not keys:
+            out[sector] = (np.zeros(len(combos), dtype=int), mod.signal_panel(*columns).T)
+            continue
+        codes = combos.groupby(keys, sort=False).ngroup().to_numpy()
+        uniq = combos[keys].drop_duplicates().set_axis(names, axis=1).reset_index(drop=True)
+        windows = [n for n in names if n not in mod.THRESHOLDS]
+        groups = uniq.groupby(windows, sort=False).indices.values() if windows else [np.arange(len(uniq))]
+        rows = np.empty((len(uniq), len(fields)), dtype=int)
+        for idx in groups:
+            params = {n: uniq[n].iloc[idx[0]] for n in windows}
+            params.update({n: uniq[n].to_numpy()[idx] for n in names if n in mod.THRESHOLDS})
+            rows[idx] = mod.signal_panel(*columns, **params).T
+        out[sector] = (codes, rows)
+    return out
+
+
+def _metrics(returns: np.ndarray, active: np.ndarray, flat: np.ndarray) -> dict:
+    """analyze_backtests' summary for every column of stopped daily returns (T × P)."""
+    equity = np.cumprod(1 + returns, axis=0) * INITIAL_CAPITAL
+    daily = equity[1:] / equity[:-1] - 1
+    final_value = equity[-1]
+    cagr = (final_value / INITIAL_CAPITAL) ** (252 / len(daily)) - 1
+    volatility = daily.std(axis=0, ddof=1) * np.sqrt(252)
+    max_dd = (equity / np.maximum.accumulate(equity, axis=0) - 1).min(axis=0)
+    var_95 = np.percentile(daily, 5, axis=0)
+    tail = daily <= var_95
+    cvar_95 = np.where(tail, daily, 0).sum(axis=0) / tail.sum(axis=0)
+    wins, losses = (daily > 0).sum(axis=0), (daily < 0).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "final_value": final_value,
+            "cagr": cagr,
+            "volatility": volatility,
+            "sharpe": cagr / volatility,
+            "max_drawdown": max_dd,
+            "var_95": var_95,
+            "cvar_95": cvar_95,
+            "win_loss": np.where(losses != 0, wins / losses, np.nan),
+            "flat_pct": flat * 100,
+            "stopped_pct": (1 - active.mean(axis=0)) * 100,
+        }
+
+
+def _chunk_size(T: int, S: int, memory_mb: float, lookback: int = 0) -> int:
+    # Dominated by the tiled covariances and the solver's copies of them, or
+    # for the solver-free allocators the tiled window factors (S × lookback)
+    per_point = T * (S * max(S * 4, lookback * 3) * 8 + S * 8 * 16 + 64)
+    return max(1, int(memory_mb * 2 ** 20 // per_point))
+
+
+def run_sweep(grid: dict = None, memory_mb: float = 512, compiled=None, meta_file: str = META_FILE) -> pd.DataFrame:
+    """
+    Backtest every point of `grid` (see expand_grid) and return one row
+    per point: its parameters followed by the METRICS columns.
+    """
+    combos = expand_grid(grid)
+    selected, panel, frames = load_inputs(meta_file)
+    sectors = list(frames)
+    S = len(sectors)
+    flags = _sector_flags(frames, combos)
+
+    # Optimizer returns, tail-aligned with the flags as in generate_allocations
+    close = panel.select([selected[s] for s in sectors]).field("close")
+    ret = simple_returns(close)
+    flag_len = min(f.shape[1] for _, f in flags.values())
+    min_len = min(flag_len, len(ret) - 1)
+    opt_rets = ret[1:][-min_len:]
+
+    # Backtest returns, tail-aligned to the shortest flag series as in run_backtest;
+    # weight row i earns return row i, trailing rows without weights earn 0
+    bt_ret = ret.copy()
+    bt_ret[0] = 0
+    bt_ret = bt_ret[-flag_len:]
+    n_w = min(min_len, len(bt_ret))
+
+    mvo = combos["allocator"] == "mvo"
+    moments = {lb: rolling_moments(opt_rets, "window", window=int(lb), columns=sectors)
+               for lb in combos.loc[mvo, "mvo_lookback"].unique()}
+    priced = np.ones(S, dtype=bool)
+
+    P = len(combos)
+    solver_free = combos.loc[~mvo, "mvo_lookback"]
+    chunk = _chunk_size(min_len, S, memory_mb, int(solver_free.max()) if len(solver_free) else 0)
+    results = {m: np.empty(P) for m in METRICS}
+    for a in range(0, P, chunk):
+        b = min(a + chunk, P)
+        block = combos.iloc[a:b]
+        stack = np.stack([flags[s][1][flags[s][0][a:b], -min_len:] for s in sectors], axis=-1)
+
+        weights = np.zeros(stack.shape)
+        for (allocator, lb), rows in block.groupby(["allocator", "mvo_lookback"]).indices.items():
+            if allocator == "mvo":
+                weights[rows] = batched_allocations(stack[rows], priced, moments[lb], int(lb))
+            else:
+                weights[rows] = risk_weights(stack[rows], opt_rets, int(lb), allocator)
+        weights = cap_and_normalize(weights)
+
+        port = np.zeros((len(bt_ret), b - a))
+        port[:n_w] = (weights[:, -n_w:] * bt_ret[None, :n_w]).sum(axis=-1).T
+        active = apply_stops(port, kind="adaptive_vol", k=block["k"].to_numpy(),
+                             lookback=block["lookback"].to_numpy(), paired=True,
+                             compiled=compiled)[:, :, 0]
+        flat = (np.abs(weights).sum(axis=-1) == 0).mean(axis=1)
+        for name, values in _metrics(port * active, active, flat).items():
+            results[name][a:b] = values
+
+    table = combos.copy()
+    for name in METRICS:
+        table[name] = results[name]
+    return table
@@ -0,0 +1,575 @@
+"""
+suite.py
+--------
+Timing, peak memory and golden checks for each stage on a synthetic
+market (bench/synth.py):
+
+  ingest         raw CSVs → price store            vs pandas read_csv per file
+  load           load_panel() staleness check + mmap
+  factors        selection.factors snapshot        vs the original per-symbol pandas loop
+  chunked        float32 factor panel in CHUNK_MB  vs the in-memory float64 panel
+                                                    (store.chunks FLOAT32_RTOL / ATOL)
+  signals        signal_panel() for every module   vs per-symbol pandas rolling windows
+  rule_based     batched MVO (optimizer/rule_based) vs method="slsqp" per day (≤ GOLDEN_DAYS
+                                                    days); where they differ, vs a fresh cvxpy
+                                                    solve of the day's QP, SLSQP worse than it
+  mean_variance  cvxpy long-only MVO                vs the script's original per-day loop (pandas
+                                                    expanding moments, a fresh cvxpy problem a day)
+  book           book_allocate + simulate_book      no weight row earns a return its
+                                                    optimizer saw (bumped close)
+  stops          adaptive-vol stop over many curves vs the NumPy state machine and
+                                                    run_backtest's original loop
+  metrics        analyze metrics over many curves   vs backtest.simulate.summarize per curve
+
+Seconds are the best of `repeat` runs; peak memory is tracemalloc's peak
+(NumPy buffers included) over one extra traced run, since tracing slows
+Python-heavy stages. Golden checks run on at most SAMPLE symbols / curves.
+
+    results = run_config(500, 10, stages=["ingest", "factors"])
+"""
+
+import os
+import time
+import tracemalloc
+import warnings
+from dataclasses import asdict, dataclass
+
+import numpy as np
+import pandas as pd
+
+from bench.synth import BENCH_DIR, SECTORS, synth_raw
+
+STAGES = ("ingest", "load", "factors", "chunked", "signals", "rule_based", "mean_variance", "book", "stops",
+          "metrics")
+SAMPLE = 50             # symbols / curves given a golden check
+GOLDEN_DAYS = 2600      # longest history the per-day SLSQP reference is run on
+CURVES = 256            # equity curves for stops / metrics
+CHUNK_MB = 64           # working-set budget of the chunked stage
+BOOK_NAMES = 4          # names per sector in the book stage
+
+
+@dataclass
+class BenchResult:
+    config: str
+    stage: str
+    seconds: float
+    peak_mb: float = None
+    golden: str = "skipped"     # ok | FAIL | skipped
+    detail: str = ""
+
+    def row(self) -> dict:
+        return asdict(self)
+
+
+class _State:
+    """Inputs shared by the stages of one config, built on first use."""
+
+    def __init__(self, raw_dir: str, store_dir: str, seed: int):
+        self.raw_dir, self.store_dir, self.seed = raw_dir, store_dir, seed
+        self._panel = None
+        self._cache = {}
+
+    @property
+    def panel(self):
+        if self._panel is None:
+            from store.prices import load_panel
+            self._panel = load_panel(self.store_dir, self.raw_dir)
+        return self._panel
+
+    def sample(self) -> list:
+        return self.panel.symbols[:SAMPLE]
+
+    def sectors(self) -> dict:
+        """{sector: symbol}: the longest-listed symbol of each synthetic sector."""
+        if "sectors" not in self._cache:
+            close = self.panel.field("close")
+            n = np.isfinite(close).sum(axis=0)
+            picks = {}
+            for j in np.argsort(-n, kind="stable"):
+                sector = SECTORS[j % len(SECTORS)]
+                picks.setdefault(sector, self.panel.symbols[j])
+            self._cache["sectors"] = {s: picks[s] for s in SECTORS if s in picks}
+        return self._cache["sectors"]
+
+    def book(self) -> dict:
+        """{sector: [lead, ...]}: sectors()' leads, then the sector's next-longest-listed symbols."""
+        if "book" not in self._cache:
+            n = np.isfinite(self.panel.field("close")).sum(axis=0)
+            book = {s: [lead] for s, lead in self.sectors().items()}
+            for j in np.argsort(-n, kind="stable"):
+                names = book.get(SECTORS[j % len(SECTORS)])
+                if names is not None and len(names) < BOOK_NAMES and self.panel.symbols[j] not in names:
+                    names.append(self.panel.symbols[j])
+            self._cache["book"] = book
+        return self._cache["book"]
+
+    def curves(self) -> np.ndarray:
+        """(T × C) daily returns of the first CURVES symbols, 0 where missing."""
+        if "curves" not in self._cache:
+            from store.prices import simple_returns
+            close = np.asarray(self.panel.field("close")[:, :CURVES])
+            ret = simple_returns(close)
+            self._cache["curves"] = np.where(np.isfinite(ret), ret, 0.0)
+        return self._cache["curves"]
+
+
+def _close(a, b, rtol: float) -> tuple:
+    a, b = np.asarray(a, dtype="float64"), np.asarray(b, dtype="float64")
+    if a.shape != b.shape:
+        return False, f"shape {a.shape} vs {b.shape}"
+    same_nan = np.isnan(a) == np.isnan(b)
+    ok = np.isclose(a, b, rtol=rtol, atol=0, equal_nan=True) & same_nan
+    if ok.all():
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rel = np.nanmax(np.abs(a - b) / np.abs(b), initial=0.0) if np.isfinite(b).any() else 0.0
+        return True, f"max rel err {rel:.1e}"
+    return False, f"{(~ok).sum()} of {ok.size} values differ"
+
+
+# ── reference implementations (the per-symbol pandas the scripts used) ──
+def _ref_read(path: str) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    for col in ("open", "high", "low", "close", "volume"):
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df.dropna(subset=["date", "close"]).set_index("date").sort_index()
+
+
+def _rma(x: pd.Series, n: int) -> pd.Series:
+    return x.ewm(alpha=1 / n, min_periods=n).mean()
+
+
+def _ref_factors(df: pd.DataFrame) -> list:
+    # scripts/factor_engineer.py before the panel rewrite (pandas_ta's atr / rsi spelled out)
+    df = df.dropna(subset=["close", "high", "low"])
+    close, high, low = df["close"], df["high"], df["low"]
+    prev = close.shift()
+    tr = pd.concat([high - low, (high - prev).abs(), (low - prev).abs()], axis=1).max(axis=1)
+    tr.iloc[0] = np.nan
+    delta = close.diff()
+    up, down = delta.clip(lower=0), delta.clip(upper=0).abs()
+    rsi = 100 * _rma(up, 14) / (_rma(up, 14) + _rma(down, 14))
+    return [
+        close.pct_change(63).iloc[-1],
+        close.pct_change(126).iloc[-1],
+        _rma(tr, 20).iloc[-1] / close.iloc[-1],
+        np.log(close).diff().rolling(30).std().iloc[-1],
+        rsi.iloc[-1],
+        int(close.iloc[-1] > close.rolling(252).max().iloc[-2]),
+    ]
+
+
+def _flags(long, short) -> np.ndarray:
+    return np.where(short, -1, np.where(long, 1, 0))
+
+
+def _ref_signals(df: pd.DataFrame) -> dict:
+    close, high, low = df["close"], df["high"], df["low"]
+    delta = close.diff()
+    gain = delta.where(delta.isna() | (delta > 0), 0.0)
+    loss = (-delta).where(delta.isna() | (delta < 0), 0.0)
+    rsi = 100 - 100 / (1 + gain.rolling(2).mean() / loss.rolling(2).mean())
+    fast, slow = close.rolling(20).mean(), close.rolling(63).mean()
+    prev = close.shift()
+    tr = pd.concat([high - low, (high - prev).abs(), (low - prev).abs()], axis=1).max(axis=1)
+    tr = tr.where(prev.notna(), high - low)
+    atr = tr.rolling(5).mean()
+    lower, upper = high.rolling(5).max() - 2.5 * atr, low.rolling(5).min() + 2.5 * atr
+    return {
+        "TECH": _flags(rsi < 30, rsi > 70),
+        "BANK": _flags(fast > slow, fast < slow),
+        "FMCG": _flags(close < lower, close > upper),
+    }
+
+
+def _ref_capped_l1(mu: np.ndarray, cov: np.ndarray, cap: float) -> tuple:
+    """
+    rule_based's day problem as the batched solver poses it, min -w·mu +
+    ½ wᵀ cov w with 0 ≤ w_i ≤ cap and Σw_i = 1, as a fresh cvxpy QP.
+    Returns (w, objective), w None if cvxpy finds no optimum.
+    """
+    import cvxpy as cp
+
+    w = cp.Variable(len(mu))
+    prob = cp.Problem(cp.Minimize(-mu @ w + 0.5 * cp.quad_form(w, cp.psd_wrap((cov + cov.T) / 2))),
+                      [w >= 0, w <= cap, cp.sum(w) == 1])
+    prob.solve()
+    return (w.value, prob.value) if prob.status == cp.OPTIMAL else (None, np.inf)
+
+
+def _ref_mean_variance(ret: np.ndarray, flags: np.ndarray) -> np.ndarray:
+    # optimizer/mean_variance.py's original loop: expanding pandas moments, one fresh problem a day
+    import cvxpy as cp
+
+    rets_df = pd.DataFrame(ret)
+    out = np.zeros(ret.shape)
+    for i in range(len(ret)):
+        active = list(np.flatnonzero(flags[i]))
+        if not active:
+            continue
+        with warnings.catch_warnings():     # day 0: a one-row covariance is all NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            mu = rets_df[active].iloc[:i + 1].mean().values
+            sigma = rets_df[active].iloc[:i + 1].cov().values
+        x = cp.Variable(len(mu))
+        prob = cp.Problem(cp.Maximize(mu @ x - 0.5 * cp.quad_form(x, sigma)), [x >= 0, cp.sum(x) == 1])
+        try:
+            prob.solve()
+            w = x.value
+        except Exception:
+            w = np.ones(len(mu)) / len(mu)
+        out[i, active] = w
+    return out
+
+
+def _ref_stop(returns: np.ndarray, k: float = 0.125, lookback: int = 30) -> np.ndarray:
+    # backtest/run_backtest.py's original trailing-stop loop
+    portfolio_returns = pd.Series(returns)
+    equity_curve = (1 + portfolio_returns).cumprod()
+    rolling_vol = portfolio_returns.rolling(lookback).std().fillna(0) * np.sqrt(252)
+    adaptive_dd_limit = -k * rolling_vol
+    rolling_max = equity_curve.cummax()
+    drawdown = equity_curve / rolling_max - 1
+    active = pd.Series(1, index=equity_curve.index)
+    in_cash = False
+    for i in range(1, len(drawdown)):
+        if in_cash:
+            if equity_curve.iloc[i] >= rolling_max.iloc[i]:
+                in_cash = False
+                active.iloc[i] = 1
+            else:
+                active.iloc[i] = 0
+        elif drawdown.iloc[i] < adaptive_dd_limit.iloc[i]:
+            in_cash = True
+            active.iloc[i] = 0
+    return active.values
+
+
+# ── stages: each returns (timed callable, golden check of its result) ──
+def _ingest(st):
+    from store.prices import file_symbol, ingest
+
+    def check(_):
+        panel = st.panel
+        worst = []
+        for fname in sorted(os.listdir(st.raw_dir))[:SAMPLE]:
+            ref = _ref_read(os.path.join(st.raw_dir, fname))
+            got = panel.ohlcv(file_symbol(fname))
+            if list(got["date"]) != list(ref.index.strftime("%Y-%m-%d")):
+                return False, f"{fname}: dates differ"
+            for col in ("open", "high", "low", "close"):
+                ok, msg = _close(got[col], ref[col], 1e-12)
+                if not ok:
+                    return False, f"{fname} {col}: {msg}"
+            worst.append(msg)
+        return True, f"{len(worst)} files match"
+
+    def run():
+        st._panel = None
+        return ingest(st.raw_dir, st.store_dir)
+
+    return run, check
+
+
+def _load(st):
+    from store.prices import load_panel
+    return (lambda: load_panel(st.store_dir, st.raw_dir)), None
+
+
+def _factors(st):
+    from selection.factors import factor_snapshot
+
+    rng = np.random.default_rng(st.seed)
+    pe = pd.Series(rng.uniform(5, 80, len(st.panel.symbols)), index=st.panel.symbols)
+
+    def check(snap):
+        snap = snap.set_index("symbol")
+        cols = ["mom3", "mom6", "atr_pct", "vol30", "rsi14", "breakout"]
+        got, ref = [], []
+        for sym in st.sample():
+            df = st.panel.ohlcv(sym)
+            if sym in snap.index:
+                got.append(snap.loc[sym, cols].to_numpy(dtype=float))
+                ref.append(_ref_factors(df))
+            elif len(df.dropna(subset=["close", "high", "low"])) >= 260:
+                return False, f"{sym} missing from the snapshot"
+        return _close(np.array(got), np.array(ref), 1e-8)
+
+    return (lambda: factor_snapshot(st.panel, pe, verbose=False)), check
+
+
+def _chunked(st):
+    from selection.factors import FACTORS, build_factor_panel
+    from store.chunks import FLOAT32_ATOL, FLOAT32_RTOL
+
+    def check(fp):
+        ref = build_factor_panel(st.panel)
+        worst = 0.0
+        for name in FACTORS:
+            a, b = np.asarray(fp.field(name), dtype="float64"), np.asarray(ref.field(name))
+            if not np.allclose(a, b, rtol=FLOAT32_RTOL, atol=FLOAT32_ATOL, equal_nan=True):
+                bad = ~np.isclose(a, b, rtol=FLOAT32_RTOL, atol=FLOAT32_ATOL, equal_nan=True)
+                return False, f"{name}: {bad.sum()} of {bad.size} values outside float32 tolerance"
+            with np.errstate(invalid="ignore", divide="ignore"):
+                worst = max(worst, np.nanmax(np.abs(a - b) / (FLOAT32_ATOL + FLOAT32_RTOL * np.abs(b)), initial=0.0))
+        return True, f"within {worst:.0%} of float32 tolerance"
+
+    out_dir = os.path.join(st.store_dir, "..", "factors_float32")
+    return (lambda: build_factor_panel(st.panel, out_dir=out_dir, memory_mb=CHUNK_MB, dtype="float32")), check
+
+
+def _signals(st):
+    from importlib import import_module
+    from signals import SECTOR_MODULES, lib
+
+    mods = {s: import_module(m) for s, m in SECTOR_MODULES.items()}
+    fields = [st.panel.field(f) for f in ("close", "high", "low")]
+
+    def run():
+        (close, high, low), order, valid = lib.pack(*fields)
+        return {
+            "TECH": lib.unpack(mods["TECH"].signal_panel(close), order, valid),
+            "BANK": lib.unpack(mods["BANK"].signal_panel(close), order, valid),
+            "FMCG": lib.unpack(mods["FMCG"].signal_panel(high, low, close), order, valid),
+        }
+
+    def check(flags):
+        bad = 0
+        for j, sym in enumerate(st.sample()):
+            df = st.panel.ohlcv(sym)
+            rows = st.panel.columns([sym])[0]
+            keep = np.flatnonzero(np.isfinite(fields[0][:, rows]) & np.isfinite(fields[1][:, rows])
+                                  & np.isfinite(fields[2][:, rows]))
+            df = df.dropna(subset=["close", "high", "low"])
+            for sector, ref in _ref_signals(df).items():
+                bad += int((flags[sector][keep, rows] != ref).sum())
+        return bad == 0, f"{bad} flags differ" if bad else f"{len(st.sample())} symbols × 3 modules match"
+
+    return run, check
+
+
+def _rule_based_inputs(st):
+    from signals import sector_flags
+    selected = st.sectors()
+    signals = {s: f.values for s, f in sector_flags(st.panel, selected).items()}
+    return signals, selected
+
+
+def _rule_based(st):
+    from optimizer.rule_based import CAP, allocate
+    from profiling import trace
+    from store.prices import simple_returns
+
+    signals, selected = _rule_based_inputs(st)
+
+    def check(weights):
+        if len(weights) > GOLDEN_DAYS:
+            return None, f"{len(weights)} days > GOLDEN_DAYS"
+        # The script's per-day SLSQP, with its trace rows for each day's active sectors
+        was = trace.ENABLED
+        trace.enable()
+        ref = allocate(signals, selected, st.panel, method="slsqp")
+        rows = trace.collect()["days"].get("rule_based_slsqp", [])
+        if not was:
+            trace.disable()
+        w, r = weights.values, ref.values
+        differ = np.flatnonzero(np.abs(w - r).max(axis=1) > 1e-6)
+        if not len(differ):
+            return True, "every day = SLSQP"
+
+        # Where they differ, both go against a fresh cvxpy solve of the day's QP on the
+        # pandas window ending at t-1: batched must equal it, and SLSQP must have stopped
+        # short of it at a feasible long-only point (status 0 but a worse objective, so not
+        # converged; the problem is convex there). Anything else is a mismatch.
+        rets = simple_returns(st.panel.select(selected.values()).field("close"))[1:][-len(w):]
+        rets = pd.DataFrame(rets, columns=list(selected))
+        day = {row["day"]: row for row in rows}
+        cols = list(weights.columns)
+        bad, gap = [], 0.0
+        for t in differ:
+            if t not in day:
+                bad.append(t)
+                continue
+            valid = day[t]["sectors"].split(",")
+            window = rets[valid].iloc[t - 30:t]
+            mu, cov = window.mean().values, window.cov().values
+            opt, opt_obj = _ref_capped_l1(mu, cov, CAP)
+            j = [cols.index(c) for c in valid]
+            s = r[t, j]
+            short = opt_obj - (-s @ mu + 0.5 * s @ cov @ s)
+            feasible = (s >= -1e-9).all() and (s <= CAP + 1e-9).all() and abs(s.sum() - 1) < 1e-6
+            if (opt is None or np.abs(w[t, j] - opt).max() > 1e-4 or np.abs(np.delete(w[t], j)).max(initial=0) > 0
+                    or not feasible or short > -1e-10):
+                bad.append(t)
+            else:
+                gap = max(gap, -short)
+        detail = (f"{len(w) - len(differ)} days = SLSQP, {len(differ) - len(bad)} where SLSQP stopped short "
+                  f"(by ≤ {gap:.1e}) = cvxpy, {len(bad)} mismatches")
+        return not bad, detail + (f" (first day {bad[0]})" if bad else "")
+
+    return (lambda: allocate(signals, selected, st.panel)), check
+
+
+def _mean_variance(st):
+    from optimizer.mean_variance import solve_days
+    from optimizer.parallel import run_sharded
+    from store.prices import simple_returns
+
+    signals, selected = _rule_based_inputs(st)
+    ret = simple_returns(st.panel.select(selected.values()).field("close"))
+    ret[0] = 0
+    n = min([len(f) for f in signals.values()] + [len(ret)])
+    ret = ret[-n:]
+    flags = np.column_stack([signals[s][-n:] == 1 for s in selected])
+
+    def run():
+        # The script's serial path: 256-day chunks, a fresh problem cache each
+        parts = run_sharded(solve_days, {"flags": flags, "rets": ret}, n)
+        return np.concatenate([w for w, _ in parts]), [row for _, rows in parts for row in rows]
+
+    def check(result):
+        if n > GOLDEN_DAYS:
+            return None, f"{n} days > GOLDEN_DAYS"
+        weights, rows = result
+        ref = _ref_mean_variance(ret, flags)
+        # Solver tolerance; day 0 has no covariance, which both turn into equal weights
+        differ = np.flatnonzero(np.abs(weights - ref).max(axis=1) > 1e-5)
+        fallbacks = sum(r["fallback"] for r in rows)
+        detail = f"{n - len(differ)} of {n} days = original loop, {fallbacks} equal-weight fallbacks"
+        return not len(differ), detail + (f", first mismatch day {differ[0]}" if len(differ) else "")
+
+    return run, check
+
+
+def _book(st):
+    from backtest.simulate import simulate_book
+    from optimizer.hierarchical import book_allocate
+    from store.prices import PricePanel
+
+    signals, _ = _rule_based_inputs(st)
+    book = st.book()
+    sub = st.panel.select([name for names in book.values() for name in names], how="outer")
+
+    def check(weights):
+        # Halve one held name's close on one date mid-history (held names sit
+        # at their cap, so only a drop must move them) and re-allocate.
+        # The weight rows that earn the returns ending on or before that date
+        # (simulate_book's row → date mapping) must not move; later ones must.
+        earned = simulate_book(weights, signals, book, sub, verbose=False).returns.index
+        w0 = weights.values[-len(earned):]
+        j = int(np.argmax((w0[:, 1:] != 0).sum(axis=0))) + 1     # most-held name after the first lead
+        held = np.flatnonzero(w0[:, j])
+        if len(held) == 0:
+            return None, "no name held"
+        t = earned[held[len(held) // 2]]
+        close = np.array(sub.field("close"))
+        close[np.searchsorted(sub.dates, t.to_datetime64()), sub.columns([weights.columns[j]])[0]] *= 0.5
+        bumped = book_allocate(signals, book, PricePanel(sub.dates, sub.symbols, {"close": close}))
+        w1 = bumped.values[-len(earned):]
+        moved = np.abs(w1 - w0).max(axis=1) > 1e-12
+        if not moved.any():
+            return False, "bumped close moved no weights"
+        first = earned[np.argmax(moved)]
+        return bool(first > t), f"bumped {t:%Y-%m-%d}, first moved row earns {first:%Y-%m-%d}"
+
+    return (lambda: book_allocate(signals, book, sub)), check
+
+
+def _stops(st):
+    from backtest.stops import apply_stops
+
+    curves = st.curves()
+    apply_stops(curves[:40, :2])   # compile outside the timing
+
+    def check(active):
+        ref = apply_stops(curves, compiled=False)
+        if not np.array_equal(active, ref):
+            return False, "compiled ≠ NumPy state machine"
+        for j in range(min(4, curves.shape[1])):
+            if not np.array_equal(active[:, j, 0], _ref_stop(curves[:, j])):
+                return False, f"curve {j} ≠ run_backtest loop"
+        return True, f"{curves.shape[1]} curves"
+
+    return (lambda: apply_stops(curves)), check
+
+
+def _metrics(st):
+    from backtest.simulate import summarize
+    from backtest.sweep import _metrics as metrics
+
+    curves = st.curves()
+    active = np.ones_like(curves)
+    flat = np.zeros(curves.shape[1])
+
+    def check(got):
+        names = ["final_value", "cagr", "volatility", "max_drawdown", "var_95", "cvar_95", "win_loss"]
+        ref = []
+        for j in range(min(SAMPLE, curves.shape[1])):
+            equity = pd.Series(np.cumprod(1 + curves[:, j]) * 1_000_000)
+            s = summarize(equity)
+            ref.append([s[n] for n in names])
+        return _close(np.array([got[n][:len(ref)] for n in names]).T, np.array(ref), 1e-9)
+
+    return (lambda: metrics(curves, active, flat)), check
+
+
+BENCHES = {
+    "ingest": _ingest,
+    "load": _load,
+    "factors": _factors,
+    "chunked": _chunked,
+    "signals": _signals,
+    "rule_based": _rule_based,
+    "mean_variance": _mean_variance,
+    "book": _book,
+    "stops": _stops,
+    "metrics": _metrics,
+}
+
+
+def _measure(fn, repeat: int, memory: bool):
+    best, result = float("inf"), None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def run_config(n_symbols: int, years: float, seed: int = 0, stages=STAGES, repeat: int = 1,
+               memory: bool = True, golden: bool = True, root: str = BENCH_DIR, log=print) -> list:
+    """Benchmark `stages` on one synthetic market; one BenchResult per stage."""
+    raw_dir = synth_raw(n_symbols, years, seed, root)
+    st = _State(raw_dir, os.path.join(os.path.dirname(raw_dir), "store"), seed)
+    config = f"{n_symbols}x{years:g}y"
+    results = []
+    for name in stages:
+        fn, check = BENCHES[name](st)
+        out, seconds, peak = _measure(fn, repeat, memory)
+        res = BenchResult(config, name, seconds, peak)
+        if golden and check is not None:
+            ok, res.detail = check(out)
+            res.golden = "skipped" if ok is None else "ok" if ok else "FAIL"
+        results.append(res)
+        mem = f"{peak:9.1f} MB" if peak is not None else " " * 12
+        log(f"  {config:<12} {name:<14} {seconds:9.3f}s {mem}  {res.golden:<7} {res.detail}")
+    return results
+
+
+def compare(results: list, baseline: list, max_slowdown: float = 1.5, floor: float = 0.05) -> list:
+    """Messages for stages slower than `max_slowdown` × baseline (ignoring ones under `floor` s)."""
+    base = {(r["config"], r["stage"]): r for r in baseline}
+    out = []
+    for r in results:
+        old = base.get((r.config, r.stage))
+        if old and r.seconds > floor and r.seconds > max_slowdown * old["seconds"]:
+            out.append(f"{r.config} {r.stage}: {r.seconds:.3f}s vs {old['seconds']:.3f}s baseline")
+        if old and old["golden"] == "ok" and r.golden == "FAIL":
+            out.append(f"{r.config} {r.stage}: golden check now fails ({r.detail})")
+    return out
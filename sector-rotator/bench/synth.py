@@ -0,0 +1,143 @@
+"""
+synth.py
+--------
+Seeded synthetic daily OHLCV in the data/raw layout, for benchmarks.
+
+Returns follow a one-factor model with GARCH(1,1) variance on both the
+market and each stock (volatility clustering) and Student-t shocks (fat
+tails); opens carry an overnight share of the move plus rare jump gaps.
+Files look like yfinance downloads — `date,close,high,low,open,volume`
+followed by the junk `,sym.ns,sym.ns,...` ticker row — and have the
+gaps real ones have: market holidays, late listings, suspensions, single
+missing bars and the odd row with an empty close.
+
+Every symbol draws from its own generator seeded with (seed, index), so
+the first 30 symbols of a 5,000-symbol market are the 30-symbol market.
+
+    raw_dir = synth_raw(500, 10, seed=7)     # generated once, then reused
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = "data/bench"
+SECTORS = ("TECH", "FMCG", "BANK")
+BARS_PER_YEAR = 252
+BATCH = 256             # symbols simulated together
+
+
+def symbol_name(i: int) -> str:
+    return f"SYN{i:04d}.NS"
+
+
+def calendar(years: float, seed: int = 0, start: str = "2000-01-03") -> pd.DatetimeIndex:
+    """Business days less ~2% market holidays."""
+    rng = np.random.default_rng([seed, 1 << 30])
+    days = pd.bdate_range(start, periods=int(round(years * BARS_PER_YEAR * 1.02)))
+    return days[rng.random(len(days)) >= 0.02]
+
+
+def _garch(shocks: np.ndarray, vol: np.ndarray, alpha: float = 0.08, beta: float = 0.90) -> np.ndarray:
+    """Returns (T × N) from unit shocks, with per-column long-run daily vol."""
+    lr = vol ** 2
+    omega = lr * (1 - alpha - beta)
+    var = lr.copy()
+    out = np.empty_like(shocks)
+    for t in range(len(shocks)):
+        out[t] = np.sqrt(var) * shocks[t]
+        var = omega + alpha * out[t] ** 2 + beta * var
+    return out
+
+
+def _t_shocks(rng, n: int, df: float = 5.0) -> np.ndarray:
+    return rng.standard_t(df, n) / np.sqrt(df / (df - 2))
+
+
+def market_returns(T: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng([seed, 1 << 31])
+    return _garch(_t_shocks(rng, T)[:, None], np.array([0.16 / np.sqrt(BARS_PER_YEAR)]))[:, 0]
+
+
+def simulate(symbols: range, T: int, market: np.ndarray, seed: int = 0) -> list:
+    """[(symbol, dict of (T,) OHLCV arrays with NaN rows for missing bars)] for one batch."""
+    rngs = [np.random.default_rng([seed, i]) for i in symbols]
+    N = len(rngs)
+    beta = np.array([r.uniform(0.5, 1.5) for r in rngs])
+    idio = np.array([r.uniform(0.15, 0.40) for r in rngs]) / np.sqrt(BARS_PER_YEAR)
+    drift = np.array([r.uniform(0.0, 0.15) for r in rngs]) / BARS_PER_YEAR
+    shocks = np.column_stack([_t_shocks(r, T) for r in rngs])
+    ret = drift + beta * market[:, None] + _garch(shocks, idio)
+
+    # Overnight share of the move, plus rare jump gaps that the close keeps
+    u = np.column_stack([r.random((T, 4)) for r in rngs]).reshape(T, N, 4)
+    jumps = np.where(u[..., 0] < 0.003, np.column_stack([r.normal(0, 0.06, T) for r in rngs]), 0.0)
+    ret = ret + jumps
+    overnight = 0.3 * (ret - jumps) + jumps
+
+    p0 = np.array([r.uniform(20, 3000) for r in rngs])
+    log_close = np.log(p0) + np.cumsum(ret, axis=0)
+    close = np.exp(log_close)
+    prev = np.exp(np.vstack([np.log(p0)[None, :], log_close[:-1]]))
+    open_ = prev * np.exp(overnight)
+    spread = np.abs(ret - overnight) + np.abs(np.column_stack([r.normal(0, 0.006, T) for r in rngs]))
+    high = np.maximum(open_, close) * np.exp(spread * u[..., 1])
+    low = np.minimum(open_, close) * np.exp(-spread * u[..., 2])
+    volume = np.floor(np.exp(np.column_stack([r.normal(13, 0.5, T) for r in rngs]))
+                      * (1 + 20 * np.abs(ret)))
+
+    out = []
+    for j, (i, r) in enumerate(zip(symbols, rngs)):
+        missing = u[:, j, 3] < 0.002                             # single missing bars
+        if r.random() < 0.25:                                    # listed late
+            missing[:r.integers(1, max(T // 2, 2))] = True
+        if r.random() < 0.10:                                    # suspension
+            a = r.integers(0, T)
+            missing[a:a + r.integers(5, 40)] = True
+        bad_close = ~missing & (r.random(T) < 0.0005)            # row with an empty close
+        cols = {"close": close[:, j].copy(), "high": high[:, j], "low": low[:, j],
+                "open": open_[:, j], "volume": volume[:, j]}
+        cols["close"][bad_close] = np.nan
+        out.append((symbol_name(i), cols, ~missing))
+    return out
+
+
+def _write(path: str, symbol: str, dates: np.ndarray, cols: dict, keep: np.ndarray) -> None:
+    tag = symbol.lower()
+    lines = ["date,close,high,low,open,volume\n", f",{tag},{tag},{tag},{tag},{tag}\n"]
+    c, h, l, o, v = (cols[k][keep] for k in ("close", "high", "low", "open", "volume"))
+    for d, ci, hi, li, oi, vi in zip(dates[keep], c, h, l, o, v):
+        lines.append(f"{d},{'' if ci != ci else f'{ci:.6f}'},{hi:.6f},{li:.6f},{oi:.6f},{int(vi)}\n")
+    with open(path, "w") as f:
+        f.writelines(lines)
+
+
+def write_market(raw_dir: str, n_symbols: int, years: float, seed: int = 0) -> list:
+    """Write n_symbols CSVs into raw_dir; returns the symbols."""
+    os.makedirs(raw_dir, exist_ok=True)
+    days = calendar(years, seed)
+    dates = np.asarray(days.strftime("%Y-%m-%d"))
+    market = market_returns(len(days), seed)
+    symbols = []
+    for a in range(0, n_symbols, BATCH):
+        for sym, cols, keep in simulate(range(a, min(a + BATCH, n_symbols)), len(days), market, seed):
+            _write(os.path.join(raw_dir, sym.replace(".", "_") + ".csv"), sym, dates, cols, keep)
+            symbols.append(sym)
+    return symbols
+
+
+def synth_raw(n_symbols: int, years: float, seed: int = 0, root: str = BENCH_DIR) -> str:
+    """Raw dir for this market under root, generated on first use."""
+    raw_dir = os.path.join(root, f"{n_symbols}x{years:g}y_s{seed}", "raw")
+    marker = os.path.join(os.path.dirname(raw_dir), "market.json")
+    if not os.path.exists(marker):
+        symbols = write_market(raw_dir, n_symbols, years, seed)
+        with open(marker, "w") as f:
+            json.dump({"symbols": len(symbols), "years": years, "seed": seed}, f)
+    return raw_dir
+
+
+def sector_of(symbol: str) -> str:
+    return SECTORS[int(symbol[3:7]) % len(SECTORS)]
@@ -0,0 +1,365 @@
+"""
+daily.py
+--------
+End-of-day incremental update of the pipeline outputs.
+
+A full run (generate_flags → run_optimizer → run_backtest) recomputes
+every day of history. DailyState keeps what those stages need to carry
+on instead:
+
+  signals     the SignalBook of streaming indicators (live/engine.py)
+  optimizer   the trailing-window MomentState, the returns behind it,
+              last closes and returns
+  backtest    the adaptive-vol stop state and stopped growth so far
+
+and, given the new rows in data/raw, appends exactly the rows a full
+rerun would add to
+
+  data/signals/<SECTOR>_flag.csv      one flag per sector per day
+  data/weights/allocations.csv        one weight row per day
+  data/backtest/portfolio_value.csv   last row rewritten, one row added
+
+The backtest pairs weight row t with the return of the day before the
+flag, so the newest portfolio row always has zero return until the next
+day's weights arrive: each update truncates that one provisional line
+and writes it back finalized. Work per day is constant — tail reads,
+one small QP, one stop step — whatever the history length.
+
+run_optimizer solves days in `chunk_days` chunks and builds each chunk's
+moments afresh, folding the window before the chunk in one pooled step
+(optimizer/rule_based._window_moments). The state does the same at
+every chunk edge, so its moments match a full rerun to the bit however
+many days an update catches up.
+
+Output byte sizes are kept in the state and every update starts by
+truncating the files back to them, so a run that died halfway is simply
+redone. A day is only appended once every selected symbol has its bar;
+until then it and the days after it are held. A day some symbol skipped
+for good (it has later bars) changes the full run's alignment, so it
+raises and needs a full rerun + `--init`.
+
+    state = DailyState.build()        # from the outputs of a full run
+    state.update()                    # append whatever data/raw gained
+    state.save(STATE_FILE)
+    full_rerun_diff(state)            # [] when the outputs match a full rerun
+"""
+
+import glob
+import io
+import json
+import os
+import warnings
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from backtest.stops import AdaptiveVolStop
+from live.engine import SignalBook
+from live.replay import Bar
+from optimizer.moments import MomentState
+from optimizer.parallel import CHUNK_DAYS
+from optimizer.rule_based import allocate_days, cap_and_normalize
+from signals.streaming import Stateful
+from store.prices import RAW_DIR, load_panel, read_raw_tail, simple_returns, symbol_file
+
+META_FILE     = "metadata/selected_current.yaml"
+SIGNAL_DIR    = "data/signals"
+WEIGHT_CSV    = "data/weights/allocations.csv"
+PORTFOLIO_CSV = "data/backtest/portfolio_value.csv"
+STATE_FILE    = "data/live/daily.json"
+
+INITIAL_CAPITAL = 1_000_000
+
+
+def _flag_csv(sector: str) -> str:
+    return os.path.join(SIGNAL_DIR, f"{sector}_flag.csv")
+
+
+def _last_line_offset(path: str) -> int:
+    """Byte offset where the file's last line starts."""
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        pos = max(size - 4096, 0)
+        f.seek(pos)
+        tail = f.read().rstrip(b"\n")
+    return pos + tail.rfind(b"\n") + 1
+
+
+class DailyState:
+    """Everything an end-of-day update carries over from the previous day."""
+
+    def __init__(self, selected: dict, sectors: list, lookback: int = 30,
+                 k: float = 0.125, stop_lookback: int = 30, chunk_days: int = CHUNK_DAYS):
+        self.selected = selected
+        self.sectors = sectors                  # allocations.csv column order
+        self.lookback = lookback
+        self.chunk_days = chunk_days            # run_optimizer's --chunk-days
+        self.k, self.stop_lookback = k, stop_lookback
+        self.book = SignalBook(selected)
+        self.available = [s for s in selected if selected[s] in self.book.signals]   # backtest order
+        self.priced = [s for s in sectors if s in self.available]                     # optimizer order
+        self.moments = MomentState(len(self.priced), "window", window=lookback)
+        self.tail = deque(maxlen=lookback + 1)  # return rows a chunk edge rebuilds the moments from
+        self.stop = AdaptiveVolStop(k, stop_lookback)
+        self.growth = 1.0
+        self.weights = 0            # weight rows written
+        self.last_date = None
+        self.last_close = {}
+        self.last_ret = {}
+        self.portfolio_offset = 0   # where the provisional portfolio line starts
+        self.sizes = {}
+
+    @classmethod
+    def build(cls, lookback: int = 30, k: float = 0.125, stop_lookback: int = 30,
+              chunk_days: int = CHUNK_DAYS) -> "DailyState":
+        """
+        State as of the last full run, rebuilt from its outputs and the
+        price store without re-solving any day.
+        """
+        with open(META_FILE) as f:
+            selected = yaml.safe_load(f)
+        sectors = list(pd.read_csv(WEIGHT_CSV, nrows=0).columns)
+        state = cls(selected, sectors, lookback, k, stop_lookback, chunk_days)
+        symbols = [selected[s] for s in state.available]
+        panel = load_panel()
+
+        # Signals: stream every bar generate_flags saw
+        flags = {os.path.basename(p).split("_")[0].upper(): pd.read_csv(p)["flag"].values
+                 for p in glob.glob(os.path.join(SIGNAL_DIR, "*_flag.csv"))}
+        for sector, symbol in zip(state.available, symbols):
+            seen = state.book.bars
+            for row in panel.ohlcv(symbol).itertuples(index=False):
+                state.book.update(Bar(symbol, row.date, row.open, row.high, row.low, row.close, row.volume))
+            if state.book.bars - seen != len(flags[sector]) or state.book.flags[symbol] != flags[sector][-1]:
+                raise ValueError(f"{_flag_csv(sector)} is out of date; rerun generate_flags first")
+
+        # Optimizer: same trailing rows generate_allocations used
+        sel = panel.select(symbols)
+        close = sel.field("close")
+        rets = simple_returns(close[:, [state.available.index(s) for s in state.priced]])[1:]
+        min_len = min([len(x) for x in flags.values()] + ([len(rets)] if state.priced else []))
+        weights = pd.read_csv(WEIGHT_CSV)
+        if len(weights) != min_len:
+            raise ValueError(f"{WEIGHT_CSV} has {len(weights)} rows, expected {min_len}; rerun run_optimizer first")
+        # The moments of the chunk the next weight row falls in, pushed up to today
+        rets = rets[-min_len:]
+        first = max(min_len - min_len % chunk_days - 1, 0)
+        state.moments = state._chunk_moments(rets[max(first - lookback, 0):], min_len - first)
+        state.tail.extend(rets[-(lookback + 1):])
+        state.weights = min_len
+
+        # Backtest: every row but the provisional last one, as run_backtest computes them
+        ret = simple_returns(close)
+        ret[0] = 0
+        L = min(map(len, flags.values()))
+        if len(weights) != L - 1:
+            raise ValueError("weights are not one row shorter than the flags; incremental updates need that layout")
+        rets_df = pd.DataFrame({s: ret[-L:, j] for j, s in enumerate(state.available)})
+        portfolio_returns = (weights * rets_df).sum(axis=1).values
+        for r in portfolio_returns[:-1]:
+            active = state.stop.step(r)
+            state.growth = state.growth * (1 + r * active)
+
+        state.last_date = str(sel.dates[-1])
+        state.portfolio_offset = _last_line_offset(PORTFOLIO_CSV)
+        with open(PORTFOLIO_CSV, "rb") as f:
+            f.seek(state.portfolio_offset)
+            last = f.read().decode()
+        if last != state._portfolio_lines(state.last_date)[0]:
+            raise ValueError(f"{PORTFOLIO_CSV} does not match the current weights; rerun run_backtest first")
+
+        state.last_close = {s: float(close[-1, j]) for j, s in enumerate(state.available)}
+        state.last_ret = {s: float(ret[-1, j]) for j, s in enumerate(state.available)}
+        state._record_sizes()
+        return state
+
+    def _chunk_moments(self, rows: np.ndarray, pushed: int) -> MomentState:
+        """
+        Moments as rolling_moments builds them for a chunk: the rows before
+        the last `pushed` folded in one step, then those pushed one by one.
+        """
+        moments = MomentState(len(self.priced), "window", window=self.lookback)
+        rows = np.asarray(rows, dtype="float64").reshape(-1, len(self.priced))
+        moments.absorb(rows[:len(rows) - pushed])
+        for row in rows[len(rows) - pushed:]:
+            moments.push(row)
+        return moments
+
+    def _outputs(self) -> list:
+        return [_flag_csv(s) for s in self.available] + [WEIGHT_CSV, PORTFOLIO_CSV]
+
+    def _record_sizes(self) -> None:
+        self.sizes = {path: os.path.getsize(path) for path in self._outputs()}
+
+    def _new_bars(self, raw_dir: str) -> dict:
+        """{date: {symbol: Bar}} for every raw row after last_date."""
+        days = {}
+        for sector in self.available:
+            symbol = self.selected[sector]
+            df = read_raw_tail(symbol_file(symbol, raw_dir), self.last_date)
+            for date, row in zip(df.index.strftime("%Y-%m-%d"), df.itertuples(index=False)):
+                days.setdefault(date, {})[symbol] = Bar(symbol, date, row.open, row.high, row.low,
+                                                        row.close, row.volume)
+        return days
+
+    def update(self, raw_dir: str = RAW_DIR) -> list:
+        """Append every new day in raw_dir to the outputs. Returns the dates added."""
+        for path, size in self.sizes.items():   # undo a half-finished earlier run
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+        days = self._new_bars(raw_dir)
+        symbols = [self.selected[s] for s in self.available]
+        dates = sorted(days)
+        for i, date in enumerate(dates):
+            missing = [sym for sym in symbols if sym not in days[date]]
+            if not missing:
+                continue
+            skipped = [sym for sym in missing if any(sym in days[d] for d in dates[i + 1:])]
+            if skipped:
+                raise ValueError(f"{date}: no bar for {skipped}, which trade later; "
+                                 "rerun the full pipeline and --init")
+            warnings.warn(f"{date}: no bar yet for {missing}; holding it and later days", stacklevel=2)
+            dates = dates[:i]
+            break
+        for date in dates:
+            self._step(date, days[date])
+        self._record_sizes()
+        return dates
+
+    def _step(self, date: str, bars: dict) -> None:
+        # 1. Flags
+        for sector in self.available:
+            symbol = self.selected[sector]
+            self.book.update(bars[symbol])
+            if self.book.last_date.get(symbol) != date:
+                raise ValueError(f"{date}: {symbol} produced no flag; rerun the full pipeline and --init")
+        flags = np.array([[self.book.flags.get(self.selected.get(s), 0) for s in self.sectors]])
+        for sector in self.available:
+            with open(_flag_csv(sector), "a") as f:
+                f.write(f"{self.book.flags[self.selected[sector]]}\n")
+
+        # 2. Weights from the window ending yesterday; a new chunk starts its moments afresh
+        if self.weights % self.chunk_days == 0:
+            self.moments = self._chunk_moments(self.tail, 1)
+        priced = np.array([s in self.priced for s in self.sectors])
+        cols = np.flatnonzero(priced)
+        mu = np.full((1, len(self.sectors)), np.nan)
+        cov = np.zeros((1, len(self.sectors), len(self.sectors)))
+        mu[0, cols] = self.moments.mean
+        cov[0, cols[:, None], cols[None, :]] = self.moments.cov()
+        ready = np.array([self.weights >= self.lookback])
+        raw = allocate_days(flags, priced, mu, cov, ready)
+        weights = cap_and_normalize(pd.DataFrame(raw, columns=self.sectors))
+        with open(WEIGHT_CSV, "a") as f:
+            f.write(weights.to_csv(header=False, index=False))
+        self.weights += 1
+
+        # 3. Yesterday's portfolio row is final now that its weights exist
+        rets = pd.DataFrame([self.last_ret])[self.available]
+        r = (weights * rets).sum(axis=1).values[0]
+        active = self.stop.step(r)
+        self.growth = self.growth * (1 + r * active)
+
+        # 4. Roll prices forward
+        ret = {s: bars[self.selected[s]].close / self.last_close[s] - 1.0 for s in self.available}
+        row = np.array([ret[s] for s in self.priced])
+        self.moments.push(row)
+        self.tail.append(row)
+        self.last_ret = ret
+        self.last_close = {s: bars[self.selected[s]].close for s in self.available}
+
+        # 5. Rewrite the provisional line, add today's (zero return until tomorrow)
+        final, provisional = self._portfolio_lines(self.last_date, date)
+        with open(PORTFOLIO_CSV, "r+b") as f:
+            f.truncate(self.portfolio_offset)
+            f.seek(self.portfolio_offset)
+            f.write(final.encode())
+            self.portfolio_offset = f.tell()
+            f.write(provisional.encode())
+        self.last_date = date
+
+    def _portfolio_lines(self, *dates) -> list:
+        """portfolio_value.csv lines at the current stopped equity, formatted as run_backtest writes them."""
+        value = self.growth * INITIAL_CAPITAL
+        frame = pd.DataFrame({"PortfolioValue": [value] * len(dates)}, index=pd.DatetimeIndex(dates))
+        return frame.to_csv(header=False).splitlines(keepends=True)
+
+    def state(self) -> dict:
+        return {
+            "selected": self.selected,
+            "sectors": self.sectors,
+            "lookback": self.lookback,
+            "k": self.k,
+            "stop_lookback": self.stop_lookback,
+            "chunk_days": self.chunk_days,
+            "book": self.book.state(),
+            "moments": self.moments.state(),
+            "tail": [row.tolist() for row in self.tail],
+            "stop": self.stop.state(),
+            "growth": self.growth,
+            "weights": self.weights,
+            "last_date": self.last_date,
+            "last_close": self.last_close,
+            "last_ret": self.last_ret,
+            "portfolio_offset": self.portfolio_offset,
+            "sizes": self.sizes,
+        }
+
+    @classmethod
+    def restore(cls, state: dict) -> "DailyState":
+        if "tail" not in state:
+            raise ValueError("daily state predates chunk-aligned moments; rebuild it with --init")
+        obj = cls(state["selected"], state["sectors"], state["lookback"], state["k"], state["stop_lookback"],
+                  state["chunk_days"])
+        obj.book = SignalBook.restore(state["book"])
+        obj.moments = MomentState.restore(state["moments"])
+        obj.tail.extend(np.array(row, dtype="float64") for row in state["tail"])
+        obj.stop = Stateful.restore(state["stop"])
+        for key in ("growth", "weights", "last_date", "last_close", "last_ret", "portfolio_offset", "sizes"):
+            setattr(obj, key, state[key])
+        return obj
+
+    def save(self, path: str = STATE_FILE) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = STATE_FILE) -> "DailyState":
+        with open(path) as f:
+            return cls.restore(json.load(f))
+
+
+def full_rerun_diff(state: DailyState) -> list:
+    """
+    Outputs whose bytes differ from what a full rerun (generate_flags →
+    run_optimizer → run_backtest) would write now, recomputed in memory.
+    While update() holds a day, the rerun sees bars the outputs do not
+    have yet and differs.
+    """
+    from backtest.simulate import simulate
+    from optimizer.rule_based import allocate
+    from signals import sector_flags
+
+    panel = load_panel()
+    selected = {s: state.selected[s] for s in state.available}
+    flags = sector_flags(panel, selected)
+    expected = {_flag_csv(s): flags[s].to_csv(index=False) for s in state.available}
+    signals = {s: flags[s].values for s in state.sectors if s in flags}
+    weights = cap_and_normalize(allocate(signals, state.selected, panel, state.lookback,
+                                         chunk_days=state.chunk_days))
+    expected[WEIGHT_CSV] = weights.to_csv(index=False)
+    weights = pd.read_csv(io.StringIO(expected[WEIGHT_CSV]))      # as run_backtest reads it back
+    result = simulate(weights, signals, state.selected, panel, state.k, state.stop_lookback, verbose=False)
+    expected[PORTFOLIO_CSV] = result.equity.to_frame(name="PortfolioValue").to_csv()
+    differ = []
+    for path, text in expected.items():
+        with open(path) as f:
+            if f.read() != text:
+                differ.append(path)
+    return differ
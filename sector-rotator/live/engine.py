@@ -0,0 +1,155 @@
+"""
+engine.py
+---------
+asyncio driver for the streaming signals.
+
+A producer task drains a bar source (e.g. live.replay.ReplaySource) into
+a bounded queue; the consumer pushes every bar through its symbol's
+StreamingSignal and emits a FlagChange whenever a sector's flag moves.
+Each signal does O(1) work per bar, so throughput is bounded by the
+feed, not by history length.
+
+SignalBook holds all per-symbol state and checkpoints to JSON; a book
+restored from a checkpoint ignores bars it has already seen, so a
+restarted feed can simply replay from the top.
+"""
+
+import asyncio
+import inspect
+import json
+import math
+import os
+import time
+from dataclasses import dataclass
+from importlib import import_module
+
+import numpy as np
+
+from signals import SECTOR_MODULES
+from signals.streaming import Stateful
+
+
+@dataclass
+class FlagChange:
+    date: str
+    sector: str
+    symbol: str
+    flag: int
+    previous: int       # None on a symbol's first bar
+    latency: float      # seconds from bar publication to flag
+
+
+class SignalBook:
+    """Streaming signal, last flag and last bar date for every traded symbol."""
+
+    def __init__(self, selected: dict, params: dict = None):
+        params = params or {}
+        self.sectors = {}
+        self.signals = {}
+        for sector, symbol in selected.items():
+            if sector not in SECTOR_MODULES:
+                continue
+            mod = import_module(SECTOR_MODULES[sector])
+            self.sectors[symbol] = sector
+            self.signals[symbol] = mod.StreamingSignal(**params.get(sector, {}))
+        self.flags = {}
+        self.last_date = {}
+        self.bars = 0
+
+    def update(self, bar) -> FlagChange:
+        symbol = bar.symbol
+        if symbol not in self.signals or bar.date <= self.last_date.get(symbol, ""):
+            return None
+        if math.isnan(bar.close):
+            return None
+        flag = self.signals[symbol].update(bar)
+        if flag is None:    # bar the batch signal would have dropped
+            return None
+        self.bars += 1
+        self.last_date[symbol] = bar.date
+        previous = self.flags.get(symbol)
+        self.flags[symbol] = flag
+        if flag == previous:
+            return None
+        return FlagChange(bar.date, self.sectors[symbol], symbol, flag, previous, 0.0)
+
+    def state(self) -> dict:
+        return {
+            "sectors": self.sectors,
+            "signals": {sym: sig.state() for sym, sig in self.signals.items()},
+            "flags": self.flags,
+            "last_date": self.last_date,
+            "bars": self.bars,
+        }
+
+    @classmethod
+    def restore(cls, state: dict) -> "SignalBook":
+        book = object.__new__(cls)
+        book.sectors = state["sectors"]
+        book.signals = {sym: Stateful.restore(s) for sym, s in state["signals"].items()}
+        book.flags = state["flags"]
+        book.last_date = state["last_date"]
+        book.bars = state["bars"]
+        return book
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SignalBook":
+        with open(path) as f:
+            return cls.restore(json.load(f))
+
+
+async def run(source, book: SignalBook, on_change=None, maxsize: int = 1024,
+              checkpoint: str = None, checkpoint_every: int = 0) -> dict:
+    """
+    Consume `source` until it ends. on_change(FlagChange) may be a plain
+    function or a coroutine function. Returns throughput / latency stats.
+    """
+    queue = asyncio.Queue(maxsize)
+
+    async def produce():
+        try:
+            async for bar in source:
+                await queue.put(bar)
+        finally:
+            await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    latencies = []
+    changes = 0
+    t0 = time.perf_counter()
+    while (bar := await queue.get()) is not None:
+        seen = book.bars
+        change = book.update(bar)
+        latency = time.perf_counter() - bar.published
+        latencies.append(latency)
+        if change is not None:
+            changes += 1
+            change.latency = latency
+            if on_change is not None:
+                result = on_change(change)
+                if inspect.isawaitable(result):
+                    await result
+        if checkpoint and checkpoint_every and book.bars != seen and book.bars % checkpoint_every == 0:
+            book.save(checkpoint)
+    await producer
+    elapsed = time.perf_counter() - t0
+    if checkpoint:
+        book.save(checkpoint)
+
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "bars": len(latencies),
+        "changes": changes,
+        "seconds": elapsed,
+        "bars_per_sec": len(latencies) / elapsed if elapsed > 0 else float("inf"),
+        "latency_p50_us": float(np.percentile(lat, 50) * 1e6),
+        "latency_p99_us": float(np.percentile(lat, 99) * 1e6),
+        "latency_max_us": float(lat.max() * 1e6),
+    }
@@ -0,0 +1,64 @@
+"""
+replay.py
+---------
+Replays data/raw/*.csv as a live bar feed, so the streaming signal path
+can be exercised and timed offline.
+
+Bars of all requested symbols come out in date order (symbol order within
+a day), stamped with the perf_counter time they were published. `rate`
+paces the feed in bars per second; None replays as fast as the consumer
+keeps up.
+
+    async for bar in ReplaySource(["INFY.NS", "TCS.NS"], rate=500):
+        ...
+"""
+
+import asyncio
+import heapq
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from store.prices import RAW_DIR, read_raw_csv, symbol_file
+
+
+class Bar(NamedTuple):
+    symbol: str
+    date: str
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    published: float = 0.0
+
+
+class ReplaySource:
+    def __init__(self, symbols, raw_dir: str = RAW_DIR, start=None, end=None, rate: float = None):
+        self.symbols = list(symbols)
+        self.raw_dir = raw_dir
+        self.start, self.end = start, end
+        self.rate = rate
+
+    def _rows(self, rank: int, symbol: str):
+        df = read_raw_csv(symbol_file(symbol, self.raw_dir))
+        if self.start is not None:
+            df = df.loc[df.index >= np.datetime64(self.start)]
+        if self.end is not None:
+            df = df.loc[df.index <= np.datetime64(self.end)]
+        dates = df.index.strftime("%Y-%m-%d")
+        for date, row in zip(dates, df.itertuples(index=False)):
+            yield date, rank, symbol, row
+
+    async def __aiter__(self):
+        feeds = [self._rows(rank, sym) for rank, sym in enumerate(self.symbols)]
+        interval = 1.0 / self.rate if self.rate else 0.0
+        next_at = time.perf_counter()
+        for date, _, symbol, row in heapq.merge(*feeds):
+            if interval:
+                next_at += interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield Bar(symbol, date, row.open, row.high, row.low, row.close, row.volume, time.perf_counter())
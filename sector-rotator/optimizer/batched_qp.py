@@ -0,0 +1,124 @@
+"""
+batched_qp.py
+-------------
+Solves the rule-based daily allocation problem for every day at once:
+
+    minimize   -w @ mu + 0.5 * w @ cov @ w
+    subject to sum(|w|) == gross,  -cap <= w <= cap,  w[~mask] == 0
+
+Inputs are stacked along the first axis: mu (T × S), cov (T × S × S),
+mask (T × S). The gross-leverage constraint is handled exactly with a
+long/short split: every asset trades on a fixed side (`signs`, +1 by
+default, which is where SLSQP started from x0 = 1/n and stays), so
+|w| = signs * w and the feasible set is a capped simplex. FISTA runs on
+all T problems as one array; the projection onto the capped simplex is
+the exact sort-based one, no inner bisection.
+
+A covariance estimated from K < S returns can be passed as its factor
+instead (cov = F @ F.T, F: T × S × K); each step then costs S·K per day
+rather than S², which is what keeps wide sector blocks cheap.
+"""
+
+import numpy as np
+
+
+def project_capped_simplex(v: np.ndarray, mask: np.ndarray, cap: float, total: float = 1.0) -> np.ndarray:
+    """
+    Row-wise Euclidean projection of v (T × S) onto
+    {u : 0 <= u <= cap, sum(u) == total, u[~mask] == 0}.
+    Rows where the set is empty (mask.sum() * cap < total) come back capped.
+    """
+    T, S = v.shape
+    big = np.abs(v[mask]).max() + cap + total + 1.0 if mask.any() else 1.0
+    vm = np.where(mask, v, -big)
+
+    # u_i(tau) = clip(v_i - tau, 0, cap) is piecewise linear in tau with
+    # kinks at v_i (asset starts moving) and v_i - cap (asset hits the cap)
+    points = np.concatenate([vm, vm - cap], axis=1)
+    steps = np.concatenate([mask, -mask.astype(int)], axis=1).astype(float)
+    order = np.argsort(-points, axis=1, kind="stable")
+    points = np.take_along_axis(points, order, axis=1)
+    steps = np.take_along_axis(steps, order, axis=1)
+
+    slope = np.cumsum(steps, axis=1)                 # #free assets just below each kink
+    gaps = points[:, :-1] - points[:, 1:]
+    level = np.zeros_like(points)                    # sum(u) at each kink
+    level[:, 1:] = np.cumsum(slope[:, :-1] * gaps, axis=1)
+
+    k = (level < total).sum(axis=1) - 1              # last kink still below total
+    k = np.clip(k, 0, 2 * S - 1)
+    rows = np.arange(T)
+    s = slope[rows, k]
+    tau = points[rows, k] - np.where(s > 0, (total - level[rows, k]) / np.where(s > 0, s, 1), 0.0)
+    return np.where(mask, np.clip(v - tau[:, None], 0.0, cap), 0.0)
+
+
+def solve_capped_l1(mu, cov, mask, signs=None, cap: float = 0.5, gross: float = 1.0,
+                    x0=None, max_iter: int = 2000, tol: float = 1e-12, factor=None):
+    """
+    Solve all T problems together. Returns (weights, iterations, converged)
+    where weights is (T × S), iterations the per-day FISTA step count
+    (0 for days not solved) and converged a per-day bool array.
+    Days with no masked asset get zeros; days whose mask cannot reach
+    `gross` under `cap` (e.g. a single asset) keep the x0 weights, which is
+    what the per-day SLSQP path fell back to. With `factor` given, cov is
+    ignored (pass None).
+    """
+    mu = np.asarray(mu, dtype="float64")
+    mask = np.asarray(mask, dtype=bool)
+    T, S = mu.shape
+    signs = np.ones((T, S)) if signs is None else np.where(np.asarray(signs) < 0, -1.0, 1.0)
+
+    n = mask.sum(axis=1)
+    feasible = (n > 0) & (n * cap >= gross)
+    if x0 is None:
+        x0 = np.where(mask, gross / np.maximum(n, 1)[:, None], 0.0) * signs
+    x0 = np.asarray(x0, dtype="float64")
+
+    # Work in u = signs * w >= 0, where the problem is a convex QP
+    q = np.where(mask, signs * np.nan_to_num(mu), 0.0)
+    if factor is None:
+        P = np.nan_to_num(np.asarray(cov, dtype="float64")) * signs[:, :, None] * signs[:, None, :]
+        P = P * mask[:, :, None] * mask[:, None, :]
+        L = np.linalg.eigvalsh(P)[:, -1]
+    else:
+        P = np.nan_to_num(np.asarray(factor, dtype="float64")) * (signs * mask)[:, :, None]
+        L = np.linalg.eigvalsh(np.einsum("tik,til->tkl", P, P))[:, -1]     # same top eigenvalue, K × K
+    step = 1.0 / np.where(L > 0, L, 1.0)
+
+    live = feasible.copy()
+    u = np.where(feasible[:, None], project_capped_simplex(np.abs(x0), mask, cap, gross), 0.0)
+    y, t_k = u.copy(), np.ones(T)
+    converged = ~feasible
+    iterations = np.zeros(T, dtype=int)
+    it = 0
+    for it in range(1, max_iter + 1):
+        idx = np.flatnonzero(live)
+        if len(idx) == 0:
+            break
+        yi = y[idx]
+        if factor is None:
+            grad = np.einsum("tij,tj->ti", P[idx], yi) - q[idx]
+        else:
+            Pi = P[idx]
+            grad = np.einsum("tik,tk->ti", Pi, np.einsum("tik,ti->tk", Pi, yi)) - q[idx]
+        u_new = project_capped_simplex(yi - step[idx, None] * grad, mask[idx], cap, gross)
+        t_new = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t_k[idx] ** 2))
+        delta = u_new - u[idx]
+
+        # Gradient-based restart keeps FISTA monotone on these tiny problems
+        restart = np.einsum("ti,ti->t", yi - u_new, delta) > 0
+        mom = np.where(restart, 0.0, (t_k[idx] - 1.0) / t_new)
+        y[idx] = u_new + mom[:, None] * delta
+        t_k[idx] = np.where(restart, 1.0, t_new)
+        u[idx] = u_new
+
+        done = np.abs(delta).max(axis=1) <= tol
+        converged[idx[done]] = True
+        live[idx[done]] = False
+        iterations[idx[done]] = it
+    iterations[live] = it
+
+    w = signs * u
+    w[~feasible] = np.where(n[~feasible, None] > 0, x0[~feasible], 0.0)
+    return w, iterations, converged
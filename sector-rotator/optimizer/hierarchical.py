@@ -0,0 +1,138 @@
+"""
+hierarchical.py
+---------------
+Two-level allocation for a book of several names per sector
+(metadata/selected_book.yaml, {sector: [lead, second, ...]}):
+
+  1. within each sector, long-only weights over its names: the
+     capped-simplex QP of batched_qp on that sector's own trailing mean /
+     covariance block (each name ≤ name_cap, weights sum to 1);
+  2. across sectors, rule_based.allocate_days on the sleeves those
+     weights make. A sleeve's window returns are its names' window
+     returns times the day's within-sector weights, so sector means and
+     covariances come from S series, never from an N × N matrix.
+
+The sector flag (computed on the lead name, exactly as for a one-name
+book) reaches every constituent through its sector's weight. Sector
+weights are capped and normalized (cap_and_normalize) before they are
+spread over the names, so the name weights already have gross 1.
+
+Within a sector the covariance is only ever used through its window
+factor (batched_qp's `factor`), so per day the work is Σ n_s · lookback
+plus S² — linear in the number of holdings — and all days of a chunk
+go through both levels stacked (optimizer.parallel shards the chunks).
+A name with a gap in its trailing window sits that day out. With one
+name per sector this is rule_based.allocate() again, to rounding.
+
+    weights = book_allocate(signals, book, load_panel(), lookback=30)
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from optimizer.batched_qp import solve_capped_l1
+from optimizer.parallel import CHUNK_DAYS, run_sharded
+from optimizer.rule_based import CAP, allocate_days, cap_and_normalize
+from store.prices import simple_returns
+
+
+def book_returns(book: dict, panel, sectors) -> tuple:
+    """
+    (dates, names, sector code per name, returns) for `sectors` of the book.
+    The calendar is the dates on which every sector's lead has a close (the
+    one-name book's inner join); returns are NaN across a name's gaps and
+    on the first row.
+    """
+    dates = panel.select([book[s][0] for s in sectors]).dates
+    rows = np.searchsorted(panel.dates, dates)
+    names, codes = [], []
+    for k, sector in enumerate(sectors):
+        for name in book[sector]:
+            if name in panel.symbols:
+                names.append(name)
+                codes.append(k)
+    close = np.asarray(panel.field("close", names))[rows]
+    return dates, names, np.array(codes, dtype=int), simple_returns(close)
+
+
+def _window_factor(windows: np.ndarray) -> tuple:
+    """
+    Mean (D × n), covariance factor F (D × n × L, cov = F Fᵀ with ddof=1)
+    and usable mask of (D × n × L) return windows.
+    """
+    ok = np.isfinite(windows).all(axis=-1)
+    x = np.where(ok[..., None], windows, 0.0)
+    mu = x.mean(axis=-1)
+    return mu, (x - mu[..., None]) / np.sqrt(windows.shape[-1] - 1), ok
+
+
+def _book_chunk(arrays: dict, start: int, stop: int, lookback: int, cap: float, name_cap: float) -> np.ndarray:
+    flags, priced, rets, codes = arrays["flags"], arrays["priced"], arrays["rets"], arrays["codes"]
+    S, N = flags.shape[1], rets.shape[1]
+    out = np.zeros((stop - start, N))
+    first = max(start, lookback)
+    if first >= stop:
+        return out
+    D = stop - first
+    windows = sliding_window_view(rets, lookback, axis=0)[first - lookback:stop - lookback]   # D × N × L
+
+    # Level 1: within-sector weights and the sleeve each one makes
+    within = np.zeros((D, N))
+    sleeve = np.zeros((D, S, lookback))
+    live = np.zeros((D, S), dtype=bool)
+    for s in np.flatnonzero(priced):
+        cols = np.flatnonzero(codes == s)
+        if len(cols) == 0:
+            continue
+        win = windows[:, cols]
+        mu, F, ok = _window_factor(win)
+        w, _, _ = solve_capped_l1(mu, None, ok, cap=name_cap, factor=F)
+        within[:, cols] = w
+        sleeve[:, s] = np.einsum("dil,di->dl", np.where(ok[..., None], win, 0.0), w)
+        live[:, s] = ok.any(axis=1)
+
+    # Level 2: rule-based MVO over the sleeves, sectors without a live name left out
+    mu_s, F_s, _ = _window_factor(sleeve)
+    cov_s = np.einsum("dik,djk->dij", F_s, F_s)
+    mu_s = np.where(live, mu_s, np.nan)
+    cov_s = cov_s * live[:, :, None] * live[:, None, :]
+    sector_w = allocate_days(np.where(live, flags[first:stop], 0), priced, mu_s, cov_s, np.ones(D, dtype=bool), cap)
+    sector_w = cap_and_normalize(sector_w, cap)
+    out[first - start:] = sector_w[:, codes] * within
+    return out
+
+
+def book_allocate(signals: dict, book: dict, panel, lookback: int = 30, cap: float = CAP,
+                  name_cap: float = CAP, workers: int = 1, chunk_days: int = CHUNK_DAYS) -> pd.DataFrame:
+    """
+    Name-level weights (one column per book name, grouped by sector in
+    `signals` order) from in-memory sector flags ({sector: array}) — the
+    book counterpart of rule_based.allocate, already capped and normalized.
+    """
+    signals = {k: np.asarray(v) for k, v in signals.items()}
+    priced = [s for s in signals if s in book and book[s] and book[s][0] in panel.symbols]
+    _, names, codes, rets = book_returns(book, panel, priced)
+    rets = rets[1:]
+
+    min_len = min([len(x) for x in signals.values()] + ([len(rets)] if priced else []))
+    flags = np.column_stack([signals[s][-min_len:] for s in signals])
+    sector_codes = np.array([list(signals).index(s) for s in priced])[codes] if priced else codes
+
+    arrays = {
+        "flags": flags,
+        "priced": np.array([s in priced for s in signals]),
+        "rets": np.ascontiguousarray(rets[-min_len:]),
+        "codes": sector_codes,
+    }
+    parts = run_sharded(_book_chunk, arrays, min_len, workers=workers, chunk_days=chunk_days,
+                        lookback=lookback, cap=cap, name_cap=name_cap)
+    weights = pd.DataFrame(np.concatenate(parts) if parts else np.zeros((0, len(names))), columns=names)
+    weights.index.name = "Date"
+    return weights
+
+
+def sector_weights(weights: pd.DataFrame, book: dict) -> pd.DataFrame:
+    """Name-level weights summed back to one column per sector."""
+    sector_of = {name: sector for sector, names in book.items() for name in names}
+    return weights.T.groupby(weights.columns.map(sector_of), sort=False).sum().T
@@ -1,88 +1,200 @@
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import time
 import pandas as pd
 import numpy as np
-import cvxpy as cp
-import os
 import yaml
+from store.prices import load_panel, simple_returns
+from optimizer.moments import rolling_moments
+from optimizer.parallel import run_sharded, CHUNK_DAYS
+from profiling import trace
 
 # Input paths
 WEIGHT_CSV = "data/weights/allocations.csv"
 SIGNAL_DIR = "data/signals"
 META_FILE = "metadata/selected_current.yaml"
-RET_DIR = "data/raw"
 OUT_FILE = "data/weights/allocations.csv"
+STATUS_FILE = "data/weights/mv_solve_status.csv"
+
+
+def load_inputs():
+    """Long-only flags (T × S) and the tail-aligned returns frame over the same sectors."""
+    # Load selected tickers (from YAML)
+    with open(META_FILE) as f:
+        selected = yaml.safe_load(f)
+
+    # Load signal flags (only sectors with flag=1 are active)
+    signals = {}
+    for sector, symbol in selected.items():
+        fname = f"{SIGNAL_DIR}/{sector}_flag.csv"
+        if os.path.exists(fname):
+            df = pd.read_csv(fname)
+            signals[sector] = df["flag"].values
+
+    min_len = min(map(len, signals.values()))
+    for k in signals:
+        signals[k] = signals[k][-min_len:]
+
+    # Load return data
+    panel = load_panel()
+    priced = {sector: symbol for sector, symbol in selected.items() if symbol in panel.symbols}
+    ret = simple_returns(panel.select(priced.values()).field("close"))
+    ret[0] = 0
+    rets = {sector: ret[:, j] for j, sector in enumerate(priced)}
+
+    rets_df = pd.DataFrame(rets).reset_index(drop=True)
+    rets_df = rets_df.iloc[-min_len:].reset_index(drop=True)
 
-# Load selected tickers (from YAML)
-with open(META_FILE) as f:
-    selected = yaml.safe_load(f)
-
-# Load signal flags (only sectors with flag=1 are active)
-signals = {}
-for sector, symbol in selected.items():
-    fname = f"{SIGNAL_DIR}/{sector.lower()}_flag.csv"
-    if os.path.exists(fname):
-        df = pd.read_csv(fname)
-        signals[sector] = df["flag"].values
-
-min_len = min(map(len, signals.values()))
-for k in signals:
-    signals[k] = signals[k][-min_len:]
-
-# Load return data
-rets = {}
-for sector, symbol in selected.items():
-    fpath = f"{RET_DIR}/{symbol.replace('.', '_')}.csv"
-    if not os.path.exists(fpath):
-        continue
-    df = pd.read_csv(fpath)
-    df["close"] = pd.to_numeric(df["close"], errors="coerce")
-    df = df.dropna(subset=["close"])
-    df["ret"] = df["close"].pct_change().fillna(0)
-    rets[sector] = df["ret"].values
-
-min_ret_len = min(map(len, rets.values()))
-for k in rets:
-    rets[k] = rets[k][-min_ret_len:]
-
-rets_df = pd.DataFrame(rets).reset_index(drop=True)
-rets_df = rets_df.iloc[-min_len:].reset_index(drop=True)
-
-# Allocate weights dynamically with mean-variance optimization
-weights_all = []
-for i in range(len(rets_df)):
-    # Step 1: Active sectors at time i
-    active_sectors = [s for s in signals if signals[s][i] == 1 and s in rets_df.columns]
-    if len(active_sectors) == 0:
-        weights_all.append([0] * len(rets_df.columns))
-        continue
-
-    mu = rets_df[active_sectors].iloc[:i+1].mean().values
-    sigma = rets_df[active_sectors].iloc[:i+1].cov().values
-
-    x = cp.Variable(len(mu))
-    objective = cp.Maximize(mu @ x - 0.5 * cp.quad_form(x, sigma))
-    constraints = [
-        x >= 0,
-        cp.sum(x) == 1
-    ]
-    prob = cp.Problem(objective, constraints)
+    # Sectors without returns can never be active
+    long_flags = np.column_stack([
+        (signals[s] == 1) if s in signals else np.zeros(min_len, dtype=bool)
+        for s in rets_df.columns
+    ])
+    return long_flags, rets_df
+
+
+def _factor(sigma: np.ndarray) -> np.ndarray:
+    """L with L @ L.T == sigma; eigen-factor when sigma is only semi-definite."""
     try:
-        prob.solve()
-        w = x.value
-    except:
-        w = np.ones(len(mu)) / len(mu)  # fallback equal-weight
-    # Step 2: Convert to full-sector weight
-    full_weights = []
-    for col in rets_df.columns:
-        if col in active_sectors:
-            idx = active_sectors.index(col)
-            full_weights.append(w[idx])
+        return np.linalg.cholesky(sigma)
+    except np.linalg.LinAlgError:
+        vals, vecs = np.linalg.eigh(sigma)
+        return vecs * np.sqrt(np.clip(vals, 0, None))
+
+
+class ProblemCache:
+    """
+    One compiled, DPP-compliant problem per active-sector set:
+        maximize  mu @ x - 0.5 * ||L.T @ x||²   s.t.  x >= 0, sum(x) == 1
+    with mu and the Cholesky factor L of sigma as parameters, so a day only
+    rewrites parameter values and re-solves warm. After each solve,
+    `stats` has cvxpy's canonicalization time, the solver's own time and
+    its iteration count.
+    """
+
+    def __init__(self):
+        self._problems = {}
+        self.stats = {}
+
+    def solve(self, key: tuple, mu: np.ndarray, sigma: np.ndarray):
+        import cvxpy as cp                      # ~1s to import; only when solving
+        if key not in self._problems:
+            n = len(key)
+            x = cp.Variable(n)
+            mu_p = cp.Parameter(n)
+            chol_p = cp.Parameter((n, n))
+            objective = cp.Maximize(mu_p @ x - 0.5 * cp.sum_squares(chol_p.T @ x))
+            prob = cp.Problem(objective, [x >= 0, cp.sum(x) == 1])
+            self._problems[key] = (prob, x, mu_p, chol_p)
+
+        prob, x, mu_p, chol_p = self._problems[key]
+        mu_p.value = mu
+        chol_p.value = _factor(sigma)
+        try:
+            prob.solve(warm_start=True)
+        except cp.error.SolverError:
+            self.stats = {}
+            return None, "solver_error"
+        self.stats = {"setup_s": prob.compilation_time, "solve_s": prob.solver_stats.solve_time,
+                      "iterations": prob.solver_stats.num_iters}
+        return x.value, prob.status
+
+
+def solve_days(arrays: dict, start: int, stop: int):
+    """
+    Mean-variance weights for days [start, stop), on the expanding moments
+    of arrays["rets"] computed for just those days. Each call starts a fresh
+    ProblemCache: a compiled problem keeps solver state from its earlier
+    solves, so sharing one across chunks would make a chunk's result depend
+    on which chunks its process ran before it.
+    """
+    import cvxpy as cp
+    flags = arrays["flags"]
+    S = flags.shape[1]
+    with trace.span("rolling_moments", "compute", start=start, stop=stop):
+        moments = rolling_moments(arrays["rets"], "expanding", start=start, stop=stop)
+    cache = ProblemCache()
+    weights = np.zeros((stop - start, S))
+    status_rows = []
+    for i in range(start, stop):
+        t0 = time.perf_counter() if trace.ENABLED else 0.0
+        # Step 1: Active sectors at time i
+        active = np.flatnonzero(flags[i])
+        if len(active) == 0:
+            status_rows.append({"day": i, "n_active": 0, "status": "no_active", "fallback": False})
+            trace.day("mean_variance", i, n_active=0, status="no_active", fallback=False)
+            continue
+
+        mu = moments.mean(i, active)
+        sigma = moments.cov(i, active)
+
+        solved = False
+        if len(active) == 1:
+            w, status = np.ones(1), "single_asset"  # sum(x) == 1 leaves one feasible point
+        elif np.all(np.isfinite(sigma)):
+            w, status = cache.solve(tuple(active), mu, sigma)
+            solved = True
         else:
-            full_weights.append(0.0)
-    weights_all.append(full_weights)
+            w, status = None, "insufficient_history"
+        fallback = w is None or status not in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE, "single_asset")
+        if fallback:
+            w = np.ones(len(mu)) / len(mu)  # fallback equal-weight
+        status_rows.append({"day": i, "n_active": len(active), "status": status, "fallback": fallback})
+        if trace.ENABLED:
+            trace.day("mean_variance", i, n_active=len(active), status=status, fallback=fallback,
+                      seconds=time.perf_counter() - t0, **(cache.stats if solved else {}))
+
+        # Step 2: Convert to full-sector weight
+        weights[i - start, active] = w
+    return weights, status_rows
+
+
+def _solve(long_flags, rets_df, workers, chunk_days):
+    # Allocate weights dynamically with mean-variance optimization; each chunk
+    # builds the expanding moments of its own days
+    arrays = {"flags": long_flags, "rets": rets_df.values}
+    parts = run_sharded(solve_days, arrays, len(rets_df), workers=workers, chunk_days=chunk_days)
+    weights_df = pd.DataFrame(np.concatenate([w for w, _ in parts]), columns=rets_df.columns)
+    status_df = pd.DataFrame([row for _, rows in parts for row in rows])
+    return weights_df, status_df
+
+
+def main(workers: int = 1, chunk_days: int = CHUNK_DAYS, verify: bool = False):
+    with trace.span("load_inputs", "io"):
+        long_flags, rets_df = load_inputs()
+
+    weights_df, status_df = _solve(long_flags, rets_df, workers, chunk_days)
+
+    # Final output
+    os.makedirs(os.path.dirname(OUT_FILE), exist_ok=True)
+    weights_df.to_csv(OUT_FILE, index=False)
+    status_df.to_csv(STATUS_FILE, index=False)
+
+    print(f"✅ Saved mean-variance weights → {OUT_FILE}")
+    print(f"   solve status → {STATUS_FILE} ({int(status_df['fallback'].sum())} equal-weight fallbacks)")
+
+    if verify:
+        # The other of serial / 2 workers must write the same bytes
+        other = 2 if workers == 1 else 1
+        weights_o, status_o = _solve(long_flags, rets_df, other, chunk_days)
+        same = (weights_o.to_csv(index=False) == weights_df.to_csv(index=False)
+                and status_o.to_csv(index=False) == status_df.to_csv(index=False))
+        print(f"✅ workers={other} writes identical CSVs" if same
+              else f"❌ workers={other} writes different CSVs")
+        if not same:
+            sys.exit(1)
 
-# Final output
-weights_df = pd.DataFrame(weights_all, columns=rets_df.columns)
-os.makedirs(os.path.dirname(OUT_FILE), exist_ok=True)
-weights_df.to_csv(OUT_FILE, index=False)
 
-print(f"✅ Saved mean-variance weights → {OUT_FILE}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-only expanding-window mean-variance allocations")
+    parser.add_argument("--workers", type=int, default=1, help="processes to shard days over (0 = all cores)")
+    parser.add_argument("--chunk-days", type=int, default=CHUNK_DAYS, help="days per shard")
+    parser.add_argument("--verify", action="store_true",
+                        help="rerun serially (or with 2 workers when serial) and check the CSVs are identical")
+    trace.add_arguments(parser)
+    args = parser.parse_args()
+    trace.start(args)
+    main(args.workers, args.chunk_days, args.verify)
+    trace.finish(args)
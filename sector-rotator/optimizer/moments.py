@@ -0,0 +1,286 @@
+"""
+moments.py
+----------
+Streaming mean / covariance of a (T × N) return array for every day in
+one pass, shared by the optimizers.
+
+  kind="expanding"   all rows up to and including day t
+  kind="window"      the last `window` rows up to and including day t
+  kind="ewma"        exponentially weighted, alpha or halflife
+
+Each day costs one O(N²) rank-1 update (Welford add / remove for the
+equal-weight kinds, the West recursion for EWMA) instead of re-reducing
+the whole history. Covariances use ddof=1 like pandas for expanding and
+window moments; EWMA moments are the plain (biased) recursion.
+
+MomentState holds the same accumulators and advances them one row at a
+time, so an incremental run can checkpoint them and carry on exactly.
+
+Results are kept for every day asked for, so any active-sector subset of
+any of those days is a fancy-index away:
+
+    mom = rolling_moments(rets, "window", window=30, columns=sectors)
+    mu, sigma = mom.mean(t, ["TECH", "BANK"]), mom.cov(t, ["TECH", "BANK"])
+
+Covariances for every day take T × N × N floats (twice that with
+shrink=True), so the optimizers ask only for the days they are solving,
+rolling_moments(rets, ..., start=a, stop=b), one chunk at a time. The rows
+before `a` are folded into the accumulators in one step (only the last
+`window` of them for kind="window"), so a chunk costs O(N² · (b - a))
+memory however long the history is.
+"""
+
+from collections import deque
+
+import numpy as np
+
+
+class Moments:
+    """Per-day moments produced by rolling_moments()."""
+
+    def __init__(self, means, covs, counts, columns=None, fourth=None, start: int = 0):
+        self.means = means          # (D × N), row r is day start + r
+        self.covs = covs            # (D × N × N)
+        self.counts = counts        # (D,) observations behind each day
+        self.start = start          # first day held
+        self.columns = list(columns) if columns is not None else list(range(means.shape[1]))
+        self._fourth = fourth       # (D × N × N) Σ d_i² d_j², only with shrink=True
+        self._col = {c: j for j, c in enumerate(self.columns)}
+
+    def __len__(self):
+        return len(self.means)
+
+    @property
+    def stop(self) -> int:
+        return self.start + len(self.means)
+
+    def index(self, cols=None) -> np.ndarray:
+        if cols is None:
+            return np.arange(len(self.columns))
+        return np.array([self._col[c] for c in cols], dtype=int)
+
+    def mean(self, t: int, cols=None) -> np.ndarray:
+        return self.means[t - self.start, self.index(cols)]
+
+    def std(self, t: int, cols=None) -> np.ndarray:
+        idx = self.index(cols)
+        return np.sqrt(self.covs[t - self.start, idx, idx])
+
+    def cov(self, t: int, cols=None, shrink: bool = False) -> np.ndarray:
+        idx = self.index(cols)
+        sigma = self.covs[t - self.start][np.ix_(idx, idx)]
+        if not shrink:
+            return sigma
+        return _ledoit_wolf(sigma, self._fourth_sub(t, idx), self.counts[t - self.start])
+
+    def shrinkage(self, t: int, cols=None) -> float:
+        """Ledoit-Wolf intensity for day t and the given subset."""
+        idx = self.index(cols)
+        sigma = self.covs[t - self.start][np.ix_(idx, idx)]
+        return _lw_intensity(sigma, self._fourth_sub(t, idx), self.counts[t - self.start])
+
+    def _fourth_sub(self, t, idx):
+        if self._fourth is None:
+            raise ValueError("moments were built without shrink=True")
+        return self._fourth[t - self.start][np.ix_(idx, idx)]
+
+
+def _lw_intensity(cov, fourth, n):
+    # Ledoit & Wolf (2004), as in sklearn.covariance.ledoit_wolf_shrinkage,
+    # written in terms of the biased covariance S and Σ_t d_i² d_j².
+    if n < 2 or not np.all(np.isfinite(cov)):
+        return np.nan
+    p = len(cov)
+    s = cov * (n - 1) / n
+    mu = np.trace(s) / p
+    delta_ = np.sum(s ** 2)
+    beta = (np.sum(fourth) / n - delta_) / (p * n)
+    delta = (delta_ - 2.0 * mu * np.trace(s) + p * mu ** 2) / p
+    beta = min(beta, delta)
+    return 0.0 if beta == 0 else beta / delta
+
+
+def _ledoit_wolf(cov, fourth, n):
+    s = _lw_intensity(cov, fourth, n)
+    if not np.isfinite(s):
+        return cov
+    p = len(cov)
+    return (1.0 - s) * cov + s * (np.trace(cov) / p) * np.eye(p)
+
+
+class MomentState:
+    """
+    The running accumulators behind rolling_moments(), advanced one row at
+    a time. rolling_moments() is a loop over push(), so a state that is
+    saved with state() and rebuilt with restore() carries on bit for bit
+    where a full pass would.
+    """
+
+    def __init__(self, n_cols: int, kind: str = "expanding", window: int = None,
+                 alpha: float = None, halflife: float = None, shrink: bool = False):
+        if kind == "window":
+            if not window or window < 1:
+                raise ValueError("kind='window' needs a positive window")
+        elif kind == "ewma":
+            if alpha is None:
+                if halflife is None:
+                    raise ValueError("kind='ewma' needs alpha or halflife")
+                alpha = 1.0 - np.exp(-np.log(2.0) / halflife)
+            if shrink:
+                raise ValueError("Ledoit-Wolf shrinkage needs equally weighted observations")
+        elif kind != "expanding":
+            raise ValueError(f"unknown kind: {kind}")
+
+        N = n_cols
+        self.kind, self.window, self.alpha, self.shrink = kind, window, alpha, shrink
+        self.n = 0
+        self.mean = np.zeros(N)
+        self.m2 = np.zeros((N, N))
+        self.recent = deque()   # last `window` rows, for removal
+        if shrink:
+            self.s1, self.s2 = np.zeros(N), np.zeros(N)
+            self.s11 = np.zeros((N, N))
+            self.s21, self.s22 = np.zeros((N, N)), np.zeros((N, N))
+
+    def push(self, row: np.ndarray) -> None:
+        row = np.asarray(row, dtype="float64")
+        if self.kind == "ewma":
+            alpha = self.alpha
+            if self.n == 0:
+                self.mean = row.copy()
+            else:
+                d = row - self.mean
+                self.mean = self.mean + alpha * d
+                self.m2 = (1.0 - alpha) * (self.m2 + alpha * np.outer(d, d))
+            self.n += 1
+            return
+
+        self.n += 1
+        d = row - self.mean
+        self.mean = self.mean + d / self.n
+        self.m2 += np.outer(d, row - self.mean)
+        if self.shrink:
+            sq = row ** 2
+            self.s1 += row; self.s2 += sq
+            self.s11 += np.outer(row, row)
+            self.s21 += np.outer(sq, row); self.s22 += np.outer(sq, sq)
+        if self.kind == "window":
+            self.recent.append(row)
+            if self.n > self.window:
+                old = self.recent.popleft()
+                d = old - self.mean
+                self.n -= 1
+                self.mean = self.mean - d / self.n
+                self.m2 -= np.outer(d, old - self.mean)
+                if self.shrink:
+                    sq = old ** 2
+                    self.s1 -= old; self.s2 -= sq
+                    self.s11 -= np.outer(old, old)
+                    self.s21 -= np.outer(sq, old); self.s22 -= np.outer(sq, sq)
+
+    def absorb(self, rows: np.ndarray) -> None:
+        """
+        push() every row of `rows` (R × N), in one step where the kind
+        allows: the pooled (Chan et al.) update for expanding moments, and
+        for a window whose accumulators are still empty. Equal to the
+        pushes up to rounding.
+        """
+        rows = np.asarray(rows, dtype="float64").reshape(-1, len(self.mean))
+        if self.kind == "window":
+            if self.n:
+                for row in rows:
+                    self.push(row)
+                return
+            rows = rows[-self.window:]
+            self.recent.extend(rows)
+        elif self.kind == "ewma":
+            for row in rows:
+                self.push(row)
+            return
+        if not len(rows):
+            return
+
+        n_b = len(rows)
+        mean_b = rows.mean(axis=0)
+        d_b = rows - mean_b
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.m2 = self.m2 + d_b.T @ d_b + np.outer(delta, delta) * (self.n * n_b / n)
+        self.mean = self.mean + delta * (n_b / n)
+        self.n = n
+        if self.shrink:
+            sq = rows ** 2
+            self.s1 += rows.sum(axis=0); self.s2 += sq.sum(axis=0)
+            self.s11 += rows.T @ rows
+            self.s21 += sq.T @ rows; self.s22 += sq.T @ sq
+
+    def cov(self) -> np.ndarray:
+        if self.kind == "ewma":
+            return self.m2.copy()
+        if self.n > 1:
+            return self.m2 / (self.n - 1)
+        return np.full(self.m2.shape, np.nan)
+
+    def fourth(self) -> np.ndarray:
+        """Σ d_i² d_j² about the current mean (shrink=True only)."""
+        n, mean = self.n, self.mean
+        mi, mj = mean[:, None], mean[None, :]
+        return (self.s22
+                - 2 * mj * self.s21 - 2 * mi * self.s21.T
+                + mj ** 2 * self.s2[:, None] + mi ** 2 * self.s2[None, :]
+                + 4 * mi * mj * self.s11
+                - 2 * mi * mj ** 2 * self.s1[:, None] - 2 * mi ** 2 * mj * self.s1[None, :]
+                + n * mi ** 2 * mj ** 2)
+
+    _ARRAYS = ("mean", "m2", "s1", "s2", "s11", "s21", "s22")
+
+    def state(self) -> dict:
+        out = {k: v for k, v in vars(self).items() if k not in self._ARRAYS and k != "recent"}
+        out.update({k: getattr(self, k).tolist() for k in self._ARRAYS if hasattr(self, k)})
+        out["recent"] = [r.tolist() for r in self.recent]
+        return out
+
+    @classmethod
+    def restore(cls, state: dict) -> "MomentState":
+        obj = cls.__new__(cls)
+        for k, v in state.items():
+            setattr(obj, k, np.array(v, dtype="float64") if k in cls._ARRAYS else v)
+        obj.recent = deque(np.array(r, dtype="float64") for r in state["recent"])
+        return obj
+
+
+def rolling_moments(returns, kind: str = "expanding", window: int = None,
+                    alpha: float = None, halflife: float = None,
+                    shrink: bool = False, columns=None, start: int = 0, stop: int = None) -> Moments:
+    """
+    Mean and covariance of `returns` (T × N, no NaNs) for every day t in
+    [start, stop) (default: all T). Days before `start` only feed the
+    accumulators. shrink=True also tracks the fourth-moment sums
+    Ledoit-Wolf needs, so Moments.cov(t, cols, shrink=True) works for any
+    subset of columns.
+    """
+    x = np.asarray(returns, dtype="float64")
+    if x.ndim == 1:
+        x = x[:, None]
+    T, N = x.shape
+    stop = T if stop is None else min(stop, T)
+    start = min(max(start, 0), stop)
+    D = stop - start
+    acc = MomentState(N, kind, window, alpha, halflife, shrink)
+    acc.absorb(x[max(0, start - window) if kind == "window" else 0:start])
+
+    means = np.full((D, N), np.nan)
+    covs = np.full((D, N, N), np.nan)
+    counts = np.zeros(D, dtype=int)
+    fourth = np.full((D, N, N), np.nan) if shrink else None
+
+    for r, t in enumerate(range(start, stop)):
+        acc.push(x[t])
+        counts[r] = acc.n
+        means[r] = acc.mean
+        if kind == "ewma" or acc.n > 1:
+            covs[r] = acc.cov()
+        if shrink:
+            fourth[r] = acc.fourth()
+
+    return Moments(means, covs, counts, columns, fourth, start)
@@ -0,0 +1,124 @@
+"""
+parallel.py
+-----------
+Date-sharded execution of the per-day optimizers.
+
+Each day's allocation depends only on that day's inputs, so the day range
+is cut into fixed chunks of `chunk_days` and the chunks are farmed out to
+a ProcessPoolExecutor. Input matrices (flags, moments, ...) are placed in
+multiprocessing.shared_memory once; a worker maps them as NumPy arrays for
+each chunk it runs, and closes its mappings when the chunk is done, instead
+of unpickling DataFrames per task. Chunk functions must therefore return
+new arrays, not views of their inputs.
+
+Chunk boundaries depend only on `chunk_days`, never on `workers`, and
+results are gathered in chunk order, so workers=1 and workers=8 produce
+identical output. The serial path hands chunks the same C-contiguous
+copies the shared blocks hold: BLAS sums a Fortran-ordered array in a
+different order, which shows in the last bits of the moments.
+
+While profiling.trace is on, each chunk is a span and workers ship what
+they recorded back with their result, so a sharded run traces like a
+serial one.
+"""
+
+import os
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from profiling import trace
+
+CHUNK_DAYS = 256
+
+
+class SharedArrays:
+    """Context manager copying a dict of arrays into shared memory blocks."""
+
+    def __init__(self, arrays: dict):
+        self.arrays = arrays
+        self.specs = {}
+        self._blocks = []
+
+    def __enter__(self):
+        for name, arr in self.arrays.items():
+            arr = np.ascontiguousarray(arr)
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+            view[...] = arr
+            self._blocks.append(shm)
+            self.specs[name] = (shm.name, arr.shape, arr.dtype.str)
+        return self
+
+    def __exit__(self, *exc):
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks = []
+
+
+@contextmanager
+def _attached(specs: dict):
+    """Worker side: the shared blocks as {name: ndarray}, closed on exit."""
+    handles = [shared_memory.SharedMemory(name=shm_name) for shm_name, _, _ in specs.values()]
+    arrays = {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+              for (name, (_, shape, dtype)), shm in zip(specs.items(), handles)}
+    try:
+        yield arrays
+    finally:
+        arrays.clear()          # drop the views first; close() refuses while they exist
+        for shm in handles:
+            shm.close()
+
+
+def _run_chunk(fn, specs, start, stop, kwargs):
+    with _attached(specs) as arrays:
+        return fn(arrays, start, stop, **kwargs)
+
+
+def _run_chunk_traced(fn, specs, start, stop, kwargs, memory):
+    trace.reset()              # a forked worker starts with a copy of the parent's records
+    trace.enable(memory=memory)
+    with _attached(specs) as arrays, trace.span(fn.__name__, "chunk", start=start, stop=stop):
+        result = fn(arrays, start, stop, **kwargs)
+    return result, trace.collect()
+
+
+def _chunk(fn, arrays, start, stop, kwargs):
+    with trace.span(fn.__name__, "chunk", start=start, stop=stop):
+        return fn(arrays, start, stop, **kwargs)
+
+
+def chunks(n_days: int, chunk_days: int = CHUNK_DAYS) -> list:
+    return [(a, min(a + chunk_days, n_days)) for a in range(0, n_days, chunk_days)]
+
+
+def run_sharded(fn, arrays: dict, n_days: int, workers: int = 1,
+                chunk_days: int = CHUNK_DAYS, **kwargs) -> list:
+    """
+    Call fn(arrays, start, stop, **kwargs) for every chunk of [0, n_days)
+    and return the results in chunk order. fn must be a module-level
+    function so worker processes can import it.
+    """
+    spans = chunks(n_days, chunk_days)
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(spans) <= 1:
+        arrays = {name: np.ascontiguousarray(arr) for name, arr in arrays.items()}
+        return [_chunk(fn, arrays, a, b, kwargs) for a, b in spans]
+
+    with SharedArrays(arrays) as shared:
+        specs = shared.specs
+        with ProcessPoolExecutor(max_workers=min(workers, len(spans))) as pool:
+            if not trace.ENABLED:
+                futures = [pool.submit(_run_chunk, fn, specs, a, b, kwargs) for a, b in spans]
+                return [f.result() for f in futures]
+            futures = [pool.submit(_run_chunk_traced, fn, specs, a, b, kwargs, trace.MEMORY) for a, b in spans]
+            results = []
+            for f in futures:
+                result, recorded = f.result()
+                trace.merge(recorded)
+                results.append(result)
+            return results
@@ -0,0 +1,365 @@
+"""
+risk_parity.py
+--------------
+Solver-free allocators: weights from the trailing covariance alone, no
+return forecast and no QP.
+
+  ivp   inverse volatility
+  erc   equal risk contribution (damped Newton)
+  hrp   hierarchical risk parity: single-linkage tree on correlation
+        distance sqrt((1 - ρ) / 2), then top-down bisection of the tree,
+        each split by the inverse of its two clusters' variances
+        (López de Prado)
+
+Flags keep their meaning: a flagged asset is held on its flag's side
+(+1 long, -1 short), and on days with only one flag the best
+mean / std of the rest joins long, as in rule_based. Risk is that of
+the signed positions. Weights are then scaled to gross 1 with no
+|weight| above `cap` (capped_scale: the excess of capped names goes to
+the others pro rata), so cap_and_normalize leaves them as they are.
+
+The covariance is only used through each day's window factor
+(hierarchical._window_factor: cov = F Fᵀ over the lookback returns).
+An HRP cluster's inverse-variance portfolio has variance |Σ aᵢ Fᵢ|² /
+(Σ aᵢ)² with aᵢ = 1 / σᵢ², and a parent's sums are its children's, so
+one bottom-up pass over the tree costs N · lookback per day — linear in
+the number of names. The tree is rebuilt only when the correlation
+matrix has moved more than `relink` (RMS over entries) since the last
+build (LinkageCache); in between, days sharing a tree are bisected
+together as one array. Each chunk (optimizer.parallel) starts a fresh
+cache, so results do not depend on `workers`.
+
+    weights = allocate(signals, selected, load_panel(), method="hrp")
+    weights = allocate_book(signals, book, load_panel(), method="erc")   # every book name
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from optimizer.hierarchical import _window_factor, book_returns
+from optimizer.parallel import CHUNK_DAYS, run_sharded
+from optimizer.rule_based import CAP, active_mask
+from profiling import trace
+from store.prices import simple_returns
+
+METHODS = ("hrp", "ivp", "erc")
+RELINK = 0.05       # RMS correlation change that triggers a new HRP tree
+SHRINK = 0.1        # ERC covariance shrinkage toward its diagonal
+
+
+# ── scaling ───────────────────────────────────────────────────────
+def capped_scale(raw: np.ndarray, mask: np.ndarray, cap: float = CAP) -> np.ndarray:
+    """
+    Rows of non-negative raw weights (D × N) as w = min(cap, c · raw) with
+    c chosen so each row sums to 1. Rows whose mask cannot reach 1 under
+    cap (e.g. one asset) get equal weights, as cap_and_normalize would.
+    """
+    r = np.where(mask, raw, 0.0)
+    D, N = r.shape
+    rows = np.arange(D)
+    s = -np.sort(-r, axis=1)                                 # largest first
+    tail = np.cumsum(s[:, ::-1], axis=1)[:, ::-1]            # sum of s[k:]
+    k = np.arange(N)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        c = (1.0 - k * cap) / tail                           # scale if the k largest are capped
+        fits = (tail > 0) & (1.0 - k * cap > 0) & (c * s <= cap * (1 + 1e-12))
+    scale = np.where(fits.any(axis=1), c[rows, np.argmax(fits, axis=1)], 0.0)
+    w = np.minimum(cap, scale[:, None] * r)
+
+    n = mask.sum(axis=1)
+    even = (n > 0) & ((n * cap < 1.0) | ~fits.any(axis=1))
+    return np.where(even[:, None], mask / np.maximum(n, 1)[:, None], np.where(mask, w, 0.0))
+
+
+# ── allocators ────────────────────────────────────────────────────
+def inverse_vol(var: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore"):
+        return np.where(mask, 1 / np.sqrt(var), 0.0)
+
+
+def erc(G: np.ndarray, var: np.ndarray, mask: np.ndarray, shrink: float = SHRINK,
+        tol: float = 1e-20, max_iter: int = 50) -> np.ndarray:
+    """
+    Equal risk contributions uᵢ (Σu)ᵢ of the masked names under
+    Σ = (1 - shrink) G Gᵀ + shrink diag(var), G (D × N × L) the signed
+    window factor. The shrinkage is what makes the problem solvable once
+    names outnumber the lookback (G Gᵀ alone is then singular). Solves
+    min ½ uᵀΣu - b Σ ln(uᵢ), b = 1/n, by damped Newton on all days at
+    once with a backtracking line search; the Hessian is diagonal plus
+    G Gᵀ, so each step is an L × L solve (Woodbury) rather than N × N.
+    """
+    D, N, L = G.shape
+    n = mask.sum(axis=1)
+    b = (1.0 / np.maximum(n, 1))[:, None]
+    G = np.where(mask[..., None], G, 0.0) * np.sqrt(1 - shrink)
+    ridge = np.where(mask, var, 0.0) * shrink
+    # Start from inverse vol at its best scale along that ray: α² uᵀΣu = Σ b
+    u = np.where(mask, 1 / np.sqrt(np.where(mask, var, 1.0)), 0.0)
+    Gt = G.transpose(0, 2, 1)
+    gt = lambda v: np.matmul(Gt, v[..., None])[..., 0]          # Gᵀv per day
+    g = lambda y: np.matmul(G, y[..., None])[..., 0]            # G y per day
+    q = (gt(u) ** 2).sum(axis=1) + (ridge * u * u).sum(axis=1)
+    u = u / np.sqrt(np.where(q > 0, q, 1.0))[:, None]
+    eye = np.eye(L)
+
+    def objective(v):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            logs = np.where(mask, np.log(np.where(mask, v, 1.0)), 0.0)
+        return 0.5 * (gt(v) ** 2).sum(axis=1) + 0.5 * (ridge * v * v).sum(axis=1) - b[:, 0] * logs.sum(axis=1)
+
+    for _ in range(max_iter):
+        safe = np.where(mask, u, 1.0)
+        grad = g(gt(u)) + ridge * u - b / safe
+        grad = np.where(mask, grad, 0.0)
+        inv_h = np.where(mask, 1 / (b / (safe * safe) + ridge), 1.0)   # inverse of the diagonal part
+        z = -grad * inv_h
+        M = eye + np.matmul(Gt, G * inv_h[..., None])
+        step = z - inv_h * g(np.linalg.solve(M, gt(z)[..., None])[..., 0])
+        lam2 = -(grad * step).sum(axis=1) / b[:, 0]          # squared Newton decrement of f / b
+        if lam2.max() < tol:
+            break
+        # Newton step kept inside u > 0; away from the optimum (λ ≥ 1/4)
+        # halved per day until f drops enough (Armijo)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            room = np.where(mask & (step < 0), -u / step, np.inf).min(axis=1)
+        t = np.minimum(1.0, 0.99 * room)
+        far = lam2 >= 1 / 16
+        if far.any():
+            f0 = objective(u)
+            for _ in range(60):
+                short = far & (objective(u + t[:, None] * step) > f0 - 1e-4 * t * lam2 * b[:, 0])
+                if not short.any():
+                    break
+                t = np.where(short, t / 2, t)
+        u = u + t[:, None] * step
+    return np.where(mask, u, 0.0)
+
+
+class LinkageCache:
+    """
+    HRP tree over N names, rebuilt when the correlation has drifted more
+    than `relink` (RMS over entries) from the one it was built on.
+    `builds` counts the rebuilds.
+    """
+
+    def __init__(self, method: str = "single", relink: float = RELINK):
+        self.method = method
+        self.relink = relink
+        self.corr = None
+        self.tree_ = None
+        self.builds = 0
+
+    def tree(self, corr: np.ndarray) -> tuple:
+        """((children, order, lo, hi) for bisect, rebuilt?)"""
+        if self.corr is not None and np.sqrt(np.mean((corr - self.corr) ** 2)) <= self.relink:
+            return self.tree_, False
+        if len(corr) < 2:
+            children = np.zeros((0, 2), dtype=int)
+        else:
+            from scipy.cluster.hierarchy import linkage     # scipy loads on first use
+            from scipy.spatial.distance import squareform
+            dist = np.sqrt(np.clip((1 - corr) / 2, 0.0, None))
+            np.fill_diagonal(dist, 0.0)
+            children = linkage(squareform(dist, checks=False), self.method)[:, :2].astype(int)
+        self.corr, self.tree_ = corr, _layout(children, len(corr))
+        self.builds += 1
+        return self.tree_, True
+
+
+def _layout(children: np.ndarray, N: int) -> tuple:
+    """
+    Leaves in dendrogram order, and every node's [lo, hi) range of that
+    order (2N - 1 nodes, scipy numbering) — each cluster is contiguous.
+    """
+    size = np.ones(2 * N - 1, dtype=int)
+    for k, (l, r) in enumerate(children):
+        size[N + k] = size[l] + size[r]
+    lo = np.zeros(2 * N - 1, dtype=int)
+    for k in range(len(children) - 1, -1, -1):              # parents before children
+        l, r = children[k]
+        lo[l] = lo[N + k]
+        lo[r] = lo[N + k] + size[l]
+    order = np.empty(N, dtype=int)
+    order[lo[:N]] = np.arange(N)
+    return children, order, lo, lo + size
+
+
+def bisect(G: np.ndarray, var: np.ndarray, mask: np.ndarray, tree: tuple) -> np.ndarray:
+    """
+    HRP weights for D days sharing one tree. Each cluster holds its
+    masked names' inverse-variance portfolio; a split gives its left
+    child V_R / (V_L + V_R) of the parent's weight, all of it when the
+    other side has no masked name. Cluster sums are differences of prefix
+    sums over the leaf order, and a leaf's weight is the product of the
+    fractions of the clusters holding it — range sums of their logs.
+    """
+    children, order, lo, hi = tree
+    D, N, _ = G.shape
+    a = np.where(mask, 1 / np.where(mask, var, 1.0), 0.0)[:, order]      # D × N, leaf order
+    P = np.zeros((D, N + 1, G.shape[2]))
+    np.cumsum((G[:, order] * a[..., None]), axis=1, out=P[:, 1:])
+    S = np.concatenate([np.zeros((D, 1)), np.cumsum(a, axis=1)], axis=1)
+    A = S[:, hi] - S[:, lo]                                               # D × nodes
+    B = P[:, hi] - P[:, lo]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        V = np.where(A > 0, np.einsum("dcl,dcl->dc", B, B) / A ** 2, 0.0)
+    V[:, :N] = np.where(mask, var, 0.0)                                   # leaves exactly
+
+    l, r = children[:, 0], children[:, 1]
+    total = V[:, l] + V[:, r]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        left = np.where(total > 0, V[:, r] / total, 0.5)
+    left = np.where(A[:, l] == 0, 0.0, np.where(A[:, r] == 0, 1.0, left))
+    # A zero fraction only ever falls on a side without masked names
+    with np.errstate(divide="ignore"):
+        logs = np.log(np.concatenate([left, 1 - left], axis=1))
+    logs = np.where(np.isfinite(logs), logs, 0.0)
+    nodes = np.concatenate([l, r])
+    diff = np.zeros((N + 1, D))
+    np.add.at(diff, lo[nodes], logs.T)
+    np.add.at(diff, hi[nodes], -logs.T)
+    W = np.exp(np.cumsum(diff[:N], axis=0)).T                            # D × N, leaf order
+    out = np.zeros((D, N))
+    out[:, order] = W
+    return np.where(mask, out, 0.0)
+
+
+def _hrp(G, F, var, usable, mask, cache: LinkageCache) -> tuple:
+    """
+    HRP for D days; the tree sees unsigned correlations (unusable names
+    uncorrelated). G and mask may stack several flag sets (sets · D rows,
+    set by set): they share F, var and so every tree.
+    """
+    D, N, _ = F.shape
+    sets = len(G) // D
+    raw = np.zeros((len(G), N))
+    rebuilt = np.zeros(D, dtype=bool)
+    segments = []
+    for d in range(D):
+        sd = np.sqrt(np.where(usable[d], var[d], 1.0))
+        f = np.where(usable[d][:, None], F[d], 0.0) / sd[:, None]
+        corr = f @ f.T
+        np.fill_diagonal(corr, 1.0)
+        tree, rebuilt[d] = cache.tree(corr)
+        if rebuilt[d] or not segments:
+            segments.append([d, d + 1, tree])
+        else:
+            segments[-1][1] = d + 1
+    for a, b, tree in segments:
+        rows = (np.arange(sets)[:, None] * D + np.arange(a, b)).ravel()
+        raw[rows] = bisect(G[rows], var[rows % D], mask[rows], tree)
+    return raw, rebuilt
+
+
+# ── driver ────────────────────────────────────────────────────────
+def _chunk(arrays: dict, start: int, stop: int, lookback: int, method: str, cap: float,
+           relink: float, linkage: str) -> np.ndarray:
+    flags, priced, rets = arrays["flags"], arrays["priced"], arrays["rets"]
+    lead, N = flags.shape[:-2], flags.shape[-1]
+    sets = int(np.prod(lead))
+    out = np.zeros(lead + (stop - start, N))
+    first = max(start, lookback)
+    if first >= stop:
+        return out
+    D = stop - first
+    t0 = time.perf_counter() if trace.ENABLED else 0.0
+    windows = sliding_window_view(rets, lookback, axis=0)[first - lookback:stop - lookback]   # D × N × L
+    mu, F, ok = _window_factor(windows)
+    var = np.einsum("dnl,dnl->dn", F, F)
+    usable = ok & priced[None, :] & (var > 0)
+
+    # Flag sets (leading axes) stack along the day axis and share the window moments
+    tile = lambda x: np.tile(x, (sets,) + (1,) * (x.ndim - 1)) if sets > 1 else x
+    f = flags[..., first:stop, :].reshape(sets * D, N)
+    mask, lonely = active_mask(f, tile(usable), tile(mu), tile(np.sqrt(var)), np.ones(sets * D, dtype=bool))
+    signs = np.where(f < 0, -1.0, 1.0)
+    G = tile(F) * signs[..., None]                           # factor of the signed positions
+
+    rebuilt = np.zeros(D, dtype=bool)
+    if method == "ivp":
+        raw = inverse_vol(tile(var), mask)
+    elif method == "erc":
+        raw = erc(G, tile(var), mask)
+    elif method == "hrp":
+        raw, rebuilt = _hrp(G, F, var, usable, mask, LinkageCache(linkage, relink))
+    else:
+        raise ValueError(f"unknown method {method!r}; expected one of {METHODS}")
+    out[..., first - start:, :] = (capped_scale(raw, mask, cap) * signs).reshape(lead + (D, N))
+
+    if trace.ENABLED:
+        seconds = (time.perf_counter() - t0) / (sets * D)
+        for r in range(sets * D):
+            trace.day("risk_parity", first + r % D, **({"set": r // D} if sets > 1 else {}), method=method,
+                      n_active=int(mask[r].sum()), second_best=bool(lonely[r]), relinked=bool(rebuilt[r % D]),
+                      seconds=seconds)
+    return out
+
+
+def risk_weights(flags: np.ndarray, rets: np.ndarray, lookback: int = 30, method: str = "hrp",
+                 cap: float = CAP, relink: float = RELINK, linkage: str = "single",
+                 priced: np.ndarray = None, workers: int = 1, chunk_days: int = CHUNK_DAYS) -> np.ndarray:
+    """
+    (T × N) weights from aligned flags and daily returns; day t uses the
+    `lookback` returns before it and stays flat until it has them. flags
+    may carry leading axes (e.g. P parameter sets × T × N), all solved
+    together on the same windows.
+    """
+    flags, rets = np.asarray(flags), np.ascontiguousarray(rets, dtype="float64")
+    arrays = {
+        "flags": flags,
+        "priced": np.ones(flags.shape[-1], dtype=bool) if priced is None else np.asarray(priced, dtype=bool),
+        "rets": rets,
+    }
+    parts = run_sharded(_chunk, arrays, flags.shape[-2], workers=workers, chunk_days=chunk_days,
+                        lookback=lookback, method=method, cap=cap, relink=relink, linkage=linkage)
+    return np.concatenate(parts, axis=-2) if parts else np.zeros(flags.shape[:-2] + (0, flags.shape[-1]))
+
+
+def allocate(signals: dict, selected: dict, panel, lookback: int = 30, method: str = "hrp",
+             cap: float = CAP, relink: float = RELINK, workers: int = 1,
+             chunk_days: int = CHUNK_DAYS) -> pd.DataFrame:
+    """
+    Sector weights from in-memory flags ({sector: array}, column order
+    kept) and the price panel: rule_based.allocate with `method` in place
+    of the MVO.
+    """
+    signals = {k: np.asarray(v) for k, v in signals.items()}
+    priced = [s for s in signals if selected.get(s) in panel.symbols]
+    close = panel.select([selected[s] for s in priced]).field("close")
+    rets = simple_returns(close)[1:]
+
+    min_len = min([len(x) for x in signals.values()] + ([len(rets)] if priced else []))
+    flags = np.column_stack([signals[s][-min_len:] for s in signals])
+    full = np.full((min_len, len(signals)), np.nan)
+    for j, s in enumerate(priced):
+        full[:, list(signals).index(s)] = rets[-min_len:, j]
+
+    weights = pd.DataFrame(risk_weights(flags, full, lookback, method, cap, relink,
+                                        priced=np.array([s in priced for s in signals]),
+                                        workers=workers, chunk_days=chunk_days),
+                           columns=list(signals))
+    weights.index.name = "Date"
+    return weights
+
+
+def allocate_book(signals: dict, book: dict, panel, lookback: int = 30, method: str = "hrp",
+                  cap: float = CAP, relink: float = RELINK, workers: int = 1,
+                  chunk_days: int = CHUNK_DAYS) -> pd.DataFrame:
+    """
+    One flat allocation over every name of a book, each name carrying its
+    sector's flag; columns as hierarchical.book_allocate's.
+    """
+    signals = {k: np.asarray(v) for k, v in signals.items()}
+    sectors = [s for s in signals if s in book and book[s] and book[s][0] in panel.symbols]
+    _, names, codes, rets = book_returns(book, panel, sectors)
+    rets = rets[1:]
+
+    min_len = min([len(x) for x in signals.values()] + ([len(rets)] if sectors else []))
+    flags = np.column_stack([signals[s][-min_len:] for s in sectors]) if sectors else np.zeros((min_len, 0))
+    weights = pd.DataFrame(risk_weights(flags[:, codes], rets[-min_len:], lookback, method, cap, relink,
+                                        workers=workers, chunk_days=chunk_days), columns=names)
+    weights.index.name = "Date"
+    return weights
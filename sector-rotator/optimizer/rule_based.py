@@ -1,56 +1,189 @@
 import pandas as pd
 import numpy as np
-import os, glob
-from scipy.optimize import minimize
+import os, glob, time
 import yaml
+from store.prices import load_panel, simple_returns, store_dir_for
+from optimizer.moments import Moments, rolling_moments
+from optimizer.batched_qp import solve_capped_l1
+from optimizer.parallel import chunks, run_sharded, CHUNK_DAYS
+from profiling import trace
 
-def generate_allocations(signal_dir="data/signals/", return_dir="data/raw/", lookback=30) -> pd.DataFrame:
+CAP = 0.5
+
+
+def active_mask(flags: np.ndarray, priced: np.ndarray, mu: np.ndarray, sd: np.ndarray,
+                ready: np.ndarray) -> tuple:
+    """
+    Assets each of D days trades: flagged (flags != 0), priced and ready,
+    plus the best Sharpe-like (mean / std) of the other priced assets on
+    days where only one is flagged. priced is (S,) or per day (D × S).
+    Returns (mask (D × S), lonely (D,)).
+    """
+    priced = np.broadcast_to(priced, flags.shape)
+    sd = np.where(priced, sd, np.nan)
+    active = (flags != 0) & ready[:, None]
+    rest = priced & ~active
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(rest, mu / sd, np.nan)
+    lonely = (active.sum(axis=1) == 1) & ~np.isnan(sharpe).all(axis=1)
+    second = np.zeros_like(active)
+    rows = np.flatnonzero(lonely)
+    second[rows, np.nanargmax(sharpe[rows], axis=1)] = True
+    return (active | second) & priced, lonely
+
+
+def allocate_days(flags: np.ndarray, priced: np.ndarray, mu: np.ndarray, cov: np.ndarray,
+                  ready: np.ndarray, cap: float = CAP, info: dict = None) -> np.ndarray:
+    """
+    Rule-based MVO for D stacked days: flags (D × S), and each day's
+    trailing mean (D × S) / covariance (D × S × S) in full sector space.
+    Days that are not `ready` (not enough history) stay flat.
+    Pass a dict as `info` to get per-day diagnostics back in it:
+    n_active, second_best, fallback (equal-weight x0 kept), iterations,
+    converged.
+    """
+    # If only 1 sector is active, add the best Sharpe-like (mean / std) among the rest
+    sd = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+    mask, lonely = active_mask(flags, priced, mu, sd, ready)
+    weights, iterations, converged = solve_capped_l1(mu, cov, mask, cap=cap)
+    if info is not None:
+        n = mask.sum(axis=1)
+        info.update(n_active=n, second_best=lonely, fallback=(n > 0) & (n * cap < 1.0),
+                    iterations=iterations, converged=converged)
+    return weights
+
+
+def batched_allocations(flags: np.ndarray, priced: np.ndarray, moments: Moments,
+                        lookback: int, cap: float = CAP, start: int = 0, stop: int = None) -> np.ndarray:
+    """
+    Days [start, stop) of the rule-based MVO in one stacked solve.
+    flags (T × S) are sector signals, priced (S,) marks sectors with
+    returns, and moments are trailing-window moments over the priced
+    sectors in order, covering at least days [start - 1, stop - 1).
+    Returns (stop - start) × S weights.
+
+    flags may carry leading axes (e.g. P parameter sets × T × S); every
+    set shares the moments and all of them go through the same solve.
+    """
+    flags = np.asarray(flags)
+    stop = flags.shape[-2] if stop is None else stop
+    S = flags.shape[-1]
+    cols = np.flatnonzero(priced)
+    t_idx = np.arange(start, stop)
+    T = len(t_idx)
+    ready = t_idx >= lookback
+    prev = np.maximum(t_idx - 1, 0)
+    flags = flags[..., start:stop, :]
+    lead = flags.shape[:-2]
+    sets = int(np.prod(lead))
+
+    # Window moments ending at t-1, scattered into full sector space
+    mu = np.full((T, S), np.nan)
+    cov = np.zeros((T, S, S))
+    mu[:, cols] = moments.means[prev - moments.start]
+    cov[:, cols[:, None], cols[None, :]] = moments.covs[prev - moments.start]
+    if sets > 1:
+        mu, cov, ready = np.tile(mu, (sets, 1)), np.tile(cov, (sets, 1, 1)), np.tile(ready, sets)
+
+    info = {} if trace.ENABLED else None
+    weights = allocate_days(flags.reshape(sets * T, S), priced, mu, cov, ready, cap, info)
+    if info is not None:
+        for r in range(sets * T):
+            if ready[r]:
+                trace.day("rule_based", t_idx[r % T], **({"set": r // T} if sets > 1 else {}), n_active=int(info["n_active"][r]),
+                          second_best=bool(info["second_best"][r]), fallback=bool(info["fallback"][r]),
+                          iterations=int(info["iterations"][r]), converged=bool(info["converged"][r]))
+    return weights.reshape(lead + (T, S))
+
+
+def cap_and_normalize(weights, cap: float = CAP):
+    """
+    Clip every weight to ±cap, then rescale each day so sum(|w|) == 1
+    (gross leverage control). Flat days stay flat. Works on DataFrames
+    and on arrays with days on the second-to-last axis.
+    """
+    weights = weights.clip(-cap, cap)
+    if isinstance(weights, pd.DataFrame):
+        abs_sum = weights.abs().sum(axis=1).replace(0, 1)  # avoid divide-by-zero
+        return weights.div(abs_sum, axis=0)
+    abs_sum = np.abs(weights).sum(axis=-1, keepdims=True)
+    return weights / np.where(abs_sum == 0, 1, abs_sum)
+
+
+def _window_moments(rets: np.ndarray, lookback: int, start: int, stop: int, columns=None) -> Moments:
+    # What days [start, stop) trade on: the windows ending at start - 1 ... stop - 2
+    with trace.span("rolling_moments", "compute", start=start, stop=stop):
+        return rolling_moments(rets, "window", window=lookback, columns=columns,
+                               start=max(start - 1, 0), stop=max(stop - 1, 1))
+
+
+def _batched_chunk(arrays: dict, start: int, stop: int, lookback: int, cap: float) -> np.ndarray:
+    moments = _window_moments(arrays["rets"], lookback, start, stop)
+    return batched_allocations(arrays["flags"], arrays["priced"], moments, lookback, cap, start, stop)
+
+
+def generate_allocations(signal_dir="data/signals/", return_dir="data/raw/", lookback=30,
+                         method="batched", workers=1, chunk_days=CHUNK_DAYS,
+                         allocator="mvo", store_dir=None) -> pd.DataFrame:
+    """
+    Allocations from the flag CSVs in signal_dir and the prices in
+    return_dir, ingested into store_dir (default: the store beside
+    return_dir, store.prices.store_dir_for) so a non-default raw dir never
+    overwrites the default store.
+    """
     # Load selected stock per sector
     with open("metadata/selected_current.yaml") as f:
         selected = yaml.safe_load(f)  # {TECH: INFY.NS, ...}
 
     # Load signals
-    signals, prices = {}, {}
-    lengths = []
-
+    signals = {}
     for fpath in glob.glob(os.path.join(signal_dir, "*_flag.csv")):
         sector = os.path.basename(fpath).split("_")[0].upper()
-        df = pd.read_csv(fpath)
+        with trace.span("read_csv", "io", path=fpath):
+            df = pd.read_csv(fpath)
         signals[sector] = df["flag"].values
-        lengths.append(len(df))
 
-        symbol = selected.get(sector)
-        if symbol:
-            price_path = os.path.join(return_dir, f"{symbol.replace('.', '_')}.csv")
-            if os.path.exists(price_path):
-                p = pd.read_csv(price_path)
-                p["close"] = pd.to_numeric(p["close"], errors="coerce")
-                p = p.dropna(subset=["close"])
-                prices[sector] = p["close"].pct_change().dropna()
+    panel = load_panel(store_dir or store_dir_for(return_dir), return_dir)
+    if allocator != "mvo":      # solver-free family: hrp / ivp / erc
+        from optimizer.risk_parity import allocate as risk_allocate
+        return risk_allocate(signals, selected, panel, lookback, allocator, workers=workers, chunk_days=chunk_days)
+    return allocate(signals, selected, panel, lookback, method, workers, chunk_days)
+
+
+def allocate(signals: dict, selected: dict, panel, lookback=30, method="batched", workers=1,
+             chunk_days=CHUNK_DAYS) -> pd.DataFrame:
+    """
+    Weights from in-memory flags ({sector: array}, column order kept) and
+    the price panel; what generate_allocations runs on the files.
+    """
+    signals = {k: np.asarray(v) for k, v in signals.items()}
+
+    # Returns of each flagged sector's stock, date-aligned by the price store
+    priced = [s for s in signals if selected.get(s) in panel.symbols]
+    close = panel.select([selected[s] for s in priced]).field("close")
+    rets = simple_returns(close)[1:]
 
     # Determine min length across all
-    min_len = min([len(x) for x in signals.values()] + [len(p) for p in prices.values()])
+    min_len = min([len(x) for x in signals.values()] + ([len(rets)] if priced else []))
     for k in signals:
         signals[k] = signals[k][-min_len:]
-    for k in prices:
-        prices[k] = prices[k][-min_len:]
 
     signal_df = pd.DataFrame(signals).reset_index(drop=True)
-    return_df = pd.DataFrame(prices).reset_index(drop=True)
+    return_df = pd.DataFrame(rets[-min_len:], columns=priced)
 
-    # MVO optimizer for one day
-    def mvo_alloc(signal_row, t):
+    # MVO optimizer for one day, on the trailing-window moments ending at t-1
+    def mvo_alloc(signal_row, t, moments):
         active = signal_row[signal_row != 0].index.tolist()
         if t < lookback:
             return pd.Series(0, index=signal_row.index)
 
         # If only 1 sector is active, add second best sector
+        t0, second = time.perf_counter(), None
         if len(active) == 1:
             rest = [s for s in return_df.columns if s not in active]
             if rest:
-                rets_subset = return_df[rest].iloc[t - lookback:t]
                 # Rank by Sharpe-like score: mean / std
-                sharpe_scores = rets_subset.mean() / rets_subset.std()
+                sharpe_scores = pd.Series(moments.mean(t - 1, rest) / moments.std(t - 1, rest), index=rest)
                 second = sharpe_scores.idxmax()
                 active.append(second)
 
@@ -58,19 +191,24 @@ def generate_allocations(signal_dir="data/signals/", return_dir="data/raw/", loo
         if not valid:
             return pd.Series(0, index=signal_row.index)
 
-        rets = return_df[valid].iloc[t - lookback:t]
-        mu = rets.mean().values
-        cov = rets.cov().values
+        mu = moments.mean(t - 1, valid)
+        cov = moments.cov(t - 1, valid)
+
+        from scipy.optimize import minimize     # slsqp path only
 
         def objective(w):
             return -np.dot(w, mu) + 0.5 * np.dot(w.T, np.dot(cov, w))
 
-        bounds = [(-0.5, 0.5)] * len(valid)
+        bounds = [(-CAP, CAP)] * len(valid)
         cons = [{"type": "eq", "fun": lambda w: np.sum(np.abs(w)) - 1}]
         x0 = np.array([1 / len(valid)] * len(valid))
 
         res = minimize(objective, x0, bounds=bounds, constraints=cons)
         w_opt = res.x if res.success else x0
+        if trace.ENABLED:
+            trace.day("rule_based_slsqp", t, n_active=len(valid), second_best=second is not None,
+                      fallback=not res.success, status=res.status, iterations=int(res.nit),
+                      seconds=time.perf_counter() - t0, sectors=",".join(valid))
 
         alloc = pd.Series(0, index=signal_row.index, dtype=float)
         for i, sector in enumerate(valid):
@@ -78,7 +216,23 @@ def generate_allocations(signal_dir="data/signals/", return_dir="data/raw/", loo
         return alloc
 
     # Run optimizer across all days
-    weights = pd.DataFrame([mvo_alloc(signal_df.iloc[i], i) for i in range(min_len)])
+    if method == "slsqp":   # reference path: one SLSQP solve per day
+        rows = []
+        with trace.span("solve", "optimizer", method=method, days=min_len):
+            for a, b in chunks(min_len, chunk_days):
+                moments = _window_moments(return_df.values, lookback, a, b, priced)
+                rows += [mvo_alloc(signal_df.iloc[i], i, moments) for i in range(a, b)]
+        weights = pd.DataFrame(rows)
+    else:
+        arrays = {
+            "flags": signal_df.values,
+            "priced": np.array([s in priced for s in signal_df.columns]),
+            "rets": return_df.values,
+        }
+        with trace.span("solve", "optimizer", method=method, days=min_len, workers=workers):
+            parts = run_sharded(_batched_chunk, arrays, min_len, workers=workers, chunk_days=chunk_days,
+                                lookback=lookback, cap=CAP)
+        weights = pd.DataFrame(np.concatenate(parts) if parts else np.zeros((0, signal_df.shape[1])))
     weights.index.name = "Date"
     weights.columns = signal_df.columns
     return weights
@@ -0,0 +1,320 @@
+"""
+dag.py
+------
+Content-addressed stage runner.
+
+A Stage declares what it reads — files / globs, upstream stages, params —
+and what it writes. Before running, its fingerprint is taken as a hash of
+
+    its code (the run function plus any listed modules)
+    its params
+    the contents of its input files
+    the contents of every upstream stage's outputs
+
+and if that matches the previous run and its outputs are still what that
+run wrote, the stage is skipped. Because upstream *outputs* are hashed
+rather than upstream fingerprints, a stage that re-runs and writes the
+same bytes stops the re-run there.
+
+Stages whose upstreams are done run concurrently on a thread pool, and a
+stage's return value is handed to its downstream stages in memory. A
+skipped stage's value is only rebuilt (its `load`, reading its outputs)
+if something downstream actually runs and asks for it.
+
+File hashes are memoized on (size, mtime_ns), and fingerprints plus
+output hashes are kept in one JSON file, saved after every stage, so an
+interrupted run resumes where it stopped.
+
+    dag = Pipeline([Stage("a", make_a, outputs=("a.csv",)), Stage("b", use_a, after=("a",))])
+    report = dag.run(params={"b": {"alpha": 0.5}})
+"""
+
+import glob
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable
+
+from profiling import trace
+
+STATE_FILE = "data/store/pipeline.json"
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable               # run(ctx) -> value
+    after: tuple = ()           # upstream stage names; ctx[name] is their value
+    inputs: tuple = ()          # files / globs read directly
+    outputs: tuple = ()         # files / globs written
+    params: dict = field(default_factory=dict)   # defaults; ctx.params has the resolved set
+    load: Callable = None       # load(ctx) -> value rebuilt from the outputs
+    code: tuple = ()            # modules whose source is part of the fingerprint
+    always: bool = False        # never skipped (network fetches and the like)
+
+
+class Context:
+    """What a stage's run / load sees: its params and its upstream values."""
+
+    def __init__(self, pipeline: "Pipeline", stage: Stage, params: dict):
+        self.stage = stage
+        self.params = params
+        self._pipeline = pipeline
+
+    def __getitem__(self, name: str):
+        if name not in self.stage.after:
+            raise KeyError(f"{self.stage.name} does not declare {name!r} upstream")
+        return self._pipeline._value(name)
+
+
+@dataclass
+class StageResult:
+    name: str
+    status: str             # ran | skipped | failed | blocked | would run | up to date
+    seconds: float = 0.0
+    reason: str = ""
+    error: str = None
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _digest(obj) -> str:
+    return _sha(json.dumps(obj, sort_keys=True, default=repr).encode())
+
+
+class Pipeline:
+    def __init__(self, stages: list, state_file: str = STATE_FILE):
+        self.stages = {s.name: s for s in stages}
+        missing = {a for s in stages for a in s.after if a not in self.stages}
+        if missing:
+            raise ValueError(f"unknown upstream stages: {sorted(missing)}")
+        self.order = self._toposort()
+        self.state_file = state_file
+        self.state = {"files": {}, "stages": {}}
+        if state_file and os.path.exists(state_file):
+            with open(state_file) as f:
+                self.state = json.load(f)
+        self._lock = threading.Lock()
+        self._values, self._value_locks = {}, {}
+        self._params = {}
+
+    def _toposort(self) -> list:
+        order, seen, active = [], set(), set()
+
+        def visit(name):
+            if name in seen:
+                return
+            if name in active:
+                raise ValueError(f"cycle through stage {name!r}")
+            active.add(name)
+            for up in self.stages[name].after:
+                visit(up)
+            active.discard(name)
+            seen.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    # ── hashing ───────────────────────────────────────────────────
+    def _file_hash(self, path: str):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            memo = self.state["files"].get(path)
+        if memo and memo[0] == st.st_size and memo[1] == st.st_mtime_ns:
+            return memo[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        with self._lock:
+            self.state["files"][path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def _hash_paths(self, patterns) -> dict:
+        out = {}
+        for pattern in patterns:
+            paths = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+            for path in paths:
+                out[path] = self._file_hash(path)
+        return out
+
+    def _code_hash(self, stage: Stage) -> str:
+        parts = [inspect.getsource(stage.run)]
+        if stage.load is not None:
+            parts.append(inspect.getsource(stage.load))
+        for module in stage.code:
+            spec = importlib.util.find_spec(module)
+            with open(spec.origin, "rb") as f:
+                parts.append(_sha(f.read()))
+        return _digest(parts)
+
+    def _signature(self, name: str) -> str:
+        """What downstream fingerprints see of an upstream stage: its outputs' contents."""
+        record = self.state["stages"].get(name, {})
+        if self.stages[name].outputs:
+            return _digest(record.get("outputs"))
+        return record.get("fingerprint")
+
+    def fingerprint(self, name: str) -> str:
+        stage = self.stages[name]
+        return _digest({
+            "name": name,
+            "code": self._code_hash(stage),
+            "params": self._params[name],
+            "inputs": self._hash_paths(stage.inputs),
+            "upstream": {up: self._signature(up) for up in stage.after},
+        })
+
+    def _up_to_date(self, name: str, fp: str) -> bool:
+        stage = self.stages[name]
+        record = self.state["stages"].get(name)
+        if stage.always or record is None or record.get("fingerprint") != fp:
+            return False
+        return self._hash_paths(stage.outputs) == record.get("outputs")
+
+    # ── values ────────────────────────────────────────────────────
+    def _value(self, name: str):
+        with self._lock:
+            if name in self._values:
+                return self._values[name]
+            lock = self._value_locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._values:
+                stage = self.stages[name]
+                if stage.load is None:
+                    raise RuntimeError(f"stage {name!r} was skipped and has no load()")
+                with trace.span(f"{name}.load", "load"):
+                    self._values[name] = stage.load(Context(self, stage, self._params[name]))
+            return self._values[name]
+
+    def _save(self) -> None:
+        if not self.state_file:
+            return
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        tmp = f"{self.state_file}.tmp"
+        with self._lock:
+            text = json.dumps(self.state, indent=1, sort_keys=True)
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, self.state_file)
+
+    # ── running ───────────────────────────────────────────────────
+    def resolve(self, params: dict = None) -> dict:
+        """{stage: params} — each stage's defaults updated with `params[stage]`."""
+        params = params or {}
+        unknown = [name for name in params if name not in self.stages]
+        if unknown:
+            raise ValueError(f"params for unknown stages: {unknown}")
+        resolved = {}
+        for name, stage in self.stages.items():
+            extra = [k for k in params.get(name, {}) if k not in stage.params]
+            if extra:
+                raise ValueError(f"{name} has no params {extra} (has: {sorted(stage.params)})")
+            resolved[name] = dict(stage.params, **params.get(name, {}))
+        return resolved
+
+    def _selected(self, targets) -> list:
+        if not targets:
+            return list(self.order)
+        unknown = [t for t in targets if t not in self.stages]
+        if unknown:
+            raise ValueError(f"unknown stages: {unknown}")
+        keep, todo = set(), list(targets)
+        while todo:
+            name = todo.pop()
+            if name not in keep:
+                keep.add(name)
+                todo.extend(self.stages[name].after)
+        return [n for n in self.order if n in keep]
+
+    def _step(self, name: str, forced: bool) -> StageResult:
+        t0 = time.perf_counter()
+        stage = self.stages[name]
+        with trace.span(f"{name}.fingerprint", "hash"):
+            fp = self.fingerprint(name)
+        if not forced and self._up_to_date(name, fp):
+            return StageResult(name, "skipped", time.perf_counter() - t0)
+        reason = ("forced" if forced else "always" if stage.always
+                  else "new" if name not in self.state["stages"] else "changed")
+        with self._lock:
+            self.state["stages"].pop(name, None)   # a run that dies leaves it dirty
+        with trace.span(name, "stage", reason=reason):
+            value = stage.run(Context(self, stage, self._params[name]))
+        outputs = self._hash_paths(stage.outputs)
+        with self._lock:
+            self._values[name] = value
+            self.state["stages"][name] = {"fingerprint": fp, "outputs": outputs}
+        self._save()
+        return StageResult(name, "ran", time.perf_counter() - t0, reason)
+
+    def run(self, params: dict = None, targets=None, force=(), workers: int = 4, log=print) -> list:
+        """
+        Bring `targets` (default: every stage) and what they need up to date.
+        `force` names stages to run regardless (True: all of them). Returns one
+        StageResult per stage, in execution-graph order; a failed stage
+        blocks its downstream stages but not independent branches.
+        """
+        self._params = self.resolve(params)
+        names = self._selected(targets)
+        forced = set(names) if force is True else set(force or ())
+        results, pending = {}, set(names)
+        futures = {}
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while pending or futures:
+                for name in [n for n in self.order if n in pending]:
+                    ups = self.stages[name].after
+                    if any(results.get(u) and results[u].status in ("failed", "blocked") for u in ups):
+                        results[name] = StageResult(name, "blocked", reason="upstream failed")
+                        pending.discard(name)
+                        log(f"  ✗ {name:<14} blocked")
+                    elif all(u in results for u in ups if u in names):
+                        futures[pool.submit(self._step, name, name in forced)] = name
+                        pending.discard(name)
+                if not futures:
+                    continue
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = futures.pop(fut)
+                    try:
+                        results[name] = res = fut.result()
+                    except Exception as exc:
+                        res = results[name] = StageResult(name, "failed", error=f"{type(exc).__name__}: {exc}")
+                        log(f"  ✗ {name:<14} failed: {res.error}")
+                        continue
+                    mark = "▶" if res.status == "ran" else "·"
+                    log(f"  {mark} {name:<14} {res.status:<8} {res.seconds:6.2f}s  {res.reason}".rstrip())
+        self._save()
+        return [results[n] for n in names]
+
+    def plan(self, params: dict = None, targets=None, force=()) -> list:
+        """What run() would do with the files as they are now, without running anything."""
+        self._params = self.resolve(params)
+        names = self._selected(targets)
+        forced = set(names) if force is True else set(force or ())
+        results = {}
+        for name in names:
+            stage = self.stages[name]
+            if any(results[u].status == "would run" for u in stage.after if u in results):
+                results[name] = StageResult(name, "would run", reason="upstream")
+            elif name in forced or stage.always:
+                results[name] = StageResult(name, "would run", reason="forced" if name in forced else "always")
+            elif self._up_to_date(name, self.fingerprint(name)):
+                results[name] = StageResult(name, "up to date")
+            else:
+                results[name] = StageResult(name, "would run",
+                                            reason="new" if name not in self.state["stages"] else "changed")
+        return [results[n] for n in names]
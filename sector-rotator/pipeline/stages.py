@@ -0,0 +1,310 @@
+"""
+stages.py
+---------
+The sector-rotator pipeline as pipeline.dag Stages:
+
+    [fetch] → prices ─┬─────────────────────┬─ flags.<SECTOR> ─ allocate ─ backtest ─┬─ report
+    [fundamentals] ───┴─ factors ─ select ──┘   (one per sector)                     └─ analyze
+
+(bracketed stages only with fetch_data=True; they always run).
+
+Each stage writes the same files as its script (fetch_prices,
+pull_fund_data, ingest_prices, factor_engineer, stock_picker,
+generate_flags, run_optimizer, run_backtest) and passes its result on in
+memory. analyze writes data/backtest/summary.csv; the benchmark
+comparison stays in analyze_backtests.py.
+
+Params are the scripts' constants: flags.<SECTOR> takes its signal
+module's generate_signal keyword arguments, allocate the MVO lookback,
+backtest the stop's k / lookback, select the KMeans settings. Setting
+select.walk_forward (a rebalance frequency, e.g. M) switches to
+point-in-time selection: select writes the selection table and hands
+on one sleeve per sector (selection/walkforward.py), and the flags,
+allocate and backtest stages run on the sleeve series instead of the
+snapshot's picks. CSVs are
+read back with float_precision="round_trip", so a stage sees the same
+values whether its upstream just ran or was skipped.
+"""
+
+import asyncio
+import inspect
+import os
+from importlib import import_module
+
+import pandas as pd
+import yaml
+
+from config import META_DIR, RAW_DIR, START_DATE, UNIVERSE_FILES
+from pipeline.dag import Stage
+from signals import SECTOR_MODULES, sector_flags
+from store.indices import INDEX_DIR
+from store.prices import STORE_DIR, load_panel
+
+PE_FILE    = f"{META_DIR}/pe_ratios.csv"
+PE_HISTORY = f"{META_DIR}/pe_history.csv"
+FUND_FILE  = f"{META_DIR}/fundamentals.csv"
+SNAP_FILE  = "data/factors/factor_snapshot.csv"
+PANEL_DIR  = "data/factors/panel"
+META_FILE  = f"{META_DIR}/selected_current.yaml"
+SELECTION_FILE = f"{META_DIR}/selection_history.csv"
+SIGNAL_DIR = "data/signals"
+WEIGHT_CSV = "data/weights/allocations.csv"
+BT_DIR     = "data/backtest"
+SUMMARY_CSV = f"{BT_DIR}/summary.csv"
+
+
+def _read_csv(path: str, **kwargs) -> pd.DataFrame:
+    return pd.read_csv(path, float_precision="round_trip", **kwargs)
+
+
+def _universe() -> list:
+    symbols = []
+    for csv_file in UNIVERSE_FILES.values():
+        symbols.extend(pd.read_csv(csv_file)["symbol"])
+    return sorted(set(symbols))
+
+
+def _flag_csv(sector: str) -> str:
+    return f"{SIGNAL_DIR}/{sector}_flag.csv"
+
+
+# ── data ──────────────────────────────────────────────────────────
+def fetch(ctx):
+    from store.fetch import refresh
+    from store.indices import fetch_indices
+    from store.sources import make_source
+
+    p = ctx.params
+    # refresh() closes its source, so each download gets its own
+    source = lambda: make_source(p["source"], **({"base_url": p["url"]} if p["source"] == "http" else {}))
+    results = asyncio.run(refresh(_universe(), source(), RAW_DIR, START_DATE, p["end"],
+                                  concurrency=p["concurrency"]))
+    results += asyncio.run(fetch_indices(source(), end=p["end"], concurrency=p["concurrency"]))
+    for r in results:
+        if r.status == "failed":
+            print(f"⚠  {r.symbol}: {r.error}")
+    return results
+
+
+def fundamentals(ctx):
+    from store.fundamentals import SOURCES, FundamentalsCache, append_history, fetch_fundamentals, write_if_changed
+
+    p = ctx.params
+    sources = [SOURCES[name](base_url=p["url"]) if name == "http" else SOURCES[name]()
+               for name in p["sources"].split(",")]
+    cache = FundamentalsCache()
+    df = asyncio.run(fetch_fundamentals(_universe(), sources, cache=cache, concurrency=p["concurrency"]))
+    cache.save()
+    write_if_changed(df[["pe"]], PE_FILE)
+    write_if_changed(df, FUND_FILE)
+    append_history(df, PE_HISTORY)
+    return df
+
+
+def prices(ctx):
+    return load_panel()
+
+
+def load_prices(ctx):
+    return load_panel(refresh=False)
+
+
+# ── selection ─────────────────────────────────────────────────────
+def factors(ctx):
+    from selection.factors import build_factor_panel, factor_snapshot
+
+    pe = pd.read_csv(PE_FILE).set_index("symbol")["pe"]
+    history = pd.read_csv(PE_HISTORY) if os.path.exists(PE_HISTORY) else None
+    fund = pd.read_csv(FUND_FILE).set_index("symbol") if os.path.exists(FUND_FILE) else None
+    fp = build_factor_panel(ctx["prices"], pe, history, out_dir=PANEL_DIR)
+    snap = factor_snapshot(ctx["prices"], pe, fund, verbose=False, factor_panel=fp)
+    os.makedirs(os.path.dirname(SNAP_FILE), exist_ok=True)
+    snap.to_csv(SNAP_FILE, index=False)
+    return snap
+
+
+def load_factors(ctx):
+    return _read_csv(SNAP_FILE)
+
+
+def select(ctx):
+    from selection.factors import load_factor_panel
+    from selection.picker import pick_stocks, sector_map
+    from selection.walkforward import save_selection, sleeves, walk_forward
+
+    p = ctx.params
+    sym2sector = sector_map(UNIVERSE_FILES)
+    selected = pick_stocks(ctx["factors"], sym2sector, n_clusters=p["n_clusters"],
+                           random_state=p["random_state"], verbose=False)
+    with open(META_FILE, "w") as f:
+        yaml.dump(selected, f)
+    if not p["walk_forward"]:
+        if os.path.exists(SELECTION_FILE):
+            os.remove(SELECTION_FILE)
+        return selected
+    table = walk_forward(load_factor_panel(PANEL_DIR), sym2sector, p["walk_forward"], n_clusters=p["n_clusters"],
+                         random_state=p["random_state"], method=p["wf_method"])
+    save_selection(table, SELECTION_FILE)
+    return sleeves(table)
+
+
+def load_select(ctx):
+    from selection.walkforward import load_selection, sleeves
+
+    if ctx.params["walk_forward"]:
+        return sleeves(load_selection(SELECTION_FILE))
+    with open(META_FILE) as f:
+        return yaml.safe_load(f)
+
+
+def _panel(ctx):
+    """The prices the selection refers to: the sleeve series in walk-forward mode."""
+    from selection.walkforward import SLEEVE_PREFIX, load_selection, sleeve_panel
+
+    if any(s.startswith(SLEEVE_PREFIX) for s in ctx["select"].values()):
+        return sleeve_panel(ctx["prices"], load_selection(SELECTION_FILE))
+    return ctx["prices"]
+
+
+# ── signals → weights → equity ────────────────────────────────────
+def flags(ctx):
+    sector = ctx.stage.name.split(".", 1)[1]
+    symbol = ctx["select"].get(sector)
+    path = _flag_csv(sector)
+    if symbol is None:   # no pick for this sector: drop a flag file left by an earlier run
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+    params = {f"{sector}.{k}": v for k, v in ctx.params.items()}
+    signal = sector_flags(_panel(ctx), {sector: symbol}, params)[sector]
+    os.makedirs(SIGNAL_DIR, exist_ok=True)
+    signal.to_csv(path, index=False)
+    return signal
+
+
+def load_flags(ctx):
+    path = _flag_csv(ctx.stage.name.split(".", 1)[1])
+    return _read_csv(path)["flag"] if os.path.exists(path) else None
+
+
+def _sector_signals(ctx) -> dict:
+    signals = {}
+    for sector in ctx["select"]:
+        if sector in SECTOR_MODULES:
+            flag = ctx[f"flags.{sector}"]
+            if flag is not None:
+                signals[sector] = flag.values
+    return signals
+
+
+def allocate(ctx):
+    from optimizer.rule_based import allocate as mvo, cap_and_normalize
+
+    p = ctx.params
+    if p["method"] == "mvo":
+        weights = mvo(_sector_signals(ctx), ctx["select"], _panel(ctx), lookback=p["lookback"])
+    else:
+        from optimizer.risk_parity import allocate as risk_allocate
+        weights = risk_allocate(_sector_signals(ctx), ctx["select"], _panel(ctx), lookback=p["lookback"],
+                                method=p["method"])
+    weights = cap_and_normalize(weights)
+    os.makedirs(os.path.dirname(WEIGHT_CSV), exist_ok=True)
+    weights.to_csv(WEIGHT_CSV, index=False)
+    return weights
+
+
+def load_allocate(ctx):
+    return _read_csv(WEIGHT_CSV)
+
+
+def backtest(ctx):
+    from backtest.simulate import save, simulate
+
+    p = ctx.params
+    result = simulate(ctx["allocate"], _sector_signals(ctx), ctx["select"], _panel(ctx),
+                      k=p["k"], lookback=p["lookback"], initial_capital=p["initial_capital"], verbose=False)
+    save(result, BT_DIR)
+    return result
+
+
+def load_backtest(ctx):
+    from backtest.simulate import Backtest
+
+    equity = _read_csv(f"{BT_DIR}/portfolio_value.csv", parse_dates=["date"]).set_index("date")["PortfolioValue"]
+    rolling = _read_csv(f"{BT_DIR}/rolling_30d_return.csv", parse_dates=["date"]).set_index("date")
+    returns = equity.pct_change()
+    returns.iloc[0] = equity.iloc[0] / ctx.params["initial_capital"] - 1
+    weights = ctx["allocate"]
+    return Backtest(equity, returns, None, rolling["Rolling30dReturn"], weights.abs().sum(axis=1) == 0)
+
+
+def report(ctx):
+    from backtest.simulate import plot
+
+    return plot(ctx["backtest"])
+
+
+def analyze(ctx):
+    from backtest.simulate import summarize
+
+    result = ctx["backtest"]
+    summary = summarize(result.equity, ctx.params["initial_capital"])
+    summary["flat_pct"] = result.flat_days.mean() * 100
+    table = pd.Series(summary, name="value").rename_axis("metric")
+    table.to_csv(SUMMARY_CSV)
+    return table
+
+
+def load_analyze(ctx):
+    return _read_csv(SUMMARY_CSV, index_col="metric")["value"]
+
+
+def _signal_defaults(sector: str) -> dict:
+    sig = inspect.signature(import_module(SECTOR_MODULES[sector]).generate_signal)
+    return {k: p.default for k, p in sig.parameters.items() if p.default is not inspect.Parameter.empty}
+
+
+def build_stages(fetch_data: bool = False) -> list:
+    """Every stage; `fetch_data` adds the (always-run) price and fundamentals downloads."""
+    stages = []
+    if fetch_data:
+        stages += [
+            Stage("fetch", fetch, outputs=(f"{RAW_DIR}/*.csv", f"{INDEX_DIR}/*.csv"),
+                  code=("store.fetch", "store.sources", "store.indices"),
+                  params={"source": "yfinance", "url": "http://127.0.0.1:8765", "end": None, "concurrency": 8},
+                  always=True),
+            Stage("fundamentals", fundamentals, outputs=(PE_FILE, FUND_FILE, PE_HISTORY),
+                  code=("store.fundamentals",),
+                  params={"sources": "yahoo,nse", "url": "http://127.0.0.1:8765", "concurrency": 8},
+                  always=True),
+        ]
+    stages += [
+        Stage("prices", prices, after=("fetch",) if fetch_data else (), inputs=(f"{RAW_DIR}/*.csv",),
+              outputs=(f"{STORE_DIR}/*.npy",), load=load_prices, code=("store.prices",)),
+        Stage("factors", factors, after=("prices",) + (("fundamentals",) if fetch_data else ()),
+              inputs=(PE_FILE, PE_HISTORY, FUND_FILE), outputs=(SNAP_FILE, f"{PANEL_DIR}/*.npy"),
+              load=load_factors,
+              code=("selection.factors", "signals.lib")),
+        Stage("select", select, after=("factors",), inputs=tuple(UNIVERSE_FILES.values()),
+              outputs=(META_FILE, SELECTION_FILE), load=load_select, code=("selection.picker", "selection.walkforward"),
+              params={"n_clusters": 3, "random_state": 42, "walk_forward": None, "wf_method": "cold"}),
+    ]
+    for sector, module in SECTOR_MODULES.items():
+        stages.append(Stage(f"flags.{sector}", flags, after=("prices", "select"), outputs=(_flag_csv(sector),),
+                            params=_signal_defaults(sector), load=load_flags,
+                            code=(module, "signals.lib", "signals")))
+    flag_stages = tuple(f"flags.{s}" for s in SECTOR_MODULES)
+    stages += [
+        Stage("allocate", allocate, after=("prices", "select") + flag_stages, outputs=(WEIGHT_CSV,),
+              params={"lookback": 30, "method": "mvo"}, load=load_allocate,
+              code=("optimizer.rule_based", "optimizer.batched_qp", "optimizer.moments", "optimizer.risk_parity")),
+        Stage("backtest", backtest, after=("prices", "select", "allocate") + flag_stages,
+              outputs=(f"{BT_DIR}/portfolio_value.csv", f"{BT_DIR}/rolling_30d_return.csv"),
+              params={"k": 0.125, "lookback": 30, "initial_capital": 1_000_000}, load=load_backtest,
+              code=("backtest.simulate", "backtest.stops")),
+        Stage("report", report, after=("backtest",),
+              outputs=("report/daily_returns.png", "report/rolling_30d_return.png"), code=("backtest.simulate",)),
+        Stage("analyze", analyze, after=("backtest",), outputs=(SUMMARY_CSV,),
+              params={"initial_capital": 1_000_000}, load=load_analyze, code=("backtest.simulate",)),
+    ]
+    return stages
@@ -0,0 +1,345 @@
+"""
+trace.py
+--------
+Built-in run instrumentation: timed (and optionally memory-tracked) spans
+around pipeline stages and file loads, per-day counter rows from the
+optimizer day loops, and an optional sampling profiler.
+
+Off by default. While off, span() hands back one shared no-op object and
+day() returns at once, so instrumented code pays an attribute lookup and
+a call; loops that would build arguments guard on `trace.ENABLED` first.
+
+    from profiling import trace
+
+    trace.enable(memory=True, sample=0.005)
+    with trace.span("ingest", "io", files=500):
+        ...
+    trace.day("mean_variance", i, status="optimal", solve_s=0.0012)
+    trace.save("data/store/trace.json")
+
+save() writes the JSON report (spans, per-day tables, a summary per
+table, top sampled frames) and, next to it, `<stem>.trace.json` in the
+Chrome trace-event format (open in chrome://tracing or ui.perfetto.dev):
+spans become complete events, numeric day fields become counter tracks.
+With sampling on, `<stem>.folded` holds collapsed stacks for
+flamegraph.pl / speedscope.
+
+Spans from optimizer.parallel worker processes are shipped back with
+their chunk results (collect() / merge()), so sharded runs trace too.
+Timestamps are perf_counter microseconds, which share one clock across
+processes on Linux.
+
+Any script can be traced without a flag by setting SR_TRACE to the
+report path (SR_TRACE_MEMORY=1 and SR_TRACE_SAMPLE=<seconds> for the
+extras); the report is written at exit.
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+
+ENABLED = False
+MEMORY = False            # per-span tracemalloc accounting
+
+_spans = []               # finished spans (dicts)
+_days = defaultdict(list)  # table → [row, ...]
+_open = []                # open spans tracking memory, innermost last
+_lock = threading.Lock()
+_sampler = None
+_stacks = Counter()       # collapsed stack → samples, kept when the sampler stops
+
+
+class _Noop:
+    """What span() returns while tracing is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setitem__(self, key, value):
+        pass
+
+    def update(self, *args, **kwargs):
+        pass
+
+
+_NOOP = _Noop()
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "t0", "mem0", "peak")
+
+    def __init__(self, name: str, cat: str, args: dict):
+        self.name, self.cat, self.args = name, cat, args
+
+    def __setitem__(self, key, value):
+        self.args[key] = value
+
+    def update(self, *args, **kwargs):
+        self.args.update(*args, **kwargs)
+
+    def __enter__(self):
+        if MEMORY:
+            with _lock:
+                _fold_peak()
+                self.mem0 = self.peak = tracemalloc.get_traced_memory()[0]
+                _open.append(self)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        t1 = time.perf_counter()
+        event = {"name": self.name, "cat": self.cat, "ts": self.t0 * 1e6, "dur": (t1 - self.t0) * 1e6,
+                 "pid": os.getpid(), "tid": threading.get_ident(), "args": self.args}
+        if exc_type is not None:
+            event["args"]["error"] = exc_type.__name__
+        if MEMORY:
+            with _lock:
+                _fold_peak()
+                _open.remove(self)
+                current = tracemalloc.get_traced_memory()[0]
+            event["args"]["mem_delta_mb"] = round((current - self.mem0) / 2**20, 3)
+            event["args"]["mem_peak_mb"] = round((self.peak - self.mem0) / 2**20, 3)
+        _spans.append(event)
+        return False
+
+
+def _fold_peak() -> None:
+    """Credit the allocation peak since the last fold to every open span (holding _lock)."""
+    peak = tracemalloc.get_traced_memory()[1]
+    for s in _open:
+        s.peak = max(s.peak, peak)
+    tracemalloc.reset_peak()
+
+
+# ── recording ─────────────────────────────────────────────────────
+def span(name: str, cat: str = "stage", **args):
+    """Context manager timing a block; `sp[key] = value` adds args to the event."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(name, cat, args)
+
+
+def traced(name: str = None, cat: str = "stage"):
+    """Decorator form of span(); the check happens per call, not at import."""
+    def wrap(fn):
+        label = name or fn.__qualname__
+
+        def inner(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _Span(label, cat, {}):
+                return fn(*args, **kwargs)
+        inner.__name__, inner.__qualname__, inner.__doc__ = fn.__name__, fn.__qualname__, fn.__doc__
+        inner.__wrapped__ = fn
+        return inner
+    return wrap
+
+
+def day(table: str, day: int, **fields) -> None:
+    """One per-day counter row (e.g. solver status and time for day `day`)."""
+    if not ENABLED:
+        return
+    fields["day"] = int(day)
+    fields["ts"] = time.perf_counter() * 1e6
+    _days[table].append(fields)
+
+
+# ── control ───────────────────────────────────────────────────────
+def enable(memory: bool = False, sample: float = None) -> None:
+    """
+    Start recording. memory=True tracks allocations per span through
+    tracemalloc (slow: expect 2-5× on allocation-heavy stages); sample
+    is the sampling-profiler interval in seconds (None: no sampler).
+    """
+    global ENABLED, MEMORY, _sampler
+    ENABLED = True
+    if memory and not MEMORY:
+        MEMORY = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    if sample and _sampler is None:
+        _sampler = Sampler(sample, _stacks)
+        _sampler.start()
+
+
+def disable() -> None:
+    global ENABLED, MEMORY, _sampler
+    ENABLED = False
+    if MEMORY:
+        MEMORY = False
+        tracemalloc.stop()
+    if _sampler is not None:
+        _sampler.stop()
+        _sampler = None
+
+
+def reset() -> None:
+    """Drop everything recorded so far (the sampler's counts included)."""
+    _spans.clear()
+    _days.clear()
+    _stacks.clear()
+
+
+def collect() -> dict:
+    """Hand over and clear what this process recorded (used by worker processes)."""
+    payload = {"spans": list(_spans), "days": {k: list(v) for k, v in _days.items()}}
+    _spans.clear()
+    _days.clear()
+    return payload
+
+
+def merge(payload: dict) -> None:
+    """Add another process's collect() to this one's records."""
+    _spans.extend(payload["spans"])
+    for table, rows in payload["days"].items():
+        _days[table].extend(rows)
+
+
+# ── sampling profiler ─────────────────────────────────────────────
+class Sampler(threading.Thread):
+    """
+    Samples every other thread's Python stack each `interval` seconds
+    (sys._current_frames) and counts the collapsed stacks. Coarse, but it
+    needs no extra package and sees inside C-heavy calls by their caller.
+    Threads parked in a wait (idle pool workers, the pipeline's scheduler)
+    are not counted.
+    """
+
+    IDLE = {"threading.py:wait", "thread.py:_worker", "_base.py:wait", "selectors.py:select"}
+
+    def __init__(self, interval: float = 0.005, stacks: Counter = None):
+        super().__init__(name="trace-sampler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter() if stacks is None else stacks
+        self._halt = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._halt.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack[0] in self.IDLE:
+                    continue
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+    def top(self, n: int = 20) -> list:
+        return _top(self.stacks, n)
+
+
+def _top(stacks: Counter, n: int = 20) -> list:
+    """[(frame, share of samples)] for the n frames most often on top of the stack."""
+    leaf = Counter()
+    for stack, hits in stacks.items():
+        leaf[stack.rsplit(";", 1)[-1]] += hits
+    total = sum(leaf.values()) or 1
+    return [(name, round(hits / total, 4)) for name, hits in leaf.most_common(n)]
+
+
+# ── output ────────────────────────────────────────────────────────
+def _numeric(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def summary() -> dict:
+    """Per span name: calls / total / max seconds; per day table: counts, sums and means."""
+    spans = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+    for e in _spans:
+        s = spans[e["name"]]
+        s["calls"] += 1
+        s["seconds"] += e["dur"] / 1e6
+        s["max_seconds"] = max(s["max_seconds"], e["dur"] / 1e6)
+    tables = {}
+    for table, rows in _days.items():
+        out = {"days": len(rows)}
+        keys = {k for r in rows for k in r} - {"day", "ts"}
+        for key in sorted(keys):
+            values = [r[key] for r in rows if key in r]
+            if all(isinstance(v, bool) for v in values):
+                out[f"{key}_count"] = sum(values)
+            elif all(_numeric(v) for v in values):
+                out[f"{key}_sum"] = sum(values)
+                out[f"{key}_mean"] = sum(values) / len(values)
+            else:
+                out[key] = dict(Counter(str(v) for v in values))
+        tables[table] = out
+    return {"spans": dict(spans), "days": tables}
+
+
+def chrome_events() -> list:
+    """Spans as complete ("X") events and numeric day fields as counter ("C") events."""
+    ts = [e["ts"] for e in _spans] + [r["ts"] for rows in _days.values() for r in rows]
+    origin = min(ts) if ts else 0.0
+    events = [dict(e, ph="X", ts=e["ts"] - origin) for e in _spans]
+    pid = os.getpid()
+    for table, rows in _days.items():
+        for r in rows:
+            values = {k: v for k, v in r.items() if k not in ("day", "ts") and (_numeric(v) or isinstance(v, bool))}
+            if values:
+                events.append({"name": table, "ph": "C", "ts": r["ts"] - origin, "pid": pid,
+                               "args": {k: float(v) for k, v in values.items()}})
+    return events
+
+
+def save(path: str) -> list:
+    """Write the JSON report, the Chrome trace and (if sampling) folded stacks. Returns the paths."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    stem = path[:-5] if path.endswith(".json") else path
+    report = {"summary": summary(), "spans": _spans, "days": dict(_days)}
+    if sys.platform != "win32":
+        import resource
+        report["summary"]["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if _sampler is not None or _stacks:
+        report["summary"]["sampled_top"] = _top(_stacks)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1, default=str)
+    paths = [path, f"{stem}.trace.json"]
+    with open(paths[1], "w") as f:
+        json.dump({"traceEvents": chrome_events(), "displayTimeUnit": "ms"}, f, default=str)
+    if _stacks:
+        paths.append(f"{stem}.folded")
+        with open(paths[2], "w") as f:
+            f.writelines(f"{stack} {hits}\n" for stack, hits in _stacks.most_common())
+    return paths
+
+
+# ── command line ──────────────────────────────────────────────────
+def add_arguments(parser) -> None:
+    """--trace / --trace-memory / --trace-sample on a script's argparse parser."""
+    parser.add_argument("--trace", metavar="PATH", help="write a timing report (+ Chrome trace) to PATH")
+    parser.add_argument("--trace-memory", action="store_true", help="track allocations per span (slower)")
+    parser.add_argument("--trace-sample", type=float, metavar="SECONDS",
+                        help="also run the sampling profiler at this interval")
+
+
+def start(args) -> None:
+    if args.trace:
+        enable(memory=args.trace_memory, sample=args.trace_sample)
+
+
+def finish(args) -> None:
+    if args.trace:
+        print(f"   trace → {', '.join(save(args.trace))}")
+
+
+if os.environ.get("SR_TRACE"):
+    enable(memory=os.environ.get("SR_TRACE_MEMORY") == "1",
+           sample=float(os.environ["SR_TRACE_SAMPLE"]) if os.environ.get("SR_TRACE_SAMPLE") else None)
+    atexit.register(lambda: save(os.environ["SR_TRACE"]))
@@ -11,14 +11,49 @@ Evaluates portfolio performance metrics:
 - Conditional VaR (CVaR)
 - Win/Loss Ratio
 - Alpha/Beta vs Nifty 50
+With --paths N, also block-bootstrap confidence intervals for all of the
+above (backtest/montecarlo.py) → data/backtest/montecarlo.csv
+With --rolling W,..., rolling vol / Sharpe / drawdowns / VaR / CVaR /
+alpha / beta per window (backtest/rolling.py) → data/backtest/rolling_metrics.csv
+Regimes and calendar tables are range queries on backtest/ranges.py; --regimes
+takes a CSV of name,start,end rows (any number), --calendar writes monthly /
+yearly returns and a start-year × end-year CAGR heatmap.
+The summary and benchmark metrics are added to the backtest's run in the
+results store (store/results.py), matched on its equity curve; a curve
+with no recorded run is logged as a new "analyze" run.
+
+    python scripts/analyze_backtests.py
+    python scripts/analyze_backtests.py --paths 10000 --block 20 --bootstrap circular
+    python scripts/analyze_backtests.py --rolling 63,252
+    python scripts/analyze_backtests.py --regimes my_regimes.csv --calendar
 """
 
-import os
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+
 import pandas as pd
-import numpy as np
-import yfinance as yf
-from sklearn.linear_model import LinearRegression
-import matplotlib.pyplot as plt
+from backtest.simulate import INITIAL_CAPITAL, summarize
+from backtest.montecarlo import BLOCK, bootstrap
+from backtest.rolling import rolling_frame
+from backtest.ranges import PerformanceIndex
+from store.indices import BENCHMARK, load_index
+from store.results import RESULTS_DB, ResultStore
+
+parser = argparse.ArgumentParser(description="Backtest performance, regime and benchmark analysis")
+parser.add_argument("--paths", type=int, default=0, help="bootstrap paths for confidence intervals (0 = off)")
+parser.add_argument("--block", type=float, default=BLOCK, help="mean block length in days")
+parser.add_argument("--bootstrap", default="stationary", choices=["stationary", "circular"])
+parser.add_argument("--level", type=float, default=0.95, help="confidence level")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--workers", type=int, default=1, help="processes for the bootstrap (0 = all cores)")
+parser.add_argument("--rolling", metavar="WINDOWS", help="comma-separated window lengths for rolling metrics")
+parser.add_argument("--regimes", metavar="CSV", help="name,start,end rows replacing the built-in regimes")
+parser.add_argument("--calendar", action="store_true", help="write monthly / yearly returns and a CAGR heatmap")
+parser.add_argument("--db", default=RESULTS_DB, help="results store")
+parser.add_argument("--no-store", action="store_true", help="do not record the metrics")
+args = parser.parse_args()
 
 # Load equity curve with actual date index
 equity = pd.read_csv("data/backtest/portfolio_value.csv", parse_dates=["date"])
@@ -28,40 +63,14 @@ equity = equity.set_index("date")
 # equity = equity.loc[BACKTEST_START:BACKTEST_END]
 
 # Initial capital
-initial_capital = 1_000_000
-
-# Compute daily returns
-returns = equity["PortfolioValue"].pct_change().dropna()
-
-# Final capital
-final_value = equity["PortfolioValue"].iloc[-1]
-total_return = final_value - initial_capital
-
-# CAGR
-n_years = len(returns) / 252
-cagr = (final_value / initial_capital)**(1 / n_years) - 1
-
-# Volatility (annualized)
-volatility = returns.std() * np.sqrt(252)
-
-# Sharpe Ratio (assumes 0% risk-free rate)
-sharpe = cagr / volatility
+initial_capital = INITIAL_CAPITAL
 
-# Max Drawdown
-roll_max = equity["PortfolioValue"].cummax()
-drawdown = equity["PortfolioValue"] / roll_max - 1
-max_dd = drawdown.min()
-
-# Value at Risk (VaR 95%)
-var_95 = np.percentile(returns, 5)
-
-# Conditional VaR (CVaR 95%)
-cvar_95 = returns[returns <= var_95].mean()
-
-# Win/Loss Ratio
-wins = (returns > 0).sum()
-losses = (returns < 0).sum()
-win_loss = wins / losses if losses != 0 else np.nan
+# CAGR, volatility, Sharpe (0% risk-free), max drawdown, VaR / CVaR (95%), win/loss
+summary = summarize(equity["PortfolioValue"], initial_capital)
+final_value, total_return = summary["final_value"], summary["total_return"]
+cagr, volatility, sharpe = summary["cagr"], summary["volatility"], summary["sharpe"]
+max_dd, var_95, cvar_95 = summary["max_drawdown"], summary["var_95"], summary["cvar_95"]
+wins, losses, win_loss = summary["wins"], summary["losses"], summary["win_loss"]
 
 # Print results
 print("\nPerformance Summary")
@@ -76,11 +85,12 @@ print(f"VaR (95%):        {var_95 * 100:.2f}%")
 print(f"CVaR (95%):       {cvar_95 * 100:.2f}%")
 print(f"Win/Loss:         {win_loss:.2f} ({wins}W / {losses}L)")
 
-# Benchmark Comparison
-nifty = yf.download("^NSEI", start="2018-01-01", end="2025-04-01")
-nifty = nifty[["Close"]].dropna()
-nifty.columns = ["Nifty50"]
-nifty.index = pd.to_datetime(nifty.index)
+# Benchmark Comparison (local index cache; refresh with scripts/fetch_indices.py)
+try:
+    nifty = load_index(BENCHMARK, "2018-01-01", "2025-03-31").to_frame("Nifty50")
+except FileNotFoundError as e:
+    print(f"\n⚠  {e}")
+    nifty = pd.DataFrame({"Nifty50": pd.Series(dtype=float, index=pd.DatetimeIndex([]))})
 
 # Align portfolio to actual Nifty dates
 portfolio = equity.copy()
@@ -101,26 +111,36 @@ regimes = {
     "Recent Bull": ("2023-01-01", "2025-01-01")
 }
 
+ranges = PerformanceIndex(equity["PortfolioValue"])
+if args.regimes:
+    regime_table = ranges.stats(pd.read_csv(args.regimes, index_col="name"))
+    regime_table.to_csv("data/backtest/regimes.csv")
+else:
+    regime_table = ranges.stats(regimes)
+
 print("\n📅 Regime-Based Analysis")
-for name, (start, end) in regimes.items():
-    try:
-        segment = equity.loc[start:end]
-        if len(segment) < 30:
-            print(f"{name}: Too few data points.")
-            continue
-        start_val = segment["PortfolioValue"].iloc[0]
-        end_val = segment["PortfolioValue"].iloc[-1]
-        years = len(segment) / 252
-        cagr = (end_val / start_val) ** (1 / years) - 1
-        print(f"{name:<18}: {cagr*100:>6.2f}% CAGR over {len(segment)} days")
-    except Exception as e:
-        print(f"{name}: Error → {e}")
+for name, row in regime_table.iterrows():
+    if row["days"] < 30:
+        print(f"{name}: Too few data points.")
+        continue
+    print(f"{name:<18}: {row['cagr']*100:>6.2f}% CAGR over {row['days']} days")
+if args.regimes:
+    print("Saved → data/backtest/regimes.csv")
+
+if args.calendar:
+    ranges.monthly().to_csv("data/backtest/monthly_returns.csv")
+    ranges.periods_table("Y").to_csv("data/backtest/yearly_stats.csv")
+    ranges.heatmap("Y").to_csv("data/backtest/cagr_heatmap.csv")
+    print("Saved → data/backtest/monthly_returns.csv, yearly_stats.csv, cagr_heatmap.csv")
 
 # Alpha/Beta via linear regression
 common_returns = pd.concat([portfolio_returns, nifty_returns], axis=1).dropna()
 common_returns.columns = ["Portfolio", "Nifty"]
 
 if not common_returns.empty:
+    from sklearn.linear_model import LinearRegression
+    import matplotlib.pyplot as plt
+
     X = common_returns["Nifty"].values.reshape(-1, 1)
     y = common_returns["Portfolio"].values
 
@@ -147,5 +167,58 @@ if not common_returns.empty:
     print(f"Alpha:           {alpha:.4f}")
     print(f"Beta:            {beta:.4f}")
     print(f"Max Daily Loss:  {max_loss:.4f}")
+    summary.update(alpha=alpha, beta=beta, max_daily_loss=max_loss)
 else:
-    print("\nNot enough data for alpha/beta regression. Skipping benchmark comparison.")
\ No newline at end of file
+    print("\nNot enough data for alpha/beta regression. Skipping benchmark comparison.")
+
+# Attach the metrics to the run that produced this curve
+if not args.no_store:
+    with ResultStore(args.db) as store:
+        run_id = store.find_curve(equity["PortfolioValue"])
+        if run_id is None:
+            run_id = store.log_run({"initial_capital": initial_capital}, summary, equity["PortfolioValue"],
+                                   kind="analyze", inputs=["data/backtest/portfolio_value.csv"])
+        else:
+            store.add_metrics(run_id, summary)
+    print(f"Run {run_id} → {args.db}")
+
+# Block-bootstrap confidence intervals, resampled jointly with Nifty
+if args.paths:
+    mc = bootstrap(equity["PortfolioValue"], nifty_returns, n_paths=args.paths, block=args.block,
+                   kind=args.bootstrap, level=args.level, seed=args.seed, workers=args.workers,
+                   initial_capital=initial_capital)
+    mc.table.to_csv("data/backtest/montecarlo.csv")
+
+    money = lambda v: f"₹{v:,.0f}"
+    pct = lambda v: f"{v * 100:.2f}%"
+    labels = {
+        "final_value": ("Final Capital", money), "total_return": ("Total Return", money),
+        "cagr": ("CAGR", pct), "volatility": ("Volatility", pct),
+        "sharpe": ("Sharpe Ratio", "{:.2f}".format), "max_drawdown": ("Max Drawdown", pct),
+        "var_95": ("VaR (95%)", pct), "cvar_95": ("CVaR (95%)", pct),
+        "win_loss": ("Win/Loss", "{:.2f}".format), "alpha": ("Alpha", "{:.4f}".format),
+        "beta": ("Beta", "{:.4f}".format),
+    }
+    print(f"\n🎲 Bootstrap ({args.paths:,} {args.bootstrap} paths, block {args.block:g}d, "
+          f"{args.level:.0%} interval)")
+    for metric, row in mc.table.iterrows():
+        if metric in labels:
+            label, fmt = labels[metric]
+            print(f"{label + ':':<17} {fmt(row['point']):>14}   [{fmt(row['lo'])}, {fmt(row['hi'])}]")
+    print("Saved → data/backtest/montecarlo.csv")
+
+# Rolling risk metrics per window
+if args.rolling:
+    windows = [int(w) for w in args.rolling.split(",")]
+    daily = equity["PortfolioValue"].pct_change().dropna()
+    rolling = rolling_frame(daily, windows, nifty_returns)
+    rolling.columns = [f"{metric}_{w}" for w, metric in rolling.columns]
+    rolling.to_csv("data/backtest/rolling_metrics.csv")
+
+    print("\n📈 Rolling Metrics (latest)")
+    for w in windows:
+        last = rolling.iloc[-1]
+        print(f"{w:>4}d: Sharpe {last[f'sharpe_{w}']:.2f}  Vol {last[f'vol_{w}'] * 100:.2f}%  "
+              f"MaxDD {last[f'max_drawdown_{w}'] * 100:.2f}%  CVaR {last[f'cvar_{w}'] * 100:.2f}%  "
+              f"Beta {last[f'beta_{w}']:.2f}")
+    print("Saved → data/backtest/rolling_metrics.csv")
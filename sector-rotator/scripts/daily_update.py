@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+daily_update.py
+---------------
+Appends new days in data/raw to the flags, allocations and portfolio
+value without rerunning the pipeline (see live/daily.py).
+
+    python scripts/daily_update.py --init     # once, right after a full run
+    python scripts/daily_update.py            # every end of day
+    python scripts/daily_update.py --verify   # also recompute a full rerun in memory and compare
+
+Outputs match a full rerun byte for byte; pass --init the --chunk-days
+run_optimizer used. A day is held until every selected symbol has its
+bar. rolling_30d_return.csv and the report plots are only refreshed by
+run_backtest.
+"""
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import time
+
+from live.daily import DailyState, STATE_FILE, full_rerun_diff
+from optimizer.parallel import CHUNK_DAYS
+
+parser = argparse.ArgumentParser(description="Incremental end-of-day update")
+parser.add_argument("--init", action="store_true", help="rebuild the state from the current full-run outputs")
+parser.add_argument("--state", default=STATE_FILE)
+parser.add_argument("--chunk-days", type=int, default=CHUNK_DAYS, help="with --init, run_optimizer's --chunk-days")
+parser.add_argument("--verify", action="store_true", help="compare the outputs with a full rerun computed in memory")
+args = parser.parse_args()
+
+t0 = time.perf_counter()
+if args.init:
+    state = DailyState.build(chunk_days=args.chunk_days)
+    print(f"State built through {state.last_date}")
+else:
+    if not os.path.exists(args.state):
+        parser.error(f"no state at {args.state}; run a full pipeline and then --init")
+    state = DailyState.load(args.state)
+    added = state.update()
+    if added:
+        print(f"Appended {len(added)} day(s): {added[0]} → {added[-1]}")
+    else:
+        print(f"No new days after {state.last_date}")
+state.save(args.state)
+print(f"Saved → {args.state} ({time.perf_counter() - t0:.2f}s)")
+
+if args.verify:
+    differ = full_rerun_diff(state)
+    for path in differ:
+        print(f"❌ {path} differs from a full rerun")
+    print("✅ outputs match a full rerun" if not differ else f"❌ {len(differ)} outputs differ")
+    if differ:
+        sys.exit(1)
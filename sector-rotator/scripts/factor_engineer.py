@@ -2,87 +2,76 @@
 """
 factor_engineer.py
 ------------------
-Creates factor snapshot for each stock:
+Creates the point-in-time factor panel (every date × stock) and the
+factor snapshot for each stock:
   • 3mo & 6mo momentum
   • ATR% (volatility)
   • 30-day log return stdev
   • RSI-14
   • 52-week breakout flag
-  • trailing PE from pe_ratios.csv
+  • trailing PE — as of each date from pe_history.csv where it has
+    rows, else the current value from pe_ratios.csv
+  • P/B, P/S, EV/EBITDA, dividend yield from fundamentals.csv
+    (when pull_fund_data.py has written it; snapshot only)
 
 Outputs:
-  → data/factors/factor_snapshot.csv
+  → data/factors/panel/          one mmap-able .npy per factor (selection/factors.py)
+  → data/factors/factor_snapshot.csv   the panel on the last date (or --as-of)
+
+    python scripts/factor_engineer.py
+    python scripts/factor_engineer.py --as-of 2021-06-30    # snapshot as it was that day
+    python scripts/factor_engineer.py --memory-mb 512 --float32   # out of core (store/chunks.py)
 """
 
-import os
-import glob
-import numpy as np
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import time
+
 import pandas as pd
-import pandas_ta as ta
-from config import RAW_DIR, META_DIR
+from config import META_DIR
+from store.prices import load_panel
+from selection.factors import BATCH, PANEL_DIR, MIN_BARS, build_factor_panel, factor_snapshot
 
 SNAP_DIR = "data/factors"
 SNAP_FILE = f"{SNAP_DIR}/factor_snapshot.csv"
 PE_FILE = f"{META_DIR}/pe_ratios.csv"
+PE_HISTORY = f"{META_DIR}/pe_history.csv"
+FUND_FILE = f"{META_DIR}/fundamentals.csv"
+
+parser = argparse.ArgumentParser(description="Point-in-time factor panel + snapshot")
+parser.add_argument("--as-of", help="snapshot date (default: the last date in the price store)")
+parser.add_argument("--batch", type=int, default=BATCH, help="symbols computed together")
+parser.add_argument("--memory-mb", type=float, default=None,
+                    help="working-set budget; splits histories into time blocks when needed")
+parser.add_argument("--float32", action="store_true", help="compute and store the panel in float32")
+parser.add_argument("--out", default=PANEL_DIR)
+args = parser.parse_args()
 
 os.makedirs(SNAP_DIR, exist_ok=True)
 
-# Read PE data
+# Read PE data (and the wider fundamentals when pull_fund_data.py wrote them)
 pe_df = pd.read_csv(PE_FILE).set_index("symbol")
+pe_history = pd.read_csv(PE_HISTORY) if os.path.exists(PE_HISTORY) else None
+fund_df = pd.read_csv(FUND_FILE).set_index("symbol") if os.path.exists(FUND_FILE) else None
 
-rows = []
-for fpath in glob.glob(f"{RAW_DIR}/*.csv"):
-    sym = os.path.basename(fpath).replace("_", ".").replace(".csv", "")
-    df = pd.read_csv(fpath)
-
-    if "date" not in df.columns or "close" not in df.columns:
-        print(f"⚠️  Skipping {sym} (missing columns)")
-        continue
-
-    df = df.sort_values("date")
-
-    # --- Ensure numeric dtypes ---
-    for col in ["open", "high", "low", "close", "adj close", "volume"]:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-
-    df = df.dropna(subset=["close", "high", "low"])
-    if len(df) < 260:  # ~1 year of trading days
-        print(f"⚠️  Skipping {sym} (not enough data)")
-        continue
-
-    df["ret"] = df["close"].pct_change()
-    df["logret"] = np.log(df["close"]).diff()
-
-    try:
-        mom3 = df["close"].pct_change(63).iloc[-1]
-        mom6 = df["close"].pct_change(126).iloc[-1]
-        atr_pct = (
-            ta.atr(df["high"], df["low"], df["close"], 20).iloc[-1]
-            / df["close"].iloc[-1]
-        )
-        vol30 = df["logret"].rolling(30).std().iloc[-1]
-        rsi14 = ta.rsi(df["close"], 14).iloc[-1]
-        breakout = int(df["close"].iloc[-1] > df["close"].rolling(252).max().iloc[-2])
-    except Exception as e:
-        print(f"❌ {sym} failed factor calc: {e}")
-        continue
-
-    pe = pe_df.at[sym, "pe"] if sym in pe_df.index else np.nan
+t0 = time.perf_counter()
+panel = load_panel()
+fp = build_factor_panel(panel, pe_df["pe"], pe_history, out_dir=args.out, batch=args.batch,
+                        memory_mb=args.memory_mb, dtype="float32" if args.float32 else "float64")
+print(f"✅  factor panel {len(fp.dates)} dates × {len(fp.symbols)} symbols → {args.out} "
+      f"({time.perf_counter() - t0:.2f}s)")
 
-    rows.append(
-        {
-            "symbol": sym,
-            "mom3": mom3,
-            "mom6": mom6,
-            "atr_pct": atr_pct,
-            "vol30": vol30,
-            "rsi14": rsi14,
-            "breakout": breakout,
-            "pe": pe,
-        }
-    )
+if args.as_of:
+    factors = fp.as_of(args.as_of)
+    skipped = sorted(set(fp.symbols) - set(factors["symbol"]))
+    print(f"   {len(skipped)} symbols with < {MIN_BARS} bars on {args.as_of}")
+    if fund_df is not None:
+        print("⚠  --as-of snapshot leaves out the undated valuation fields")
+else:
+    factors = factor_snapshot(panel, pe_df["pe"], fund_df, factor_panel=fp)
 
 # Save results
-pd.DataFrame(rows).to_csv(SNAP_FILE, index=False)
+factors.to_csv(SNAP_FILE, index=False)
 print(f"\n✅  factor snapshot → {SNAP_FILE}")
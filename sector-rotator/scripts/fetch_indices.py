@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+fetch_indices.py
+----------------
+Refresh the local index cache (store/indices.py): the sector indices and
+the Nifty 50 benchmark, one OHLCV CSV each under data/indices/. This is
+the only step that downloads them; everything that reads an index works
+offline from the cache.
+
+    python scripts/fetch_indices.py                                  # yfinance
+    python scripts/fetch_indices.py --source http --url http://127.0.0.1:8765
+    python scripts/fetch_indices.py --symbols ^NSEI --end 2025-04-01
+"""
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import asyncio
+import time
+
+from store.indices import INDEX_DIR, START_DATE, fetch_indices, index_symbols
+from store.sources import SOURCES, make_source
+
+parser = argparse.ArgumentParser(description="Refresh data/indices from a price source")
+parser.add_argument("--source", choices=sorted(SOURCES), default="yfinance")
+parser.add_argument("--url", default="http://127.0.0.1:8765", help="base URL for --source http")
+parser.add_argument("--symbols", nargs="*", default=None, help=f"default: {' '.join(index_symbols())}")
+parser.add_argument("--start", default=START_DATE)
+parser.add_argument("--end", default=None, help="last date to fetch (default: today)")
+parser.add_argument("--retries", type=int, default=3)
+args = parser.parse_args()
+
+source = make_source(args.source, **({"base_url": args.url} if args.source == "http" else {}))
+t0 = time.perf_counter()
+results = asyncio.run(fetch_indices(source, args.symbols, args.start, args.end, retries=args.retries))
+
+for r in results:
+    if r.status == "failed":
+        print(f"⚠  {r.symbol}: {r.error}")
+    elif r.status == "missing":
+        print(f"⚠  No data for {r.symbol}, skipping.")
+    elif r.status != "current":
+        print(f"↓  {r.symbol:<10} {r.status:<8} {r.rows:,} rows")
+print(f"\n✅  {len(results)} indices in {time.perf_counter() - t0:.2f}s → {INDEX_DIR}/")
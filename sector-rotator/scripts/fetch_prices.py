@@ -4,47 +4,65 @@ fetch_prices.py
 ---------------
 Download daily OHLCV for every symbol listed in metadata/*_universe.csv
 and store one CSV per symbol under data/raw/.
+
+Existing CSVs are brought up to date with only the missing bars
+(store/fetch.py); new symbols are pulled from START_DATE.
+
+    python scripts/fetch_prices.py                                   # yfinance
+    python scripts/fetch_prices.py --source http --url http://127.0.0.1:8765
+    python scripts/fetch_prices.py --concurrency 32 --end 2025-04-17
 """
 
-import os
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+
 import pandas as pd
-import yfinance as yf
 
 # ---- import project‑wide settings -----------------------------------------
 from config import START_DATE, RAW_DIR, UNIVERSE_FILES
-# (If you kept the file name as config.py instead of settings.py,
-#  just change the import above back to `from config import …`)
+from store.fetch import refresh
+from store.sources import SOURCES, make_source
 
-# ---------------------------------------------------------------------------
-os.makedirs(RAW_DIR, exist_ok=True)
+parser = argparse.ArgumentParser(description="Refresh data/raw from a price source")
+parser.add_argument("--source", choices=sorted(SOURCES), default="yfinance")
+parser.add_argument("--url", default="http://127.0.0.1:8765", help="base URL for --source http")
+parser.add_argument("--symbols", nargs="*", default=None, help="default: every universe file")
+parser.add_argument("--end", default=None, help="last date to fetch (default: today)")
+parser.add_argument("--concurrency", type=int, default=8, help="requests in flight")
+parser.add_argument("--retries", type=int, default=3)
+parser.add_argument("--backoff", type=float, default=0.5, help="first retry delay in seconds, doubled each time")
+args = parser.parse_args()
 
 # 1) build the master symbol list from the three universe files
-universe = []
-for csv_file in UNIVERSE_FILES.values():
-    df = pd.read_csv(csv_file)
-    universe.extend(df["symbol"].tolist())
-
-# 2) download each symbol (skip if CSV already exists)
-for sym in sorted(set(universe)):
-    out_path = f"{RAW_DIR}/{sym.replace('.', '_')}.csv"
-    if os.path.exists(out_path):
-        print(f"✔  {sym} already downloaded")
-        continue
-
-    print(f"↓  {sym}")
-    df = yf.download(sym, start=START_DATE, auto_adjust=True, progress=False)
-    if df.empty:
-        print(f"⚠  No data for {sym}, skipping.")
-        continue
-
-    # yfinance returns a DatetimeIndex; move it to a column called 'date'
-    df = df.rename(columns=str.lower)               # open, high, low, close…
-    df = (
-        df.reset_index()                            # 'Date' -> column
-          .rename(columns={"index": "date", "Date": "date"})
-    )
-
-    df.to_csv(out_path, index=False)
-    print(f"   saved {len(df):,} rows  →  {out_path}")
-
-print("\n✅  All downloads finished.")
+universe = args.symbols
+if not universe:
+    universe = []
+    for csv_file in UNIVERSE_FILES.values():
+        df = pd.read_csv(csv_file)
+        universe.extend(df["symbol"].tolist())
+universe = sorted(set(universe))
+
+# 2) fetch only what each CSV is missing
+source = make_source(args.source, **({"base_url": args.url} if args.source == "http" else {}))
+t0 = time.perf_counter()
+results = asyncio.run(refresh(universe, source, RAW_DIR, START_DATE, args.end,
+                              concurrency=args.concurrency, retries=args.retries, backoff=args.backoff))
+elapsed = time.perf_counter() - t0
+
+for r in results:
+    if r.status == "failed":
+        print(f"⚠  {r.symbol}: {r.error}")
+    elif r.status == "missing":
+        print(f"⚠  No data for {r.symbol}, skipping.")
+    elif r.status != "current":
+        print(f"↓  {r.symbol:<14} {r.status:<8} {r.rows:,} rows")
+
+counts = Counter(r.status for r in results)
+requests = sum(r.requests for r in results)
+print(f"\n✅  {len(results)} symbols in {elapsed:.2f}s ({requests} requests): "
+      + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+ingest_prices.py
+----------------
+One-time normalization of data/raw/*.csv into the columnar price store
+(data/store/prices/). Every later stage loads aligned arrays from there
+via store.prices.load_panel() instead of re-parsing the CSVs.
+Re-run after fetch_prices.py; load_panel() also re-ingests on its own
+when it notices the raw files changed.
+
+    python scripts/ingest_prices.py
+    python scripts/ingest_prices.py --stream --float32     # universes larger than memory
+"""
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import time
+from store.prices import ingest, RAW_DIR, STORE_DIR
+
+parser = argparse.ArgumentParser(description="Build the columnar price store from data/raw")
+parser.add_argument("--stream", action="store_true", help="hold one CSV at a time (parses each file twice)")
+parser.add_argument("--float32", action="store_true", help="store float32 blocks (half the size)")
+args = parser.parse_args()
+
+t0 = time.perf_counter()
+meta = ingest(RAW_DIR, STORE_DIR, "float32" if args.float32 else "float64", args.stream)
+print(f"✅  {len(meta['symbols'])} symbols → {STORE_DIR} ({time.perf_counter() - t0:.2f}s)")
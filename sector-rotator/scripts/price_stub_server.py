@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+price_stub_server.py
+--------------------
+Local stand-in for a price / fundamentals vendor: replays data/raw-style
+CSVs and a fundamentals JSON over HTTP in the formats store.sources and
+store.fundamentals read, so fetch_prices.py and pull_fund_data.py can be
+run and timed offline. Rows are served exactly as the files have them.
+
+    python scripts/price_stub_server.py --raw-dir /path/to/full/raw --port 8765
+    python scripts/price_stub_server.py --latency-ms 50 --fail-rate 0.1   # slow, flaky vendor
+
+GET /prices/<SYMBOL>?start=YYYY-MM-DD&end=YYYY-MM-DD → CSV of bars in
+[start, end]; GET /fundamentals/<SYMBOL> → {"pe": ..., ...} from
+--fundamentals ({symbol: {field: value}}, or {symbol: pe} like
+metadata/pe_ratios.json). 404 for unknown symbols, 503 for injected
+failures.
+"""
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from store.prices import RAW_DIR, symbol_file
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024   # the default 5 stalls concurrent clients on SYN retries
+
+
+FUND_FILE = "metadata/pe_ratios.json"
+
+
+def make_server(raw_dir: str = RAW_DIR, port: int = 8765, latency: float = 0.0,
+                fail_rate: float = 0.0, end: str = None, fund_file: str = FUND_FILE) -> ThreadingHTTPServer:
+    files, lock = {}, threading.Lock()
+    fundamentals = {}
+    if fund_file and os.path.exists(fund_file):
+        with open(fund_file) as f:
+            fundamentals = {sym: v if isinstance(v, dict) else {"pe": v} for sym, v in json.load(f).items()}
+
+    def rows(symbol):
+        # (header, [(date, line)]) with every line kept as the file has it
+        with lock:
+            if symbol not in files:
+                path = symbol_file(symbol, raw_dir)
+                if not os.path.exists(path):
+                    files[symbol] = None
+                else:
+                    with open(path) as f:
+                        header, *lines = f.read().splitlines()
+                    dated = [(ln[:10], ln) for ln in lines if ln[:1].isdigit()]
+                    files[symbol] = (header, [(d, ln) for d, ln in dated if not end or d <= end])
+            return files[symbol]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            parts = url.path.strip("/").split("/")
+            if latency:
+                time.sleep(latency)
+            if random.random() < fail_rate:
+                return self._reply(503, b"injected failure\n")
+            if len(parts) == 2 and parts[0] == "fundamentals":
+                if parts[1] not in fundamentals:
+                    return self._reply(404, b"unknown symbol\n", "text/plain")
+                return self._reply(200, json.dumps(fundamentals[parts[1]]).encode(), "application/json")
+            found = rows(parts[1]) if len(parts) == 2 and parts[0] == "prices" else None
+            if found is None:
+                return self._reply(404, b"unknown symbol\n")
+            header, dated = found
+            lo, hi = query.get("start", ""), query.get("end", "9999")
+            body = [header] + [ln for d, ln in dated if lo <= d <= hi]
+            self._reply(200, ("\n".join(body) + "\n").encode())
+
+        def _reply(self, status, body, content_type="text/csv"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return _Server(("127.0.0.1", port), Handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline HTTP price / fundamentals source")
+    parser.add_argument("--raw-dir", default=RAW_DIR)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--end", default=None, help="serve bars up to this date only")
+    parser.add_argument("--fundamentals", default=FUND_FILE, help="JSON served under /fundamentals/")
+    args = parser.parse_args()
+
+    server = make_server(args.raw_dir, args.port, args.latency_ms / 1000, args.fail_rate, args.end,
+                         args.fundamentals)
+    print(f"Serving {args.raw_dir} on http://127.0.0.1:{args.port}/prices/<symbol>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
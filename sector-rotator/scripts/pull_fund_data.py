@@ -2,44 +2,77 @@
 """
 pull_fund_data.py
 -----------------
-Fetch trailing P/E for every symbol in the three universe CSVs.
-Uses yahoo_fin; falls back to NSE's nsetools if Yahoo is missing the metric.
-Outputs: metadata/pe_ratios.csv
+Fetch fundamentals (trailing P/E plus valuation / quality fields) for every
+symbol in the three universe CSVs via store/fundamentals.py.
+Sources are tried in order (default: Yahoo's Ticker.info, then NSE's
+nsetools quote for a missing P/E), each under its own rate limit. Values
+are cached in data/store/fundamentals.json with per-field TTLs, so a
+re-run only asks for what has expired.
+Outputs: metadata/pe_ratios.csv (symbol, pe)
+         metadata/fundamentals.csv (symbol + every field)
+         metadata/pe_history.csv (symbol, date, pe — a row whenever a P/E
+         changes, for the point-in-time factor panel)
+
+    python scripts/pull_fund_data.py
+    python scripts/pull_fund_data.py --sources http --url http://127.0.0.1:8765
+    python scripts/pull_fund_data.py --refresh            # ignore the cache
 """
 
-import os, csv, json, time
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import asyncio
+import time
+
 import pandas as pd
-from yahoo_fin import stock_info as yfi
-from nsetools import Nse
 from config import META_DIR, UNIVERSE_FILES
-import yfinance as yf
+from store.fundamentals import (CACHE_FILE, FIELDS, SOURCES, FundamentalsCache, append_history,
+                                fetch_fundamentals, write_if_changed)
+
+parser = argparse.ArgumentParser(description="Cached, rate-limited fundamentals fetch")
+parser.add_argument("--sources", default="yahoo,nse", help=f"comma-separated, tried in order ({', '.join(SOURCES)})")
+parser.add_argument("--url", default="http://127.0.0.1:8765", help="base URL for the http source")
+parser.add_argument("--fields", default=",".join(FIELDS))
+parser.add_argument("--concurrency", type=int, default=8, help="symbols in flight")
+parser.add_argument("--cache", default=CACHE_FILE)
+parser.add_argument("--refresh", action="store_true", help="re-fetch every field regardless of age")
+args = parser.parse_args()
 
 out_path = f"{META_DIR}/pe_ratios.csv"
+fund_path = f"{META_DIR}/fundamentals.csv"
+history_path = f"{META_DIR}/pe_history.csv"
 os.makedirs(META_DIR, exist_ok=True)
-nse = Nse()
 
 # ── build symbol list ─────────────────────────────────────────────
 symbols = []
 for csv_file in UNIVERSE_FILES.values():
     symbols.extend(pd.read_csv(csv_file)["symbol"])
+symbols = sorted(set(symbols))
+
+fields = [f.strip() for f in args.fields.split(",") if f.strip()]
+if "pe" not in fields:
+    fields.insert(0, "pe")
+sources = [SOURCES[name](base_url=args.url) if name == "http" else SOURCES[name]()
+           for name in (s.strip() for s in args.sources.split(","))]
+
+cache = FundamentalsCache(args.cache)
+if args.refresh:
+    cache.entries = {}
+errors = []
+t0 = time.perf_counter()
+df = asyncio.run(fetch_fundamentals(symbols, sources, fields, cache,
+                                    concurrency=args.concurrency, errors=errors))
+cache.save()
+
+for sym, source, msg in errors:
+    print(f"⚠  {sym} via {source}: {msg}")
+for sym, pe in df["pe"].items():
+    print(f"{sym:<12}  PE = {None if pd.isna(pe) else pe}")
 
-records = []
-for sym in sorted(set(symbols)):
-    pe = None
-    try:                                            # 1️⃣ Yahoo Finance
-       pe = yf.Ticker(sym).info.get("trailingPE")
-    except Exception:
-        pass
-
-    if pe in (None, "N/A"):
-        try:                                        # 2️⃣ NSE fallback
-            pe = float(nse.get_quote(sym.split(".")[0])["pe"])
-        except Exception:
-            pe = None
-
-    records.append({"symbol": sym, "pe": pe})
-    print(f"{sym:<12}  PE = {pe}")
-    time.sleep(0.3)        # polite delay (Yahoo free tier)
-
-pd.DataFrame(records).to_csv(out_path, index=False)
-print(f"\n✅  saved PE ratios → {out_path}")
+changed = [p for frame, p in ((df[["pe"]], out_path), (df, fund_path)) if write_if_changed(frame, p)]
+if append_history(df, history_path):
+    changed.append(history_path)
+requests = ", ".join(f"{s.name}: {s.requests}" for s in sources)
+print(f"\n✅  {len(symbols)} symbols in {time.perf_counter() - t0:.2f}s (requests — {requests})")
+print(f"   saved → {', '.join(changed)}" if changed else "   outputs unchanged")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+query_results.py
+----------------
+Queries the results store (store/results.py) that run_backtest, run_sweep,
+run_book and analyze_backtests record into: best runs by a metric with
+parameter filters, one run's details, or its equity curve.
+
+    python scripts/query_results.py --by sharpe --top 50 --where k=0.1:0.2
+    python scripts/query_results.py --by max_drawdown --kind sweep --where lookback=30 --where TECH.lower=:25
+    python scripts/query_results.py --show 12 --curve data/backtest/run_12.csv
+"""
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+
+import pandas as pd
+from store.results import RESULTS_DB, ResultStore
+
+
+def parse_where(text: str):
+    """NAME=V (equal), NAME=LO:HI (inclusive, either side may be empty) → (name, condition)."""
+    name, _, value = text.partition("=")
+    if ":" in value:
+        lo, _, hi = value.partition(":")
+        return name, (float(lo) if lo else None, float(hi) if hi else None)
+    try:
+        return name, float(value)
+    except ValueError:
+        return name, value
+
+
+parser = argparse.ArgumentParser(description="Query recorded backtest runs")
+parser.add_argument("--db", default=RESULTS_DB)
+parser.add_argument("--by", default="sharpe", help="metric to rank by")
+parser.add_argument("--top", type=int, default=20)
+parser.add_argument("--ascending", action="store_true", help="lowest first")
+parser.add_argument("--where", action="append", default=[], metavar="NAME=V|LO:HI", help="parameter filter")
+parser.add_argument("--kind", help="backtest, sweep, book or analyze")
+parser.add_argument("--show", type=int, metavar="RUN_ID", help="print one run instead of a ranking")
+parser.add_argument("--curve", metavar="CSV", help="with --show, write the run's equity curve here")
+parser.add_argument("--out", metavar="CSV", help="write the ranking here")
+args = parser.parse_args()
+
+if not os.path.exists(args.db):
+    sys.exit(f"no results store at {args.db}; run a backtest or sweep first")
+
+pd.set_option("display.width", 200)
+with ResultStore(args.db) as store:
+    if args.show is not None:
+        run = store.runs([args.show]).iloc[0]
+        print(run.dropna().to_string())
+        if args.curve:
+            store.equity(args.show).to_frame().to_csv(args.curve)
+            print(f"Saved → {args.curve}")
+    else:
+        where = dict(parse_where(w) for w in args.where)
+        table = store.top(args.by, args.top, where=where, kind=args.kind, ascending=args.ascending)
+        if table.empty:
+            print("No matching runs.")
+        else:
+            # ranked metric first, then parameters / metrics that vary across the ranking
+            varying = [c for c in table.columns if len(table) == 1 or table[c].astype(str).nunique() > 1]
+            cols = ["kind", args.by] + [c for c in varying if c not in ("kind", args.by, "created", "fingerprint")]
+            print(table[cols].to_string())
+            if args.out:
+                table.to_csv(args.out)
+                print(f"Saved → {args.out}")
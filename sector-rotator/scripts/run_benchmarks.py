@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+run_benchmarks.py
+-----------------
+Times every stage on seeded synthetic markets (bench/suite.py), with
+peak memory and a golden check of each fast path against the original
+per-symbol / per-day implementation.
+
+    python scripts/run_benchmarks.py                                  # 30 symbols × 1, 5 years
+    python scripts/run_benchmarks.py --symbols 30,500,5000 --years 1,10,30 --stages ingest,factors
+    python scripts/run_benchmarks.py --save data/bench/baseline.json
+    python scripts/run_benchmarks.py --baseline data/bench/baseline.json --max-slowdown 1.3
+
+Markets are generated once under data/bench/ and reused. Exits non-zero
+when a golden check fails or, with --baseline, a stage got slower than
+--max-slowdown × its baseline time.
+"""
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import json
+
+from bench.suite import STAGES, compare, run_config
+from bench.synth import BENCH_DIR
+
+parser = argparse.ArgumentParser(description="Stage benchmarks on synthetic OHLCV")
+parser.add_argument("--symbols", default="30", help="comma-separated universe sizes")
+parser.add_argument("--years", default="1,5", help="comma-separated history lengths")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--stages", default=",".join(STAGES))
+parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (best is kept)")
+parser.add_argument("--no-memory", action="store_true", help="skip the traced peak-memory run")
+parser.add_argument("--no-golden", action="store_true", help="skip the reference comparisons")
+parser.add_argument("--root", default=BENCH_DIR, help="where synthetic markets are kept")
+parser.add_argument("--save", default=None, help="write results JSON here")
+parser.add_argument("--baseline", default=None, help="results JSON to compare timings against")
+parser.add_argument("--max-slowdown", type=float, default=1.5)
+args = parser.parse_args()
+
+stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+unknown = [s for s in stages if s not in STAGES]
+if unknown:
+    parser.error(f"unknown stages {unknown} (have: {', '.join(STAGES)})")
+
+print(f"  {'config':<12} {'stage':<14} {'seconds':>10} {'peak':>12}  golden")
+results = []
+for n in (int(x) for x in args.symbols.split(",")):
+    for years in (float(x) for x in args.years.split(",")):
+        results += run_config(n, years, args.seed, stages, args.repeat, not args.no_memory,
+                              not args.no_golden, args.root)
+
+problems = [f"{r.config} {r.stage}: golden check failed ({r.detail})" for r in results if r.golden == "FAIL"]
+if args.baseline:
+    with open(args.baseline) as f:
+        problems += compare(results, json.load(f), args.max_slowdown)
+if args.save:
+    os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+    with open(args.save, "w") as f:
+        json.dump([r.row() for r in results], f, indent=1)
+    print(f"\nResults → {args.save}")
+
+for msg in problems:
+    print(f"⚠  {msg}")
+print(f"\n{'⚠ ' if problems else '✅'}  {len(results)} stage runs, {len(problems)} problems")
+sys.exit(1 if problems else 0)
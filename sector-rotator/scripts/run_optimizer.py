@@ -3,20 +3,30 @@
 import sys, os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import argparse
 import pandas as pd
-from optimizer.rule_based import generate_allocations
+from optimizer.rule_based import generate_allocations, cap_and_normalize
+from optimizer.parallel import CHUNK_DAYS
+from profiling import trace
 
-# Get raw weights from signal flags
-weights = generate_allocations()  # DataFrame of shape (T, sectors), values in {-1, 0, +1}
+parser = argparse.ArgumentParser(description="Rule-based sector allocations")
+parser.add_argument("--method", default="mvo", choices=["mvo", "hrp", "ivp", "erc"],
+                    help="mvo (rule-based QP) or a solver-free allocator (optimizer/risk_parity.py)")
+parser.add_argument("--workers", type=int, default=1, help="processes to shard days over (0 = all cores)")
+parser.add_argument("--chunk-days", type=int, default=CHUNK_DAYS, help="days per shard")
+trace.add_arguments(parser)
+args = parser.parse_args()
+trace.start(args)
 
-# Apply weight cap if desired (e.g., max 50% in any one sector)
-weights = weights.clip(upper=0.5, lower=-0.5)
+# Get raw weights from signal flags
+weights = generate_allocations(workers=args.workers, chunk_days=args.chunk_days, allocator=args.method)  # DataFrame of shape (T, sectors), values in {-1, 0, +1}
 
-# Normalize: sum of absolute weights = 1 (gross leverage control)
-abs_sum = weights.abs().sum(axis=1).replace(0, 1)  # avoid divide-by-zero
-weights = weights.div(abs_sum, axis=0)
+# Apply weight cap (max 50% in any one sector), then normalize so the
+# sum of absolute weights = 1 (gross leverage control)
+weights = cap_and_normalize(weights)
 
 # Save to file
 weights.to_csv("data/weights/allocations.csv", index=False)
 
 print("Saved → data/weights/allocations.csv")
+trace.finish(args)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+run_pipeline.py
+---------------
+Runs the whole chain (pipeline/stages.py) and skips every stage whose
+code, params, inputs and upstream outputs are unchanged since the last
+run (pipeline/dag.py; state in data/store/pipeline.json).
+
+    python scripts/run_pipeline.py                          # everything that is out of date
+    python scripts/run_pipeline.py --set backtest.k=0.1     # re-runs backtest, report, analyze
+    python scripts/run_pipeline.py --set flags.TECH.lower=25 allocate
+    python scripts/run_pipeline.py --fetch                  # download prices / fundamentals first
+    python scripts/run_pipeline.py --dry-run
+    python scripts/run_pipeline.py --force select           # --force alone re-runs everything
+    python scripts/run_pipeline.py --force --trace data/store/trace.json   # + Chrome trace
+
+Positional arguments name target stages; only they and what they need
+are considered. Params set here are not remembered: the next run without
+--set goes back to the defaults (and re-runs what they affect).
+"""
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import time
+
+from pipeline.dag import STATE_FILE, Pipeline
+from pipeline.stages import build_stages
+from profiling import trace
+
+
+def parse_value(text: str):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return None if text in ("", "None") else text
+
+
+parser = argparse.ArgumentParser(description="Incremental pipeline runner")
+parser.add_argument("targets", nargs="*", help="stages to bring up to date (default: all)")
+parser.add_argument("--set", action="append", default=[], metavar="STAGE.PARAM=VALUE",
+                    help="override one stage param, e.g. backtest.k=0.1 or flags.TECH.lower=25")
+parser.add_argument("--force", nargs="*", default=None, metavar="STAGE",
+                    help="re-run these stages even if unchanged (no names: all)")
+parser.add_argument("--fetch", action="store_true", help="add the price and fundamentals downloads")
+parser.add_argument("--workers", type=int, default=4, help="stages run at once")
+parser.add_argument("--dry-run", action="store_true", help="show what would run")
+parser.add_argument("--state", default=STATE_FILE)
+trace.add_arguments(parser)
+args = parser.parse_args()
+trace.start(args)
+
+dag = Pipeline(build_stages(fetch_data=args.fetch), state_file=args.state)
+
+params = {}
+for item in args.set:
+    key, sep, value = item.partition("=")
+    stage, _, name = key.rpartition(".")
+    if not sep or not stage:
+        parser.error(f"expected STAGE.PARAM=VALUE, got {item!r}")
+    params.setdefault(stage, {})[name] = parse_value(value)
+
+force = True if args.force == [] else (args.force or ())
+try:
+    if args.dry_run:
+        for res in dag.plan(params, args.targets, force):
+            print(f"  {res.name:<14} {res.status:<10} {res.reason}".rstrip())
+        sys.exit(0)
+    t0 = time.perf_counter()
+    results = dag.run(params, args.targets, force, workers=args.workers)
+except ValueError as exc:
+    parser.error(str(exc))
+
+ran = [r.name for r in results if r.status == "ran"]
+bad = [r.name for r in results if r.status in ("failed", "blocked")]
+print(f"\n{'⚠ ' if bad else '✅'}  {len(ran)} ran, {len(results) - len(ran) - len(bad)} skipped"
+      + (f", {len(bad)} failed / blocked" if bad else "") + f" ({time.perf_counter() - t0:.2f}s)")
+if "analyze" in dag._values:
+    summary = dag._values["analyze"]
+    print(f"   CAGR {summary['cagr'] * 100:.2f}%  Sharpe {summary['sharpe']:.2f}  "
+          f"MaxDD {summary['max_drawdown'] * 100:.2f}%  → data/backtest/summary.csv")
+trace.finish(args)
+sys.exit(1 if bad else 0)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+run_sweep.py
+------------
+Backtests a whole parameter grid in one batched run (backtest/sweep.py)
+and writes a tidy metrics table, one row per grid point.
+
+    python scripts/run_sweep.py --set k=0.1,0.125,0.15 --set lookback=20,30 \\
+                                --set TECH.lower=20,25,30 --set FMCG.band=2,2.5,3
+    python scripts/run_sweep.py --set allocator=mvo,hrp,erc --set mvo_lookback=30,60
+
+Unset keys keep the pipeline's defaults (backtest.sweep.DEFAULT_GRID).
+Every grid point is also recorded in the results store (store/results.py,
+batched) for later queries with scripts/query_results.py.
+"""
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import time
+from backtest.sweep import run_sweep, validate_grid, DEFAULT_GRID, META_FILE, METRICS
+from store.prices import STORE_DIR
+from store.results import RESULTS_DB, ResultStore
+
+OUT_FILE = "data/backtest/sweep_metrics.csv"
+
+
+def parse_value(text: str):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+parser = argparse.ArgumentParser(description="Batched parameter-sweep backtest")
+parser.add_argument("--set", action="append", default=[], metavar="KEY=V1,V2,...",
+                    help=f"grid values for one key ({', '.join(DEFAULT_GRID)}, or SECTOR.param)")
+parser.add_argument("--memory-mb", type=float, default=512, help="working-set budget per chunk of grid points")
+parser.add_argument("--out", default=OUT_FILE)
+parser.add_argument("--top", type=int, default=10, help="rows to print, best Sharpe first")
+parser.add_argument("--label", help="free-text label stored with every grid point")
+parser.add_argument("--db", default=RESULTS_DB, help="results store")
+parser.add_argument("--no-store", action="store_true", help="do not record the grid points")
+args = parser.parse_args()
+
+grid = {}
+for item in args.set:
+    key, _, values = item.partition("=")
+    grid[key] = [parse_value(v) for v in values.split(",")]
+try:
+    validate_grid(grid)
+except ValueError as e:
+    parser.error(str(e))
+
+t0 = time.perf_counter()
+table = run_sweep(grid, memory_mb=args.memory_mb)
+elapsed = time.perf_counter() - t0
+
+os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+table.to_csv(args.out, index=False)
+print(table.sort_values("sharpe", ascending=False).head(args.top).to_string(index=False))
+print(f"\n✅  {len(table)} grid points → {args.out} ({elapsed:.2f}s)")
+
+if not args.no_store:
+    t0 = time.perf_counter()
+    names = [c for c in table.columns if c not in METRICS]
+    params = table[names].to_dict("records")
+    metrics = table[METRICS].to_dict("records")
+    with ResultStore(args.db) as store:
+        ids = store.log_runs(zip(params, metrics), kind="sweep", label=args.label,
+                             inputs=[META_FILE, f"{STORE_DIR}/meta.json"])
+    print(f"✅  Runs {ids[0]}–{ids[-1]} → {args.db} ({time.perf_counter() - t0:.2f}s)")
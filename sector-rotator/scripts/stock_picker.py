@@ -6,102 +6,45 @@ Algorithmic stock selection per sector using:
 - Momentum, volatility, valuation, technical strength
 - Optional clustering-based filtering (KMeans)
 - Z-score based scoring with safe fallbacks
+(selection/picker.py)
 Outputs:
   → metadata/selected_current.yaml
+  → metadata/selection_history.csv   with --walk-forward: the pick at every
+                                      rebalance date, from the factor panel
+                                      (selection/walkforward.py)
+
+    python scripts/stock_picker.py
+    python scripts/stock_picker.py --walk-forward M          # month-end rebalances
+    python scripts/stock_picker.py --walk-forward D --method warm   # faster, ~60% of picks agree
 """
 
-import os
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import time
+
 import pandas as pd
 import yaml
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from scipy.stats import zscore
 from config import META_DIR, UNIVERSE_FILES
+from selection.picker import pick_stocks, sector_map
 
 FACT_FILE = "data/factors/factor_snapshot.csv"
 OUT_FILE  = f"{META_DIR}/selected_current.yaml"
+HIST_FILE = f"{META_DIR}/selection_history.csv"
 
-# Modular factor weights (total = 1.0)
-WEIGHTS = {
-    "mom3":      0.2,
-    "mom6":      0.2,
-    "rsi14":     0.1,
-    "breakout":  0.1,
-    "pe_inv":    0.2,
-    "atr_inv":   0.1,
-    "vol30_inv": 0.1,
-}
-
-# Read data
-df = pd.read_csv(FACT_FILE)
-
-# Map sector from universe files
-sym2sector = {}
-for sector, csv_path in UNIVERSE_FILES.items():
-    tickers = pd.read_csv(csv_path)["symbol"].tolist()
-    for sym in tickers:
-        sym2sector[sym] = sector
-
-df["sector"] = df["symbol"].map(sym2sector)
-df = df.dropna(subset=["sector"])
-
-# Invert "lower is better" metrics
-df["pe_inv"]     = -df["pe"]
-df["atr_inv"]    = -df["atr_pct"]
-df["vol30_inv"]  = -df["vol30"]
-
-score_cols = list(WEIGHTS.keys())
-df = df.dropna(subset=score_cols)
-
-selected = {}
+parser = argparse.ArgumentParser(description="Per-sector stock selection")
+parser.add_argument("--walk-forward", metavar="FREQ",
+                    help="also pick at every rebalance date: D, W, M, Q or a bar count")
+parser.add_argument("--method", default="cold", choices=["cold", "warm", "exact"],
+                    help="KMeans refit per date (= pick_stocks), warm-started from the previous date "
+                         "(faster, ~60%% of picks agree), or pick_stocks per date")
+args = parser.parse_args()
 
 print("Selected stocks")
 print("-" * 24)
 
-for sector in df["sector"].unique():
-    sector_df = df[df["sector"] == sector].copy()
-
-    # Clustering (optional ML layer)
-    cluster_features = ["mom3", "mom6", "vol30", "pe"]
-    cluster_data = sector_df[cluster_features].dropna()
-
-    if len(cluster_data) >= 3:
-        scaled = StandardScaler().fit_transform(cluster_data)
-        kmeans = KMeans(n_clusters=3, random_state=42).fit(scaled)
-        sector_df.loc[cluster_data.index, "cluster"] = kmeans.labels_
-
-        # Pick best momentum cluster
-        cluster_scores = (
-            sector_df.groupby("cluster")[["mom3", "mom6"]].mean().sum(axis=1)
-        )
-        best_cluster = cluster_scores.idxmax()
-        sector_df = sector_df[sector_df["cluster"] == best_cluster].copy()
-    else:
-        print(f"Skipping clustering for {sector} — not enough data")
-
-    # Defensive: Check again
-    sector_df = sector_df.dropna(subset=score_cols)
-    if len(sector_df) < 2:
-        print(f"Skipping {sector} — not enough stocks after filtering.")
-        continue
-
-    # Z-score normalization
-   # Remove any score column with no variance (e.g., all 0s)
-    valid_cols = [col for col in score_cols if sector_df[col].nunique() > 1]
-
-    if not valid_cols:
-        print(f"No valid scoring columns in {sector}, skipping.")
-        continue
-
-    sector_df[valid_cols] = sector_df[valid_cols].apply(zscore)
-    sector_df["score"] = sum(sector_df[col] * WEIGHTS[col] for col in valid_cols)
-
-    # Final score
-    sector_df["score"] = sum(sector_df[col] * w for col, w in WEIGHTS.items())
-
-    top = sector_df.sort_values("score", ascending=False).iloc[0]
-    selected[sector] = top["symbol"]
-    print(f"{sector:<6}: {top['symbol']:<15} score={top['score']:.2f}")
+selected = pick_stocks(pd.read_csv(FACT_FILE), sector_map(UNIVERSE_FILES))
 
 # Save YAML
 os.makedirs(META_DIR, exist_ok=True)
@@ -109,3 +52,16 @@ with open(OUT_FILE, "w") as f:
     yaml.dump(selected, f)
 
 print(f"\n Saved → {OUT_FILE}")
+
+if args.walk_forward:
+    from selection.factors import load_factor_panel
+    from selection.walkforward import save_selection, walk_forward
+
+    freq = int(args.walk_forward) if args.walk_forward.isdigit() else args.walk_forward
+    t0 = time.perf_counter()
+    table = walk_forward(load_factor_panel(), sector_map(UNIVERSE_FILES), freq, method=args.method)
+    save_selection(table, HIST_FILE)
+    picks = {s: table[s].dropna() for s in table.columns}
+    switches = ", ".join(f"{s}: {max(int((p != p.shift()).sum()) - 1, 0)}" for s, p in picks.items())
+    print(f"\n✅  {len(table)} rebalance dates in {time.perf_counter() - t0:.2f}s (switches — {switches})")
+    print(f"   Saved → {HIST_FILE}")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+stream_flags.py
+---------------
+Runs the streaming sector signals over a replay of data/raw, printing
+flag changes as they happen plus throughput / latency stats.
+
+    python scripts/stream_flags.py --verify            # full replay, check vs generate_signal
+    python scripts/stream_flags.py --rate 2000         # paced at 2000 bars/s
+    python scripts/stream_flags.py --checkpoint data/live/book.json --end 2022-12-31
+    python scripts/stream_flags.py --checkpoint data/live/book.json --resume
+
+With --resume the book picks up from the checkpoint and skips bars it has
+already seen.
+"""
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import asyncio
+from importlib import import_module
+
+import yaml
+
+from live.engine import SignalBook, run
+from live.replay import ReplaySource
+from signals import SECTOR_MODULES
+from store.prices import load_panel
+
+META_FILE = "metadata/selected_current.yaml"
+
+
+def batch_changes(symbol: str, sector: str, panel) -> list:
+    """(date, flag) at every bar where generate_signal's flag moves, first bar included."""
+    df = panel.ohlcv(symbol)
+    flags = import_module(SECTOR_MODULES[sector]).generate_signal(df)
+    dates = df.loc[flags.index, "date"].values
+    out, prev = [], None
+    for date, flag in zip(dates, flags.values):
+        if flag != prev:
+            out.append((date, int(flag)))
+            prev = flag
+    return out
+
+
+parser = argparse.ArgumentParser(description="Streaming sector flags over a data/raw replay")
+parser.add_argument("--rate", type=float, default=None, help="bars per second (default: as fast as possible)")
+parser.add_argument("--end", default=None, help="stop the replay after this date")
+parser.add_argument("--checkpoint", default=None, help="JSON checkpoint written at the end (and every --checkpoint-every bars)")
+parser.add_argument("--checkpoint-every", type=int, default=0)
+parser.add_argument("--resume", action="store_true", help="restore the book from --checkpoint first")
+parser.add_argument("--verify", action="store_true", help="compare every flag change with the batch signal")
+parser.add_argument("--quiet", action="store_true", help="don't print individual flag changes")
+args = parser.parse_args()
+
+if args.resume and not (args.checkpoint and os.path.exists(args.checkpoint)):
+    parser.error("--resume needs an existing --checkpoint")
+
+with open(META_FILE) as f:
+    selected = yaml.safe_load(f)
+book = SignalBook.load(args.checkpoint) if args.resume else SignalBook(selected)
+resumed_from = dict(book.last_date)
+source = ReplaySource(list(book.signals), end=args.end, rate=args.rate)
+
+streamed = {sym: [] for sym in book.signals}
+
+
+def on_change(change):
+    streamed[change.symbol].append((change.date, change.flag))
+    if not args.quiet:
+        print(f"{change.date}  {change.sector:<5} {change.symbol:<14} {change.previous} → {change.flag}")
+
+
+stats = asyncio.run(run(source, book, on_change, checkpoint=args.checkpoint,
+                        checkpoint_every=args.checkpoint_every))
+print(f"\n{stats['bars']} bars, {stats['changes']} flag changes in {stats['seconds']:.2f}s "
+      f"({stats['bars_per_sec']:,.0f} bars/s)")
+print(f"latency p50 {stats['latency_p50_us']:.0f}µs  p99 {stats['latency_p99_us']:.0f}µs  "
+      f"max {stats['latency_max_us']:.0f}µs")
+
+if args.verify:
+    panel = load_panel()
+    mismatched = 0
+    for symbol, sector in book.sectors.items():
+        # batch flag changes inside the span this run streamed
+        lo, hi = resumed_from.get(symbol, ""), book.last_date.get(symbol, "")
+        want = [c for c in batch_changes(symbol, sector, panel) if lo < c[0] <= hi]
+        if streamed[symbol] != want:
+            mismatched += 1
+            print(f"❌ {sector} {symbol}: {len(streamed[symbol])} streamed vs {len(want)} batch flag changes")
+    print("✅ streaming flags match batch" if not mismatched else f"❌ {mismatched} symbols differ")
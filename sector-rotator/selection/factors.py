@@ -0,0 +1,252 @@
+"""
+factors.py
+----------
+Point-in-time factor panel for the whole universe, and the latest-bar
+snapshot as a slice of it (see scripts/factor_engineer.py):
+
+  mom3 / mom6     63 / 126-bar momentum
+  atr_pct         Wilder ATR(20) / close
+  vol30           30-bar stdev of log returns
+  rsi14           Wilder RSI(14)
+  breakout        close above the prior 252-bar high
+  pe              trailing P/E, as known on each date
+  pb, ps, ev_ebitda, div_yield   when fundamentals are available (snapshot only)
+
+Every factor is computed for every (date, symbol) in one pass over the
+packed bar arrays (signals.lib), then put back on the price calendar.
+Panels are stored like the price store — one column-major float64 .npy
+per factor under data/factors/panel/, opened with mmap — so a date range
+or a symbol subset only pages in what it touches:
+
+    fp = build_factor_panel(load_panel(), pe, out_dir=PANEL_DIR)
+    fp = load_factor_panel(start="2020-01-01", symbols=["INFY.NS", "TCS.NS"])
+    snap = fp.as_of("2021-06-30")           # what factor_snapshot gave that day
+
+With memory_mb the panel is built out of core (store/chunks.py): symbol
+blocks, and time blocks carrying WARMUP bars, sized to the budget, with
+dtype="float32" optional — for universes whose price store does not fit
+in memory.
+
+P/E is point-in-time where a dated history exists (symbol, date, pe rows,
+see store.fundamentals.append_history): each date sees the last value
+observed on or before it. Symbols / dates before their first observation
+fall back to the undated P/E, which looks ahead of its fetch date.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from signals import lib
+from store.chunks import DTYPES, plan, run_blocks
+
+MIN_BARS = 260      # ~1 year of trading days
+FACTORS = ["mom3", "mom6", "atr_pct", "vol30", "rsi14", "breakout"]
+VALUATION = ["pb", "ps", "ev_ebitda", "div_yield"]
+PANEL_DIR = "data/factors/panel"
+BATCH = 512         # symbols computed together
+WARMUP = 640        # bars carried between time blocks: the 253-bar breakout
+                    # window, and Wilder ATR(20) forgets its start (0.95 ** 640 ≈ 6e-15)
+CELL_BYTES = {"float64": 240, "float32": 160}   # peak bytes per block cell while _factors runs
+
+
+# ── computation ───────────────────────────────────────────────────
+def _factors(close, high, low, offset=0) -> dict:
+    """
+    Every factor on packed (bars × symbols) arrays; row k uses bars up to k.
+    `offset` is each column's bar count before row 0.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logret = np.log(close / lib.shift(close))
+        bars = np.arange(1, len(close) + 1)[:, None] - np.isnan(close).sum(axis=0)[None, :] + offset
+        return {
+            "mom3": close / lib.shift(close, 63) - 1,
+            "mom6": close / lib.shift(close, 126) - 1,
+            "atr_pct": lib.atr(high, low, close, 20, method="wilder") / close,
+            "vol30": lib.rolling_std(logret, 30),
+            "rsi14": lib.rsi(close, 14, method="wilder"),
+            "breakout": np.where(bars > 252, close > lib.shift(lib.rolling_max(close, 252)), np.nan),
+        }
+
+
+def point_in_time(history: pd.DataFrame, dates, symbols, column: str = "pe") -> np.ndarray:
+    """(dates × symbols) last `column` value observed on or before each date; NaN before the first."""
+    wide = history.pivot_table(index="date", columns="symbol", values=column, aggfunc="last")
+    wide.index = pd.to_datetime(wide.index)
+    wide = wide.sort_index().reindex(columns=list(symbols)).ffill()
+    pos = np.searchsorted(wide.index.values.astype("datetime64[D]"), np.asarray(dates), side="right") - 1
+    out = wide.values[np.maximum(pos, 0)]
+    out[pos < 0] = np.nan
+    return out
+
+
+def _block(out_dir, name, shape, dtype):
+    if out_dir is None:
+        return np.empty(shape, dtype=dtype, order="F")
+    return np.lib.format.open_memmap(os.path.join(out_dir, f"{name}.tmp.npy"), mode="w+",
+                                     dtype=dtype, shape=shape, fortran_order=True)
+
+
+def build_factor_panel(panel, pe: pd.Series = None, pe_history: pd.DataFrame = None,
+                       out_dir: str = None, batch: int = BATCH, memory_mb: float = None,
+                       dtype: str = "float64") -> "FactorPanel":
+    """
+    Factors for every date × symbol of the price panel. `pe` (indexed by
+    symbol) is the undated P/E, `pe_history` the dated one; either may be
+    None. With out_dir the blocks are written there (batch by batch, so
+    memory stays at one batch of price columns) and opened back as mmaps;
+    without it they stay in memory. memory_mb bounds the working set
+    instead, splitting histories into time blocks when a batch of whole
+    ones does not fit; dtype="float32" halves the stored panel
+    (store/chunks.py documents the tolerance).
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"unknown dtype: {dtype}")
+    dates, symbols = panel.dates, list(panel.symbols)
+    shape = (len(dates), len(symbols))
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+    blocks = {name: _block(out_dir, name, shape, dtype) for name in FACTORS + ["pe"]}
+    blocks["bars"] = _block(out_dir, "bars", shape, "int32")
+
+    fields = [panel.field(f) for f in ("close", "high", "low")]
+    if memory_mb is None:
+        memory_mb = np.inf    # one time block per batch
+    for rows, cols, out, valid, seen in run_blocks(fields, lambda p, offset: _factors(*p, offset), WARMUP,
+                                                   memory_mb, dtype, CELL_BYTES[dtype], batch):
+        for name, values in out.items():
+            blocks[name][rows, cols] = values
+        blocks["bars"][rows, cols] = np.where(valid, seen + np.cumsum(valid, axis=0), 0)
+
+    rows, cols = plan(*shape, memory_mb, cell_bytes=32, batch=batch)
+    for a in range(0, len(symbols), cols):
+        names = symbols[a:a + cols]
+        static = pe.reindex(names).values if pe is not None else np.full(len(names), np.nan)
+        history = None if pe_history is None else pe_history[pe_history["symbol"].isin(names)]
+        for r in range(0, len(dates), rows):
+            block = np.broadcast_to(static, (len(dates[r:r + rows]), len(names)))
+            if history is not None and len(history):
+                known = point_in_time(history, dates[r:r + rows], names)
+                block = np.where(np.isnan(known), block, known)
+            blocks["pe"][r:r + rows, a:a + cols] = block
+
+    if out_dir is None:
+        return FactorPanel(dates, symbols, blocks)
+    for name, block in blocks.items():
+        block.flush()
+        os.replace(os.path.join(out_dir, f"{name}.tmp.npy"), os.path.join(out_dir, f"{name}.npy"))
+    blocks.clear()
+    np.save(os.path.join(out_dir, "dates.npy"), np.asarray(dates).astype("datetime64[D]"))
+    tmp = os.path.join(out_dir, "meta.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump({"symbols": symbols, "factors": FACTORS + ["pe"], "min_bars": MIN_BARS}, f)
+    os.replace(tmp, os.path.join(out_dir, "meta.json"))
+    return load_factor_panel(out_dir)
+
+
+# ── panel ─────────────────────────────────────────────────────────
+class FactorPanel:
+    """
+    (dates × symbols) factor blocks plus `bars`, each symbol's bar count
+    up to and including that date (0 on dates it did not trade).
+    """
+
+    def __init__(self, dates, symbols, blocks):
+        self.dates = dates
+        self.symbols = list(symbols)
+        self._blocks = blocks
+        self._col = {s: j for j, s in enumerate(self.symbols)}
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def factors(self) -> list:
+        return [name for name in self._blocks if name != "bars"]
+
+    def field(self, name: str, symbols=None) -> np.ndarray:
+        block = self._blocks[name]
+        if symbols is None:
+            return block
+        missing = [s for s in symbols if s not in self._col]
+        if missing:
+            raise KeyError(f"symbols not in factor panel: {missing}")
+        return block[:, [self._col[s] for s in symbols]]
+
+    def select(self, symbols) -> "FactorPanel":
+        symbols = list(symbols)
+        return FactorPanel(self.dates, symbols, {name: self.field(name, symbols) for name in self._blocks})
+
+    def slice_dates(self, start=None, end=None) -> "FactorPanel":
+        lo = 0 if start is None else np.searchsorted(self.dates, np.datetime64(start, "D"))
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(end, "D"), side="right")
+        return FactorPanel(self.dates[lo:hi], self.symbols, {name: b[lo:hi] for name, b in self._blocks.items()})
+
+    def frame(self, name: str, symbols=None) -> pd.DataFrame:
+        symbols = self.symbols if symbols is None else list(symbols)
+        return pd.DataFrame(self.field(name, symbols), index=pd.DatetimeIndex(self.dates, name="date"),
+                            columns=symbols, copy=False)
+
+    def latest(self, date=None):
+        """(row of each symbol's last bar on or before `date`, its bar count); -1 / 0 with no bar yet."""
+        hi = len(self.dates) if date is None else np.searchsorted(self.dates, np.datetime64(date, "D"), side="right")
+        if hi == 0:
+            return np.full(len(self.symbols), -1), np.zeros(len(self.symbols), dtype=int)
+        traded = np.asarray(self._blocks["bars"][:hi]) > 0
+        rows = np.where(traded.any(axis=0), hi - 1 - np.argmax(traded[::-1], axis=0), -1)
+        n_bars = np.where(rows >= 0, self._blocks["bars"][np.maximum(rows, 0), np.arange(len(self.symbols))], 0)
+        return rows, n_bars
+
+    def as_of(self, date=None, min_bars: int = MIN_BARS) -> pd.DataFrame:
+        """
+        The factor snapshot on `date` (default: the last date): one row per
+        symbol with at least min_bars bars by then, taken at its latest bar.
+        """
+        rows, n_bars = self.latest(date)
+        keep = np.flatnonzero(n_bars >= min_bars)
+        snap = pd.DataFrame({"symbol": np.array(self.symbols, dtype=object)[keep]})
+        for name in self.factors:
+            snap[name] = self._blocks[name][rows[keep], keep]
+        if "breakout" in snap:
+            snap["breakout"] = snap["breakout"].astype(int)
+        return snap
+
+
+def load_factor_panel(store_dir: str = PANEL_DIR, fields=None, start=None, end=None,
+                      symbols=None) -> FactorPanel:
+    """Open a stored panel (mmap), optionally cut to a date range and a symbol subset."""
+    with open(os.path.join(store_dir, "meta.json")) as f:
+        meta = json.load(f)
+    fields = meta["factors"] if fields is None else list(fields)
+    blocks = {name: np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode="r") for name in fields + ["bars"]}
+    fp = FactorPanel(np.load(os.path.join(store_dir, "dates.npy")), meta["symbols"], blocks)
+    if start is not None or end is not None:
+        fp = fp.slice_dates(start, end)
+    return fp if symbols is None else fp.select(symbols)
+
+
+# ── snapshot ──────────────────────────────────────────────────────
+def factor_snapshot(panel, pe: pd.Series, fundamentals: pd.DataFrame = None, verbose: bool = True,
+                    factor_panel: FactorPanel = None) -> pd.DataFrame:
+    """
+    One row per symbol with at least MIN_BARS bars, at its latest bar.
+    `pe` is indexed by symbol; `fundamentals` (symbol-indexed) adds the
+    VALUATION columns it has. Pass an already built factor_panel to skip
+    the computation.
+    """
+    fp = build_factor_panel(panel, pe) if factor_panel is None else factor_panel
+    if verbose:
+        _, n_bars = fp.latest()
+        for sym in np.array(fp.symbols)[n_bars < MIN_BARS]:
+            print(f"⚠️  Skipping {sym} (not enough data)")
+    factors = fp.as_of()
+
+    # Valuation factors beyond P/E, fetched in the same request as it
+    if fundamentals is not None:
+        fund = fundamentals.reindex(factors["symbol"])
+        for col in VALUATION:
+            if col in fund:
+                factors[col] = fund[col].values
+    return factors
@@ -0,0 +1,131 @@
+"""
+picker.py
+---------
+One stock per sector from the factor snapshot (see scripts/stock_picker.py),
+or the top n per sector for a multi-name book (pick_book):
+
+  1. KMeans on scaled mom3 / mom6 / vol30 / pe, keeping the cluster with
+     the best mean momentum (sectors with fewer than 3 names skip this)
+  2. per-sector z-scores of the WEIGHTS columns ("lower is better"
+     factors inverted first), weighted into one score
+  3. highest score wins
+"""
+
+import pandas as pd
+
+# Modular factor weights (total = 1.0)
+WEIGHTS = {
+    "mom3":      0.2,
+    "mom6":      0.2,
+    "rsi14":     0.1,
+    "breakout":  0.1,
+    "pe_inv":    0.2,
+    "atr_inv":   0.1,
+    "vol30_inv": 0.1,
+}
+CLUSTER_FEATURES = ["mom3", "mom6", "vol30", "pe"]
+INVERTED = {"pe_inv": "pe", "atr_inv": "atr_pct", "vol30_inv": "vol30"}   # "lower is better"
+
+
+def sector_map(universe_files: dict) -> dict:
+    """{symbol: sector} from the per-sector universe CSVs."""
+    sym2sector = {}
+    for sector, csv_path in universe_files.items():
+        for sym in pd.read_csv(csv_path)["symbol"].tolist():
+            sym2sector[sym] = sector
+    return sym2sector
+
+
+def score_sectors(factors: pd.DataFrame, sym2sector: dict, weights: dict = None, n_clusters: int = 3,
+                  random_state: int = 42, verbose: bool = True) -> dict:
+    """{sector: candidates that survive the filters, best score first}; n_clusters=None skips KMeans."""
+    from scipy.stats import zscore              # scipy / sklearn load on first use, not on import
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+
+    weights = WEIGHTS if weights is None else weights
+    log = print if verbose else (lambda *a, **k: None)
+
+    df = factors.copy()
+    df["sector"] = df["symbol"].map(sym2sector)
+    df = df.dropna(subset=["sector"])
+
+    # Invert "lower is better" metrics
+    for inv, col in INVERTED.items():
+        df[inv] = -df[col]
+
+    score_cols = list(weights.keys())
+    df = df.dropna(subset=score_cols)
+
+    scored = {}
+    for sector in df["sector"].unique():
+        sector_df = df[df["sector"] == sector].copy()
+
+        # Clustering (optional ML layer)
+        cluster_data = sector_df[CLUSTER_FEATURES].dropna()
+
+        if n_clusters and len(cluster_data) >= n_clusters:
+            scaled = StandardScaler().fit_transform(cluster_data)
+            kmeans = KMeans(n_clusters=n_clusters, random_state=random_state).fit(scaled)
+            sector_df.loc[cluster_data.index, "cluster"] = kmeans.labels_
+
+            # Pick best momentum cluster
+            cluster_scores = (
+                sector_df.groupby("cluster")[["mom3", "mom6"]].mean().sum(axis=1)
+            )
+            best_cluster = cluster_scores.idxmax()
+            sector_df = sector_df[sector_df["cluster"] == best_cluster].copy()
+        else:
+            log(f"Skipping clustering for {sector} — not enough data")
+
+        # Defensive: Check again
+        sector_df = sector_df.dropna(subset=score_cols)
+        if len(sector_df) < 2:
+            log(f"Skipping {sector} — not enough stocks after filtering.")
+            continue
+
+        # Remove any score column with no variance (e.g., all 0s)
+        valid_cols = [col for col in score_cols if sector_df[col].nunique() > 1]
+
+        if not valid_cols:
+            log(f"No valid scoring columns in {sector}, skipping.")
+            continue
+
+        sector_df[valid_cols] = sector_df[valid_cols].apply(zscore)
+
+        # Final score
+        sector_df["score"] = sum(sector_df[col] * w for col, w in weights.items())
+
+        scored[sector] = sector_df.sort_values("score", ascending=False)
+
+    return scored
+
+
+def pick_stocks(factors: pd.DataFrame, sym2sector: dict, weights: dict = None, n_clusters: int = 3,
+                random_state: int = 42, verbose: bool = True) -> dict:
+    """{sector: symbol}, sectors in sorted order (as read back from the YAML)."""
+    log = print if verbose else (lambda *a, **k: None)
+    selected = {}
+    for sector, ranked in score_sectors(factors, sym2sector, weights, n_clusters, random_state, verbose).items():
+        top = ranked.iloc[0]
+        selected[sector] = top["symbol"]
+        log(f"{sector:<6}: {top['symbol']:<15} score={top['score']:.2f}")
+    return dict(sorted(selected.items()))
+
+
+def pick_book(factors: pd.DataFrame, sym2sector: dict, n: int = 10, weights: dict = None, n_clusters: int = 3,
+              random_state: int = 42, verbose: bool = True) -> dict:
+    """
+    {sector: [up to n symbols, best first]}. The lead (first name) is the
+    pick_stocks pick; the KMeans filter is skipped so a sector can fill n.
+    """
+    log = print if verbose else (lambda *a, **k: None)
+    lead = pick_stocks(factors, sym2sector, weights, n_clusters, random_state, verbose=False)
+    book = {}
+    for sector, ranked in score_sectors(factors, sym2sector, weights, n_clusters=None, verbose=False).items():
+        if sector not in lead:
+            continue
+        rest = [s for s in ranked["symbol"] if s != lead[sector]]
+        book[sector] = [lead[sector]] + rest[:n - 1]
+        log(f"{sector:<6}: {len(book[sector]):>3} names, lead {lead[sector]}")
+    return dict(sorted(book.items()))
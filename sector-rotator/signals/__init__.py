@@ -0,0 +1,56 @@
+from importlib import import_module
+
+import numpy as np
+
+# Signal module per sector; each exposes generate_signal(df, **params), and
+# signal_panel(*FIELDS arrays, **params) with the warmup(**params) bars it needs.
+# Params named in THRESHOLDS may be passed to signal_panel as arrays that
+# broadcast across its columns (backtest/sweep.py runs a grid that way).
+SECTOR_MODULES = {
+    "TECH": "signals.tech_rubberband",
+    "FMCG": "signals.fmcg_turnofmonth",
+    "BANK": "signals.bank_momentum",
+}
+
+
+def sector_flags(panel, selected: dict, params: dict = None) -> dict:
+    """
+    {sector: flag Series} for each sector's selected symbol. `params` maps
+    "<SECTOR>.<name>" to generate_signal keyword arguments (as in
+    backtest/sweep.py); unset ones keep the module defaults.
+    """
+    params = params or {}
+    flags = {}
+    for sector, symbol in selected.items():
+        kwargs = {k.split(".", 1)[1]: v for k, v in params.items() if k.startswith(sector + ".")}
+        signal = import_module(SECTOR_MODULES[sector]).generate_signal(panel.ohlcv(symbol), **kwargs)
+        signal.name = "flag"
+        flags[sector] = signal
+    return flags
+
+
+CELL_BYTES = {"float64": 192, "float32": 160}   # peak bytes per block cell while a signal_panel runs
+
+
+def panel_flags(panel, sector: str, params: dict = None, memory_mb: float = None,
+                dtype: str = "float64", out=None):
+    """
+    (dates × symbols) int8 flags of one sector's signal module for every
+    symbol of the panel, 0 on dates a symbol did not trade. `params` are
+    generate_signal keyword arguments. With memory_mb the panel is run in
+    symbol / time blocks (store/chunks.py) and `out` may be a writable
+    memmap to keep the result on disk too.
+    """
+    from store.chunks import run_blocks
+
+    module = import_module(SECTOR_MODULES[sector])
+    params = params or {}
+    fields = [panel.field(f) for f in module.FIELDS]
+    if out is None:
+        out = np.zeros(fields[0].shape, dtype=np.int8)
+    kernel = lambda packed, offset: {"flag": module.signal_panel(*packed, **params)}
+    budget = np.inf if memory_mb is None else memory_mb
+    for rows, cols, result, valid, _ in run_blocks(fields, kernel, module.warmup(**params), budget,
+                                                   dtype, CELL_BYTES[dtype]):
+        out[rows, cols] = np.where(valid, result["flag"], 0)
+    return out
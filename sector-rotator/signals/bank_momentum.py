@@ -1,14 +1,31 @@
+import numpy as np
 import pandas as pd
+from signals import lib, streaming
 
-def generate_signal(df: pd.DataFrame) -> pd.Series:
-    df.loc[:, "close"] = pd.to_numeric(df["close"], errors="coerce")
-    df = df.dropna(subset=["close"])
+FIELDS = ["close"]      # signal_panel's inputs
+THRESHOLDS = ()         # both params are windows
 
-    sma20 = df["close"].rolling(20).mean()
-    sma63 = df["close"].rolling(63).mean()
+def warmup(fast=20, slow=63) -> int:
+    """Bars behind one flag: the longer moving-average window."""
+    return max(fast, slow)
 
-    signal = pd.Series(0, index=df.index)
-    signal[sma20 > sma63] = 1   # Long signal
-    signal[sma20 < sma63] = -1  # Short signal
+def signal_panel(close, fast=20, slow=63) -> np.ndarray:
+    """Flags for a (T × N) array of closes: 1 long, -1 short, 0 flat."""
+    sma_fast = lib.rolling_mean(close, fast)
+    sma_slow = lib.rolling_mean(close, slow)
+    with np.errstate(invalid="ignore"):
+        return np.where(sma_fast < sma_slow, -1, np.where(sma_fast > sma_slow, 1, 0))
 
-    return signal
+def generate_signal(df: pd.DataFrame, fast=20, slow=63) -> pd.Series:
+    close = pd.to_numeric(df["close"], errors="coerce").dropna()
+    # SMA(fast) above SMA(slow) → Long, below → Short
+    return pd.Series(signal_panel(close.values, fast, slow), index=close.index)
+
+class StreamingSignal(streaming.Stateful):
+    """generate_signal() one bar at a time; update(bar) returns the bar's flag."""
+
+    def __init__(self, fast=20, slow=63):
+        self.cross = streaming.SMACross(fast, slow)
+
+    def update(self, bar) -> int:
+        return self.cross.update(bar.close)
@@ -1,30 +1,53 @@
+import math
+import numpy as np
 import pandas as pd
+from signals import lib, streaming
+
+def _hlc(df: pd.DataFrame) -> pd.DataFrame:
+    return df[["high", "low", "close"]].apply(pd.to_numeric, errors="coerce").dropna()
 
 def atr(df: pd.DataFrame, window=5) -> pd.Series:
-    for col in ["high", "low", "close"]:
-        df.loc[:, col] = pd.to_numeric(df[col], errors="coerce")
-    df = df.dropna(subset=["high", "low", "close"])
-
-    high_low = df["high"] - df["low"]
-    high_close = (df["high"] - df["close"].shift()).abs()
-    low_close = (df["low"] - df["close"].shift()).abs()
-    ranges = pd.concat([high_low, high_close, low_close], axis=1)
-    true_range = ranges.max(axis=1)
-    return true_range.rolling(window).mean()
-
-def generate_signal(df: pd.DataFrame) -> pd.Series:
-    for col in ["high", "low", "close"]:
-        df.loc[:, col] = pd.to_numeric(df[col], errors="coerce")
-    df = df.dropna(subset=["high", "low", "close"])
-
-    hi5 = df["high"].rolling(5).max()
-    lo5 = df["low"].rolling(5).min()
-    atr5 = atr(df, 5)
-
-    lower_band = hi5 - 2.5 * atr5
-    upper_band = lo5 + 2.5 * atr5
-
-    signal = pd.Series(0, index=df.index)
-    signal[df["close"] < lower_band] = 1    # Long entry
-    signal[df["close"] > upper_band] = -1   # Short entry
-    return signal
+    df = _hlc(df)
+    return pd.Series(lib.atr(df["high"].values, df["low"].values, df["close"].values, window), index=df.index)
+
+FIELDS = ["high", "low", "close"]     # signal_panel's array arguments, in order
+THRESHOLDS = ("band",)                # params signal_panel also takes as per-column arrays
+
+def warmup(window=5, band=2.5) -> int:
+    """Bars behind one flag: the ATR / band window and the close before its first true range."""
+    return window + 1
+
+def signal_panel(high, low, close, window=5, band=2.5) -> np.ndarray:
+    """
+    Flags for (T × N) arrays of highs, lows and closes: 1 long, -1 short,
+    0 flat. band may be an array that broadcasts against the columns.
+    """
+    atr_w = lib.atr(high, low, close, window)
+    lower_band = lib.rolling_max(high, window) - band * atr_w
+    upper_band = lib.rolling_min(low, window) + band * atr_w
+    close = np.asarray(close, dtype="float64")
+    with np.errstate(invalid="ignore"):
+        return np.where(close > upper_band, -1, np.where(close < lower_band, 1, 0))
+
+def generate_signal(df: pd.DataFrame, window=5, band=2.5) -> pd.Series:
+    df = _hlc(df)
+    # Close below the ATR band off the recent high → Long entry, above the band off the low → Short
+    flags = signal_panel(df["high"].values, df["low"].values, df["close"].values, window, band)
+    return pd.Series(flags, index=df.index)
+
+class StreamingSignal(streaming.Stateful):
+    """generate_signal() one bar at a time; update(bar) returns the bar's flag."""
+
+    def __init__(self, window=5, band=2.5):
+        self.atr = streaming.ATR(window)
+        self.hi = streaming.RollingMax(window)
+        self.lo = streaming.RollingMin(window)
+        self.band = band
+
+    def update(self, bar) -> int:
+        if math.isnan(bar.high) or math.isnan(bar.low):
+            return None     # generate_signal drops these rows
+        atr_w = self.atr.update(bar.high, bar.low, bar.close)
+        lower_band = self.hi.update(bar.high) - self.band * atr_w
+        upper_band = self.lo.update(bar.low) + self.band * atr_w
+        return -1 if bar.close > upper_band else 1 if bar.close < lower_band else 0
@@ -1,38 +1,292 @@
 # signals/lib.py
-import pandas as pd
+"""
+Indicator kernels on (T × N) float arrays: one row per bar, one column
+per symbol. Every kernel works on the whole universe at once — rolling
+windows are built from block prefix / suffix scans (van Herk / Gil-Werman)
+and recursive smoothers loop over bars, never over tickers. 1-D input is
+treated as a single column and the result keeps the input's shape.
+
+NaN rules follow pandas' rolling(window): a window containing NaN gives
+NaN. Leading NaNs are simply padding, so a symbol that listed late starts
+producing values `window` bars after its first price. For panels on a
+union calendar, pack() pushes every symbol's valid bars together (tail
+aligned, like the per-symbol CSVs after dropna) and unpack() puts results
+back on the calendar:
+
+    close, high, low = (panel.field(f) for f in ("close", "high", "low"))
+    (c, h, l), order, valid = pack(close, high, low)
+    natr = unpack(atr(h, l, c, 20, method="wilder") / c, order, valid)
+
+Rolling sums agree with pandas to rounding (error bounded by the window,
+not the series length), on price levels as well as on returns.
+
+float32 input stays float32 (other input is computed in float64), so a
+float32 panel (store/chunks.py) halves the kernels' working set too;
+recursive smoothers still accumulate in float64.
+"""
 import numpy as np
 
-def rsi(series, window=14):
-    delta = series.diff()
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-    avg_gain = gain.rolling(window).mean()
-    avg_loss = loss.rolling(window).mean()
-    rs = avg_gain / avg_loss
-    return 100 - (100 / (1 + rs))
-
-def mfi(df, window=3):
-    tp = (df["high"] + df["low"] + df["close"]) / 3
-    mf = tp * df["volume"]
-    pos = mf.where(tp.diff() > 0, 0.0)
-    neg = mf.where(tp.diff() < 0, 0.0).abs()
-    pmf = pos.rolling(window).sum()
-    nmf = neg.rolling(window).sum()
-    return 100 - (100 / (1 + pmf / nmf))
-
-def atr(df, window=14):
-    high_low = df["high"] - df["low"]
-    high_close = (df["high"] - df["close"].shift()).abs()
-    low_close = (df["low"] - df["close"].shift()).abs()
-    tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    return tr.rolling(window).mean()
+
+def _panel(x):
+    x = np.asarray(x)
+    if x.dtype != np.float32:
+        x = x.astype("float64", copy=False)
+    return (x[:, None], True) if x.ndim == 1 else (x, False)
+
+
+def _out(x, squeeze):
+    return x[:, 0] if squeeze else x
+
+
+_jitted = {}
+
+
+def jit(func):
+    """
+    func compiled with numba (cache=True), or None when numba is not
+    installed. numba is imported on the first call rather than at module
+    load, so scripts that never run a compiled kernel don't pay for it.
+    """
+    if func not in _jitted:
+        try:
+            from numba import njit
+        except ImportError:  # compiled kernels are optional
+            njit = None
+        _jitted[func] = njit(cache=True)(func) if njit else None
+    return _jitted[func]
+
+
+def pack(*arrays, valid=None):
+    """
+    Tail-align each column's valid rows (all arrays finite, or `valid`).
+    Returns (packed arrays, order, valid) for unpack().
+    """
+    panels = [_panel(a)[0] for a in arrays]
+    if valid is None:
+        valid = np.logical_and.reduce([np.isfinite(p) for p in panels])
+    order = np.argsort(valid, axis=0, kind="stable")   # invalid rows first, order kept
+    packed = [np.take_along_axis(p, order, axis=0) for p in panels]
+    packed = [np.where(np.sort(valid, axis=0), p, np.nan) for p in packed]
+    return packed, order, valid
+
+
+def unpack(x, order, valid):
+    """Inverse of pack(): back onto the original rows, NaN where invalid."""
+    x, _ = _panel(x)
+    out = np.empty_like(x)
+    np.put_along_axis(out, order, x, axis=0)
+    return np.where(valid, out, np.nan)
+
+
+def shift(x, periods=1):
+    x, squeeze = _panel(x)
+    out = np.full_like(x, np.nan)
+    if periods >= 0:
+        out[periods:] = x[:len(x) - periods]
+    else:
+        out[:periods] = x[-periods:]
+    return _out(out, squeeze)
+
+
+def _blocks(x, window, fill):
+    # Pad rows to whole blocks of `window`; returns (T × N) view helpers
+    T, N = x.shape
+    nb = -(-T // window)
+    pad = np.full((nb * window, N), fill, dtype=x.dtype)
+    pad[:T] = x
+    return pad.reshape(nb, window, N), T
+
+
+def _scan(x, window, op, fill):
+    """
+    op over every trailing window of `window` rows: the result for the
+    window starting at s and ending at t is op(suffix[s], prefix[t]), where
+    prefix / suffix are scans restarted at each block boundary.
+    """
+    blocks, T = _blocks(x, window, fill)
+    acc = op.accumulate
+    prefix = acc(blocks, axis=1).reshape(-1, x.shape[1])[:T]
+    suffix = acc(blocks[:, ::-1], axis=1)[:, ::-1].reshape(-1, x.shape[1])[:T]
+    out = np.full_like(x, np.nan)
+    if T < window:
+        return out
+    out[window - 1:] = op(suffix[:T - window + 1], prefix[window - 1:])
+    out[window - 1::window] = prefix[window - 1::window]   # windows that are exactly one block
+    return out
+
+
+def _full(x, window):
+    # True where the trailing window holds `window` finite values
+    count = np.cumsum(np.isfinite(x), axis=0, dtype=np.int32)
+    full = np.zeros(x.shape, dtype=bool)
+    if len(x) >= window:
+        full[window - 1] = count[window - 1] == window
+        full[window:] = (count[window:] - count[:-window]) == window
+    return full
+
+
+def rolling_sum(x, window):
+    x, squeeze = _panel(x)
+    out = _scan(np.where(np.isfinite(x), x, 0.0), window, np.add, 0.0)
+    return _out(np.where(_full(x, window), out, np.nan), squeeze)
+
+
+def rolling_mean(x, window):
+    return rolling_sum(x, window) / window
+
+
+def rolling_std(x, window, ddof=1):
+    """
+    Rolling standard deviation. Each block of `window` rows is centred on
+    its own mean before summing, and the earlier block's partial sums are
+    re-centred onto the later block's, so price levels lose no precision.
+    """
+    x, squeeze = _panel(x)
+    T, N = x.shape
+    out = np.full_like(x, np.nan)
+    if T >= window:
+        finite = np.isfinite(x)
+        blocks, _ = _blocks(np.where(finite, x, np.nan), window, np.nan)
+        count = np.isfinite(blocks).sum(axis=1)
+        ref = (np.nansum(blocks, axis=1) / np.maximum(count, 1)).astype(x.dtype)   # (nb × N) block means
+        y = np.nan_to_num(blocks - ref[:, None, :])
+        p1 = np.cumsum(y, axis=1).reshape(-1, N)[:T]
+        p2 = np.cumsum(y ** 2, axis=1).reshape(-1, N)[:T]
+        s1 = np.cumsum(y[:, ::-1], axis=1)[:, ::-1].reshape(-1, N)[:T]
+        s2 = np.cumsum((y ** 2)[:, ::-1], axis=1)[:, ::-1].reshape(-1, N)[:T]
+
+        t = np.arange(window - 1, T)
+        s = t - window + 1
+        aligned = ((s % window) == 0)[:, None]
+        n = (window - s % window)[:, None]                             # rows of the earlier block
+        d = ref[s // window] - ref[np.minimum(s // window + 1, len(ref) - 1)]
+        sum1 = np.where(aligned, p1[t], s1[s] + n * d + p1[t])
+        sum2 = np.where(aligned, p2[t], s2[s] + 2 * d * s1[s] + n * d ** 2 + p2[t])
+        var = np.clip(sum2 - sum1 ** 2 / window, 0.0, None) / (window - ddof)
+        out[t] = np.sqrt(var)
+    return _out(np.where(_full(x, window), out, np.nan), squeeze)
+
+
+def rolling_max(x, window):
+    x, squeeze = _panel(x)
+    out = _scan(np.where(np.isfinite(x), x, -np.inf), window, np.maximum, -np.inf)
+    return _out(np.where(_full(x, window), out, np.nan), squeeze)
+
+
+def rolling_min(x, window):
+    x, squeeze = _panel(x)
+    out = _scan(np.where(np.isfinite(x), x, np.inf), window, np.minimum, np.inf)
+    return _out(np.where(_full(x, window), out, np.nan), squeeze)
+
+
+def ewma(x, span=None, alpha=None, adjust=False, min_periods=0):
+    """
+    Exponentially weighted mean per column, like pandas ewm(...).mean()
+    with ignore_na=True: NaN bars repeat the last value and do not decay.
+    """
+    x, squeeze = _panel(x)
+    if alpha is None:
+        alpha = 2.0 / (span + 1.0)
+    T, N = x.shape
+    out = np.full_like(x, np.nan)
+    num = np.zeros(N)
+    den = np.zeros(N)
+    seen = np.zeros(N, dtype=int)
+    for t in range(T):
+        row = x[t]
+        ok = np.isfinite(row)
+        if adjust:
+            num = np.where(ok, row + (1 - alpha) * num, num)
+            den = np.where(ok, 1 + (1 - alpha) * den, den)
+        else:
+            first = ok & (seen == 0)
+            num = np.where(first, row, np.where(ok, (1 - alpha) * num + alpha * row, num))
+            den = np.where(ok, 1.0, den)
+        seen += ok
+        with np.errstate(invalid="ignore"):
+            out[t] = np.where((seen > 0) & (seen >= max(min_periods, 1)), num / den, np.nan)
+    return _out(out, squeeze)
+
+
+def rma(x, window):
+    """Wilder's moving average as pandas_ta computes it: ewm(alpha=1/window), first value after `window` bars."""
+    return ewma(x, alpha=1.0 / window, adjust=True, min_periods=window)
+
+
+def rsi(close, window=14, method="sma"):
+    """
+    RSI per column. method="sma" averages gains / losses over a plain
+    rolling window (the signal modules' version); "wilder" smooths them
+    with rma() and matches pandas_ta.rsi.
+    """
+    close, squeeze = _panel(close)
+    delta = close - shift(close)
+    gain = np.where(delta > 0, delta, np.where(np.isnan(delta), delta, 0.0))
+    loss = np.where(delta < 0, -delta, np.where(np.isnan(delta), delta, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if method == "wilder":
+            avg_gain, avg_loss = rma(gain, window), rma(loss, window)
+            out = 100 * avg_gain / (avg_gain + avg_loss)
+        elif method == "sma":
+            avg_gain, avg_loss = rolling_mean(gain, window), rolling_mean(loss, window)
+            out = 100 - (100 / (1 + avg_gain / avg_loss))
+        else:
+            raise ValueError(f"unknown RSI method: {method}")
+    return _out(out, squeeze)
+
+
+def true_range(high, low, close):
+    """max(high - low, |high - prev close|, |low - prev close|); high - low on a symbol's first bar."""
+    high, squeeze = _panel(high)
+    low, _ = _panel(low)
+    prev = shift(_panel(close)[0])
+    ranges = np.stack([high - low, np.abs(high - prev), np.abs(low - prev)])
+    with np.errstate(invalid="ignore"):
+        tr = np.where(np.isnan(prev), high - low, np.nanmax(np.where(np.isnan(ranges), -np.inf, ranges), axis=0))
+    return _out(tr, squeeze)
+
+
+def atr(high, low, close, window=14, method="sma"):
+    """
+    Average true range. method="sma" is a rolling mean of true_range();
+    "wilder" follows pandas_ta.atr (rma smoothing, no range on the first bar).
+    """
+    high, squeeze = _panel(high)
+    tr = true_range(high, low, close)
+    if method == "wilder":
+        prev = shift(_panel(close)[0])
+        return _out(rma(np.where(np.isnan(prev), np.nan, tr), window), squeeze)
+    if method != "sma":
+        raise ValueError(f"unknown ATR method: {method}")
+    return _out(rolling_mean(tr, window), squeeze)
+
+
+def mfi(high, low, close, volume, window=3):
+    high, squeeze = _panel(high)
+    tp = (high + _panel(low)[0] + _panel(close)[0]) / 3
+    mf = tp * _panel(volume)[0]
+    change = tp - shift(tp)
+    pos = np.where(change > 0, mf, 0.0)
+    neg = np.abs(np.where(change < 0, mf, 0.0))
+    pos = np.where(np.isnan(tp), np.nan, pos)
+    neg = np.where(np.isnan(tp), np.nan, neg)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = 100 - (100 / (1 + rolling_sum(pos, window) / rolling_sum(neg, window)))
+    return _out(out, squeeze)
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """(macd line, signal line, histogram) from adjust=False EMAs."""
+    line = ewma(close, span=fast) - ewma(close, span=slow)
+    sig = ewma(line, span=signal)
+    return line, sig, line - sig
+
 
 def macd_histogram(close, fast=12, slow=26, signal=9):
-    ema_fast = close.ewm(span=fast, adjust=False).mean()
-    ema_slow = close.ewm(span=slow, adjust=False).mean()
-    macd = ema_fast - ema_slow
-    macd_signal = macd.ewm(span=signal, adjust=False).mean()
-    return macd - macd_signal
-
-def breakout(df, window=252):
-    return (df["close"] > df["close"].rolling(window).max().shift(1)).astype(int)
+    return macd(close, fast, slow, signal)[2]
+
+
+def breakout(close, window=252):
+    """1 where close exceeds the highest close of the previous `window` bars."""
+    with np.errstate(invalid="ignore"):
+        return (np.asarray(close, dtype="float64") > shift(rolling_max(close, window))).astype(np.int8)
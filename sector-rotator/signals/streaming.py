@@ -0,0 +1,193 @@
+# signals/streaming.py
+"""
+Streaming twins of the signals/lib.py kernels for live feeds: each object
+takes one bar per update() in O(1) (amortized) and returns the indicator's
+value at that bar.
+
+Values are bit-identical to the batch kernels, not just close: rolling
+sums keep lib's block layout (running prefix of the current block plus
+the suffix sums of the previous one, rebuilt once per `window` bars), so
+every addition happens in the same order. Rolling max / min use a
+monotonic deque. NaN inputs follow lib too: any NaN in the window gives
+NaN.
+
+Every object is checkpointable:
+
+    snap = sig.state()                 # JSON-serializable dict
+    sig = Stateful.restore(snap)       # same class, same position
+"""
+import math
+from collections import deque
+from importlib import import_module
+
+NAN = float("nan")
+
+
+def _dump(value):
+    if isinstance(value, Stateful):
+        return value.state()
+    if isinstance(value, deque):
+        return {"__deque__": [_dump(v) for v in value], "maxlen": value.maxlen}
+    if isinstance(value, (list, tuple)):
+        return [_dump(v) for v in value]
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict) and "__class__" in value:
+        return Stateful.restore(value)
+    if isinstance(value, dict) and "__deque__" in value:
+        return deque((_load(v) for v in value["__deque__"]), maxlen=value.get("maxlen"))
+    if isinstance(value, list):
+        return [_load(v) for v in value]
+    return value
+
+
+class Stateful:
+    """Base for streaming state: state() / restore() round-trip every attribute."""
+
+    def state(self) -> dict:
+        cls = type(self)
+        return {"__class__": f"{cls.__module__}.{cls.__qualname__}",
+                "attrs": {k: _dump(v) for k, v in vars(self).items()}}
+
+    @staticmethod
+    def restore(state: dict) -> "Stateful":
+        module, _, name = state["__class__"].rpartition(".")
+        obj = object.__new__(getattr(import_module(module), name))
+        for k, v in state["attrs"].items():
+            setattr(obj, k, _load(v))
+        return obj
+
+
+class RollingSum(Stateful):
+    def __init__(self, window: int):
+        self.window = window
+        self.n = 0              # bars seen
+        self.last_nan = -1      # bar index of the latest NaN
+        self.block = []         # current block's values
+        self.prefix = 0.0       # running sum of the current block
+        self.suffix = []        # suffix sums of the previous complete block
+
+    def update(self, x: float) -> float:
+        w, t = self.window, self.n
+        self.n += 1
+        if not math.isfinite(x):
+            self.last_nan, x = t, 0.0
+        pos = t % w
+        self.prefix = x if pos == 0 else self.prefix + x
+        self.block.append(x)
+        if pos == w - 1:
+            value = self.prefix                             # window is exactly this block
+            suffix, acc = [0.0] * w, 0.0
+            for i in range(w - 1, -1, -1):
+                acc = self.block[i] if i == w - 1 else acc + self.block[i]
+                suffix[i] = acc
+            self.suffix, self.block = suffix, []
+        elif t >= w - 1:
+            value = self.suffix[pos + 1] + self.prefix      # window starts at s = t - w + 1
+        else:
+            return NAN
+        return value if self.last_nan < t - w + 1 else NAN
+
+
+class RollingMean(Stateful):
+    def __init__(self, window: int):
+        self.window = window
+        self.sum = RollingSum(window)
+
+    def update(self, x: float) -> float:
+        return self.sum.update(x) / self.window
+
+
+class _RollingExtreme(Stateful):
+    sign = 1.0
+
+    def __init__(self, window: int):
+        self.window = window
+        self.n = 0
+        self.last_nan = -1
+        self.items = deque()    # (bar index, value), values monotonic from the left
+
+    def update(self, x: float) -> float:
+        t = self.n
+        self.n += 1
+        if not math.isfinite(x):
+            self.last_nan = t
+        else:
+            while self.items and self.sign * self.items[-1][1] <= self.sign * x:
+                self.items.pop()
+            self.items.append((t, x))
+        while self.items and self.items[0][0] <= t - self.window:
+            self.items.popleft()
+        if t < self.window - 1 or self.last_nan > t - self.window:
+            return NAN
+        return self.items[0][1]
+
+
+class RollingMax(_RollingExtreme):
+    sign = 1.0
+
+
+class RollingMin(_RollingExtreme):
+    sign = -1.0
+
+
+class RSI(Stateful):
+    """lib.rsi(method="sma"): rolling mean of gains over rolling mean of losses."""
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.prev = NAN
+        self.gain = RollingMean(window)
+        self.loss = RollingMean(window)
+
+    def update(self, close: float) -> float:
+        delta = close - self.prev
+        self.prev = close
+        if math.isnan(delta):
+            gain = loss = NAN
+        else:
+            gain = delta if delta > 0 else 0.0
+            loss = -delta if delta < 0 else 0.0
+        avg_gain, avg_loss = self.gain.update(gain), self.loss.update(loss)
+        if math.isnan(avg_gain) or math.isnan(avg_loss):
+            return NAN
+        if avg_loss == 0:   # NumPy's x / 0: inf, or NaN for 0 / 0
+            return NAN if avg_gain == 0 else 100 - (100 / (1 + math.inf))
+        return 100 - (100 / (1 + avg_gain / avg_loss))
+
+
+class TrueRange(Stateful):
+    def __init__(self):
+        self.prev = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        prev, self.prev = self.prev, close
+        if math.isnan(prev):
+            return high - low
+        ranges = [r for r in (high - low, abs(high - prev), abs(low - prev)) if not math.isnan(r)]
+        return max(ranges) if ranges else NAN
+
+
+class ATR(Stateful):
+    """lib.atr(method="sma"): rolling mean of the true range."""
+
+    def __init__(self, window: int = 14):
+        self.tr = TrueRange()
+        self.mean = RollingMean(window)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        return self.mean.update(self.tr.update(high, low, close))
+
+
+class SMACross(Stateful):
+    """Sign of SMA(fast) - SMA(slow): 1 above, -1 below, 0 equal or not ready."""
+
+    def __init__(self, fast: int = 20, slow: int = 63):
+        self.fast = RollingMean(fast)
+        self.slow = RollingMean(slow)
+
+    def update(self, close: float) -> int:
+        fast, slow = self.fast.update(close), self.slow.update(close)
+        return -1 if fast < slow else 1 if fast > slow else 0
@@ -1,20 +1,42 @@
+import numpy as np
 import pandas as pd
+from signals import lib, streaming
 
-def compute_rsi(series: pd.Series, period=2) -> pd.Series:
-    delta = series.diff()
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-    avg_gain = gain.rolling(window=period).mean()
-    avg_loss = loss.rolling(window=period).mean()
-    rs = avg_gain / avg_loss
-    return 100 - (100 / (1 + rs))
-
-def generate_signal(df: pd.DataFrame) -> pd.Series:
-    df.loc[:, "close"] = pd.to_numeric(df["close"], errors="coerce")
-    df = df.dropna(subset=["close"])
-    rsi2 = compute_rsi(df["close"], 2)
-
-    signal = pd.Series(0, index=rsi2.index)
-    signal[rsi2 < 30] = 1   # Long
-    signal[rsi2 > 70] = -1  # Short
-    return signal
+def compute_rsi(close, period=2):
+    """Rolling-mean RSI of a Series, or of a (T × N) array of closes."""
+    if isinstance(close, pd.Series):
+        return pd.Series(lib.rsi(close.values, period), index=close.index)
+    return lib.rsi(close, period)
+
+FIELDS = ["close"]      # panel fields signal_panel takes
+THRESHOLDS = ("lower", "upper")     # params signal_panel also takes as per-column arrays
+
+def warmup(period=2, lower=30, upper=70) -> int:
+    """Bars behind one flag: the RSI window plus the close its first change needs."""
+    return period + 1
+
+def signal_panel(close, period=2, lower=30, upper=70) -> np.ndarray:
+    """
+    Flags for a (T × N) array of closes: 1 long, -1 short, 0 flat. lower /
+    upper may be arrays that broadcast against the columns, e.g. one close
+    column (T × 1) against U threshold pairs gives T × U.
+    """
+    rsi = lib.rsi(close, period)
+    with np.errstate(invalid="ignore"):
+        return np.where(rsi > upper, -1, np.where(rsi < lower, 1, 0))
+
+def generate_signal(df: pd.DataFrame, period=2, lower=30, upper=70) -> pd.Series:
+    close = pd.to_numeric(df["close"], errors="coerce").dropna()
+    # RSI(period) < lower → Long, > upper → Short
+    return pd.Series(signal_panel(close.values, period, lower, upper), index=close.index)
+
+class StreamingSignal(streaming.Stateful):
+    """generate_signal() one bar at a time; update(bar) returns the bar's flag."""
+
+    def __init__(self, period=2, lower=30, upper=70):
+        self.rsi = streaming.RSI(period)
+        self.lower, self.upper = lower, upper
+
+    def update(self, bar) -> int:
+        rsi = self.rsi.update(bar.close)
+        return -1 if rsi > self.upper else 1 if rsi < self.lower else 0
@@ -0,0 +1,159 @@
+"""
+fetch.py
+--------
+Async refresh of data/raw/*.csv from a PriceSource (store/sources.py).
+
+Only missing dates are requested. A symbol without a CSV gets
+[start, end]; an existing CSV gets [its last date, end], the stored last
+bar being asked for again as a check — if the source's close for it
+moved (adjusted history rewritten after a split or dividend) the whole
+history is downloaded again instead of stitching two price bases.
+
+New rows are merged by copying the CSV to <file>.tmp, appending, and
+os.replace()-ing it over the original, so readers never see a partial
+file and an interrupted refresh leaves the old one intact. The price
+store notices the new size / mtime and re-ingests on the next load.
+
+At most `concurrency` requests are in flight; a failed request is retried
+`retries` times with exponential backoff and jitter, and a symbol that
+still fails is reported, not raised, so one bad ticker can't sink a
+nightly run. The source is closed when the refresh ends, however it ends.
+
+    results = asyncio.run(refresh(symbols, HTTPSource(), end="2025-04-17"))
+"""
+
+import asyncio
+import os
+import shutil
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from store.prices import FIELDS, RAW_DIR, read_raw_last, symbol_file
+from store.sources import with_retries
+
+RAW_COLUMNS = ["date", "close", "high", "low", "open", "volume"]   # yfinance's CSV order
+
+
+@dataclass
+class FetchResult:
+    symbol: str
+    status: str         # new | updated | current | rebuilt | missing | failed
+    rows: int = 0       # rows written
+    requests: int = 0   # source calls, retries included
+    error: str = None
+
+
+def _fmt(value: float) -> str:
+    return "" if value != value else repr(float(value))
+
+
+def _rows_csv(df: pd.DataFrame, columns: list) -> str:
+    # What DataFrame.to_csv would write (floats via repr, NaN empty),
+    # without its per-call overhead on a handful of rows
+    cols = {c: df[c].to_numpy() for c in FIELDS}
+    volume = cols["volume"]
+    whole = bool(np.isfinite(volume).all())
+    dates = df.index.strftime("%Y-%m-%d")
+    lines = []
+    for i, date in enumerate(dates):
+        cells = []
+        for col in columns:
+            if col == "date":
+                cells.append(date)
+            elif col == "volume" and whole:
+                cells.append(str(int(volume[i])))
+            else:
+                cells.append(_fmt(cols[col][i]) if col in cols else "")
+        lines.append(",".join(cells) + "\n")
+    return "".join(lines)
+
+
+def _header(path: str) -> list:
+    with open(path) as f:
+        return [c.strip().lower() for c in f.readline().split(",")]
+
+
+def _write(path: str, df: pd.DataFrame, append: bool) -> None:
+    tmp = f"{path}.tmp"
+    if append:
+        shutil.copyfile(path, tmp)
+        with open(tmp, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write(_rows_csv(df, _header(path)).encode())
+    else:
+        with open(tmp, "w") as f:
+            f.write(",".join(RAW_COLUMNS) + "\n" + _rows_csv(df, RAW_COLUMNS))
+    os.replace(tmp, path)
+
+
+class _Client:
+    """Source calls under a shared concurrency limit, with retries."""
+
+    def __init__(self, source, concurrency: int, retries: int, backoff: float):
+        self.source = source
+        self.limit = asyncio.Semaphore(concurrency)
+        self.retries, self.backoff = retries, backoff
+
+    async def fetch(self, result: FetchResult, start: str, end: str) -> pd.DataFrame:
+        async def attempt():
+            result.requests += 1
+            async with self.limit:
+                return await self.source.fetch(result.symbol, start, end)
+        return await with_retries(attempt, self.retries, self.backoff)
+
+
+async def _refresh_one(client: _Client, symbol: str, raw_dir: str, start: str, end: str,
+                       tolerance: float) -> FetchResult:
+    result = FetchResult(symbol, "current")
+    path = symbol_file(symbol, raw_dir)
+    last = read_raw_last(path) if os.path.exists(path) else None
+    try:
+        if last is not None:
+            last_date, last_close = last
+            if last_date.strftime("%Y-%m-%d") >= end:
+                return result
+            df = await client.fetch(result, last_date.strftime("%Y-%m-%d"), end)
+            if last_date in df.index and not np.isclose(df.at[last_date, "close"], last_close,
+                                                        rtol=tolerance, atol=0.0):
+                df = await client.fetch(result, start, end)
+                result.status, result.rows = "rebuilt", len(df)
+                _write(path, df, append=False)
+                return result
+            new = df.loc[df.index > last_date]
+            if len(new):
+                result.status, result.rows = "updated", len(new)
+                _write(path, new, append=True)
+            return result
+
+        df = await client.fetch(result, start, end)
+        if df.empty:
+            result.status = "missing"
+            return result
+        result.status, result.rows = "new", len(df)
+        _write(path, df, append=False)
+    except Exception as exc:
+        result.status, result.error = "failed", f"{type(exc).__name__}: {exc}"
+    return result
+
+
+async def refresh(symbols, source, raw_dir: str = RAW_DIR, start: str = "2010-01-01", end: str = None,
+                  concurrency: int = 8, retries: int = 3, backoff: float = 0.5,
+                  tolerance: float = 1e-6) -> list:
+    """
+    Bring every symbol's raw CSV up to `end` (default today). Returns one
+    FetchResult per symbol, in input order. Closes `source` on the way out.
+    """
+    try:
+        os.makedirs(raw_dir, exist_ok=True)
+        end = end or pd.Timestamp.today().strftime("%Y-%m-%d")
+        client = _Client(source, concurrency, retries, backoff)
+        return await asyncio.gather(*(_refresh_one(client, sym, raw_dir, start, end, tolerance)
+                                      for sym in symbols))
+    finally:
+        await source.close()
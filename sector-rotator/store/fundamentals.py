@@ -0,0 +1,277 @@
+"""
+fundamentals.py
+---------------
+Valuation / quality fields per symbol from a list of sources, behind an
+on-disk cache.
+
+  FIELDS            canonical names (pe, pb, ev_ebitda, ...) and their TTLs
+  YahooSource       yfinance Ticker.info — every field in one request
+  NSESource         nsetools quote, P/E only (the old fallback)
+  HTTPSource        GET {base}/fundamentals/{symbol} → JSON; served
+                    offline by scripts/price_stub_server.py
+
+Sources are tried in order for whatever fields are still missing, each
+paced by its own TokenBucket (no fixed sleeps), with at most
+`concurrency` symbols in flight. Values land in FundamentalsCache with a
+timestamp, so a field is only asked for again once its TTL has run out —
+a nightly run re-fetches prices-driven ratios, not ROE. A field no source
+could provide is cached as None (same TTL); a field every source errored
+on is not cached and is retried next run.
+
+    cache = FundamentalsCache()
+    df = asyncio.run(fetch_fundamentals(symbols, [YahooSource(), NSESource()], cache=cache))
+    cache.save()
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+from store.sources import http_get, with_retries
+
+CACHE_FILE = "data/store/fundamentals.json"
+
+DAY = 86400
+FIELDS = {              # name: TTL in seconds
+    "pe":          DAY,
+    "forward_pe":  DAY,
+    "pb":          DAY,
+    "ps":          DAY,
+    "ev_ebitda":   7 * DAY,
+    "div_yield":   7 * DAY,
+    "market_cap":  DAY,
+    "eps":         30 * DAY,
+    "roe":         30 * DAY,
+    "beta":        30 * DAY,
+}
+
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+class TokenBucket:
+    """`rate` requests per second on average, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate, self.burst = rate, burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:   # waiters queue up in order
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class FundamentalSource(ABC):
+    name = "base"
+    fields = tuple(FIELDS)      # what fetch() can return
+    rate, burst = None, 1       # token bucket; None = unlimited
+
+    def __init__(self):
+        self.bucket = TokenBucket(self.rate, self.burst) if self.rate else None
+        self.requests = 0
+
+    @abstractmethod
+    async def fetch(self, symbol: str, fields: list) -> dict:
+        """{field: value or None} for (at least) the requested fields."""
+
+    async def call(self, symbol: str, fields: list) -> dict:
+        if self.bucket is not None:
+            await self.bucket.acquire()
+        self.requests += 1
+        return await self.fetch(symbol, fields)
+
+
+class YahooSource(FundamentalSource):
+    name = "yahoo"
+    rate, burst = 2.0, 4
+    KEYS = {
+        "pe": "trailingPE",
+        "forward_pe": "forwardPE",
+        "pb": "priceToBook",
+        "ps": "priceToSalesTrailing12Months",
+        "ev_ebitda": "enterpriseToEbitda",
+        "div_yield": "dividendYield",
+        "market_cap": "marketCap",
+        "eps": "trailingEps",
+        "roe": "returnOnEquity",
+        "beta": "beta",
+    }
+    fields = tuple(KEYS)
+
+    def __init__(self):
+        import yfinance  # only needed when this source is used
+        self._yf = yfinance
+        super().__init__()
+
+    async def fetch(self, symbol, fields):
+        info = await asyncio.to_thread(lambda: self._yf.Ticker(symbol).info or {})
+        return {f: _number(info.get(key)) for f, key in self.KEYS.items()}
+
+
+class NSESource(FundamentalSource):
+    name = "nse"
+    rate, burst = 1.0, 1
+    fields = ("pe",)
+
+    def __init__(self):
+        from nsetools import Nse  # only needed when this source is used
+        self._nse = Nse()
+        super().__init__()
+
+    async def fetch(self, symbol, fields):
+        quote = await asyncio.to_thread(self._nse.get_quote, symbol.split(".")[0])
+        return {"pe": _number((quote or {}).get("pe"))}
+
+
+class HTTPSource(FundamentalSource):
+    name = "http"
+
+    def __init__(self, base_url: str = "http://127.0.0.1:8765", timeout: float = 10.0,
+                 rate: float = None, burst: int = 1):
+        self.rate, self.burst = rate, burst
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.prefix = url.path.rstrip("/")
+        self.timeout = timeout
+        super().__init__()
+
+    async def fetch(self, symbol, fields):
+        status, body = await http_get(self.host, self.port, f"{self.prefix}/fundamentals/{symbol}", self.timeout)
+        if status == 404:
+            return {}
+        if status != 200:
+            raise IOError(f"{symbol}: HTTP {status}")
+        return {f: _number(v) for f, v in json.loads(body).items()}
+
+
+SOURCES = {
+    "yahoo": YahooSource,
+    "nse": NSESource,
+    "http": HTTPSource,
+}
+
+
+class FundamentalsCache:
+    """{symbol: {field: [value, fetched_at]}} in one JSON file."""
+
+    def __init__(self, path: str = CACHE_FILE, ttl: dict = None):
+        self.path = path
+        self.ttl = dict(FIELDS, **(ttl or {}))
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def stale(self, symbol: str, fields: list, now: float) -> list:
+        have = self.entries.get(symbol, {})
+        return [f for f in fields if f not in have or now - have[f][1] >= self.ttl.get(f, DAY)]
+
+    def put(self, symbol: str, values: dict, now: float) -> None:
+        entry = self.entries.setdefault(symbol, {})
+        for field, value in values.items():
+            entry[field] = [value, now]
+
+    def frame(self, symbols, fields) -> pd.DataFrame:
+        rows = {sym: {f: self.entries.get(sym, {}).get(f, [None])[0] for f in fields} for sym in symbols}
+        df = pd.DataFrame.from_dict(rows, orient="index", columns=list(fields), dtype="float64")
+        df.index.name = "symbol"
+        return df
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+
+def write_if_changed(frame: pd.DataFrame, path: str) -> bool:
+    """Atomically write frame.to_csv() to path unless it already holds exactly that."""
+    text = frame.to_csv()
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == text:
+                return False
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+    return True
+
+
+def append_history(frame: pd.DataFrame, path: str, date: str = None, columns=("pe",)) -> int:
+    """
+    Append (symbol, date, *columns) rows to a point-in-time history CSV for
+    symbols whose values differ from their last recorded row (the factor
+    panel carries a value forward until the next one). Returns rows added.
+    """
+    date = date or time.strftime("%Y-%m-%d")
+    new = frame[list(columns)].dropna(how="all").rename_axis("symbol").reset_index()
+    new.insert(1, "date", date)
+    if os.path.exists(path):
+        last = pd.read_csv(path, float_precision="round_trip").groupby("symbol").last()[list(columns)]
+        prev = last.reindex(new["symbol"]).values
+        cur = new[list(columns)].values
+        same = ((prev == cur) | (pd.isna(prev) & pd.isna(cur))).all(axis=1)
+        new = new[~same]
+    if not new.empty:
+        new.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+    return len(new)
+
+
+async def _fetch_one(symbol, fields, sources, cache, now, limit, retries, backoff, errors):
+    want = cache.stale(symbol, fields, now)
+    if not want:
+        return
+    async with limit:
+        got, answered = {}, set()
+        for source in sources:
+            ask = [f for f in want if f in source.fields and got.get(f) is None]
+            if not ask:
+                continue
+            try:
+                values = await with_retries(lambda: source.call(symbol, ask), retries, backoff)
+            except Exception as exc:
+                errors.append((symbol, source.name, f"{type(exc).__name__}: {exc}"))
+                continue
+            answered.update(ask)
+            got.update({f: values.get(f) for f in ask if values.get(f) is not None})
+    cache.put(symbol, {f: got.get(f) for f in want if f in answered}, now)
+
+
+async def fetch_fundamentals(symbols, sources, fields=None, cache: FundamentalsCache = None,
+                             concurrency: int = 8, retries: int = 2, backoff: float = 0.5,
+                             errors: list = None) -> pd.DataFrame:
+    """
+    symbol × field frame of every requested field, fetching only what the
+    cache is missing or holds past its TTL. Source failures that survive
+    the retries are appended to `errors` as (symbol, source, message).
+    """
+    fields = list(FIELDS) if fields is None else list(fields)
+    cache = cache if cache is not None else FundamentalsCache(path=None)
+    errors = [] if errors is None else errors
+    limit = asyncio.Semaphore(concurrency)
+    now = time.time()
+    await asyncio.gather(*(_fetch_one(sym, fields, sources, cache, now, limit, retries, backoff, errors)
+                           for sym in symbols))
+    return cache.frame(symbols, fields)
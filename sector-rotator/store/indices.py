@@ -0,0 +1,70 @@
+"""
+indices.py
+----------
+Local cache of the index series the strategy reads but does not trade:
+the sector indices behind the macro filter and the Nifty 50 benchmark of
+analyze_backtests.
+
+Bars live under data/indices/ in data/raw's layout (one yfinance-style
+OHLCV CSV per index, e.g. data/indices/^NSEI.csv) and are written only by
+an explicit fetch — scripts/fetch_indices.py, which goes through
+store/fetch.py and so asks for missing dates only. Reads never touch the
+network, so flags, backtests and analysis run offline against whatever
+was last fetched. The older {SECTOR}_index.csv files (date,<symbol>
+columns) are still read when an index has no OHLCV CSV.
+
+    asyncio.run(fetch_indices(make_source("yfinance")))     # refresh
+    nifty = load_index(BENCHMARK)                           # close, from disk
+    tech = load_index("TECH")                               # by sector
+"""
+
+import os
+
+import pandas as pd
+
+from store.prices import read_raw_csv, symbol_file
+
+INDEX_DIR = "data/indices"
+START_DATE = "2017-01-01"
+SECTOR_INDICES = {"TECH": "^CNXIT", "FMCG": "^CNXFMCG", "BANK": "^NSEBANK"}
+BENCHMARK = "^NSEI"
+
+
+def index_symbols() -> list:
+    """Every cached index: the sector indices, then the benchmark."""
+    return list(SECTOR_INDICES.values()) + [BENCHMARK]
+
+
+async def fetch_indices(source, symbols: list = None, start: str = START_DATE, end: str = None,
+                        index_dir: str = INDEX_DIR, **kwargs) -> list:
+    """store.fetch.refresh into index_dir; the only call that downloads."""
+    from store.fetch import refresh
+    return await refresh(symbols or index_symbols(), source, index_dir, start, end, **kwargs)
+
+
+def _legacy_file(symbol: str, index_dir: str):
+    for sector, sym in SECTOR_INDICES.items():
+        path = os.path.join(index_dir, f"{sector}_index.csv")
+        if sym == symbol and os.path.exists(path):
+            return path
+    return None
+
+
+def load_index(symbol: str, start=None, end=None, index_dir: str = INDEX_DIR) -> pd.Series:
+    """
+    Cached closes of an index symbol (or a SECTOR_INDICES key), sliced to
+    [start, end]. FileNotFoundError when it has never been fetched.
+    """
+    symbol = SECTOR_INDICES.get(symbol, symbol)
+    path = symbol_file(symbol, index_dir)
+    if os.path.exists(path):
+        close = read_raw_csv(path)["close"]
+    else:
+        legacy = _legacy_file(symbol, index_dir)
+        if legacy is None:
+            raise FileNotFoundError(f"{symbol} is not cached under {index_dir}/ "
+                                    f"— run scripts/fetch_indices.py")
+        close = pd.read_csv(legacy, index_col="date", parse_dates=["date"]).iloc[:, 0]
+        close = pd.to_numeric(close, errors="coerce").dropna()
+    close.name = symbol
+    return close.loc[start:end]
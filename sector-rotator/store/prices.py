@@ -0,0 +1,324 @@
+"""
+prices.py
+---------
+Columnar OHLCV panel store built once from data/raw/*.csv.
+
+Layout of data/store/prices/:
+  dates.npy          datetime64[D], union calendar of every symbol
+  <field>.npy        float64 (dates × symbols), one block per OHLCV field,
+                     column-major so each symbol's history is contiguous
+                     (float32 when ingested with dtype="float32")
+  meta.json          symbol order, dtype + size/mtime of every source CSV
+
+Blocks are opened with np.load(mmap_mode="r"), so a stage only pages in
+the columns it touches. Dates a symbol did not trade are NaN. For
+universes whose raw frames do not fit in memory, ingest(stream=True)
+writes the blocks one CSV at a time (store/chunks.py runs the stages
+after it in bounded memory).
+"""
+
+import glob
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from profiling import trace
+
+RAW_DIR   = "data/raw"
+STORE_DIR = "data/store/prices"
+FIELDS    = ["open", "high", "low", "close", "volume"]
+
+
+def store_dir_for(raw_dir: str) -> str:
+    """data/raw → data/store/prices: the store that ingests raw_dir, beside it."""
+    if os.path.normpath(raw_dir) == os.path.normpath(RAW_DIR):
+        return STORE_DIR
+    return os.path.join(os.path.dirname(os.path.normpath(raw_dir)), "store", "prices")
+
+
+def file_symbol(fpath: str) -> str:
+    """data/raw/INFY_NS.csv → INFY.NS"""
+    return os.path.basename(fpath)[:-len(".csv")].replace("_", ".")
+
+
+def symbol_file(symbol: str, raw_dir: str = RAW_DIR) -> str:
+    """INFY.NS → data/raw/INFY_NS.csv"""
+    return os.path.join(raw_dir, f"{symbol.replace('.', '_')}.csv")
+
+
+def read_raw_csv(fpath: str) -> pd.DataFrame:
+    """
+    Parse one yfinance CSV into a clean, date-indexed float frame.
+    Drops the junk ticker row yfinance writes under the header and any
+    row without a close.
+    """
+    with trace.span("read_raw_csv", "io", path=fpath):
+        return _clean_raw(pd.read_csv(fpath))
+
+
+def read_raw_tail(fpath: str, after: str, block: int = 1 << 14) -> pd.DataFrame:
+    """
+    read_raw_csv() restricted to rows dated after `after` (YYYY-MM-DD),
+    reading the file backwards from the end in `block`-byte steps, so the
+    cost depends on how many rows are new, not on the history length.
+    Values parse exactly as in a full read.
+    """
+    with open(fpath, "rb") as f:
+        header = f.readline()
+        body_start = f.tell()
+        pos = f.seek(0, os.SEEK_END)
+        tail, complete = b"", []
+        while pos > body_start:
+            step = min(block, pos - body_start)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+            lines = tail.split(b"\n")
+            complete = lines if pos == body_start else lines[1:]   # first piece may be cut
+            dates = [ln.split(b",", 1)[0].strip().decode() for ln in complete if ln.strip()]
+            if any(d and d[0].isdigit() and d <= after for d in dates):
+                break
+    keep = [ln for ln in complete if ln.strip()]
+    df = pd.read_csv(io.BytesIO(header + b"\n".join(keep) + b"\n"), dtype=str)
+    df = _clean_raw(df)
+    return df.loc[df.index > np.datetime64(after)]
+
+
+def read_raw_last(fpath: str, block: int = 4096):
+    """
+    (date, close) of a raw CSV's last row with a close, or None. Parsed by
+    hand from the file's last block — cheap enough to call per symbol on
+    large universes.
+    """
+    with open(fpath, "rb") as f:
+        header = [c.strip().lower() for c in f.readline().decode().split(",")]
+        if "date" not in header or "close" not in header:
+            return None
+        d, c = header.index("date"), header.index("close")
+        body_start = f.tell()
+        end = f.seek(0, os.SEEK_END)
+        f.seek(max(end - block, body_start))
+        lines = f.read().decode().splitlines()
+    for line in reversed(lines):
+        cells = line.split(",")
+        if len(cells) == len(header) and cells[d][:1].isdigit():
+            try:
+                close = float(cells[c])
+            except ValueError:
+                continue
+            if close == close:
+                return pd.Timestamp(cells[d]), close
+    df = read_raw_csv(fpath)   # no usable row in the last block
+    return (df.index[-1], float(df["close"].iloc[-1])) if len(df) else None
+
+
+def _clean_raw(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = [c.lower() for c in df.columns]
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    for col in FIELDS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        else:
+            df[col] = np.nan
+    df = df.dropna(subset=["date", "close"])
+    df = df.drop_duplicates(subset="date", keep="last").sort_values("date")
+    return df.set_index("date")[FIELDS].astype("float64")
+
+
+def _source_stats(raw_dir: str) -> dict:
+    stats = {}
+    for fpath in sorted(glob.glob(os.path.join(raw_dir, "*.csv"))):
+        st = os.stat(fpath)
+        stats[os.path.basename(fpath)] = [st.st_size, st.st_mtime_ns]
+    return stats
+
+
+def _save_block(path: str, arr: np.ndarray) -> None:
+    tmp = f"{path}.tmp.npy"
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+
+def _ingest_streaming(raw_dir: str, store_dir: str, stats: dict, dtype: str) -> tuple:
+    # Pass 1 reads dates only; pass 2 writes each file's columns into the memmapped blocks
+    dates, symbols = pd.DatetimeIndex([]), {}
+    for fname in stats:
+        index = read_raw_csv(os.path.join(raw_dir, fname)).index
+        if index.empty:
+            print(f"⚠  {fname} has no usable rows, skipping.")
+            continue
+        symbols[file_symbol(fname)] = fname
+        dates = dates.union(index)
+
+    names = sorted(symbols)
+    blocks = {field: np.lib.format.open_memmap(os.path.join(store_dir, f"{field}.tmp.npy"), mode="w+", dtype=dtype,
+                                               shape=(len(dates), len(names)), fortran_order=True)
+              for field in FIELDS}
+    for j, sym in enumerate(names):
+        df = read_raw_csv(os.path.join(raw_dir, symbols[sym]))
+        rows = dates.get_indexer(df.index)
+        for field, block in blocks.items():
+            block[:, j] = np.nan
+            block[rows, j] = df[field].values
+    for field, block in blocks.items():
+        block.flush()
+        os.replace(os.path.join(store_dir, f"{field}.tmp.npy"), os.path.join(store_dir, f"{field}.npy"))
+    return dates, names
+
+
+@trace.traced("ingest", "io")
+def ingest(raw_dir: str = RAW_DIR, store_dir: str = STORE_DIR, dtype: str = "float64",
+           stream: bool = False) -> dict:
+    """
+    Normalize every raw CSV into the columnar store. Returns the meta.
+    stream=True holds one CSV at a time instead of every frame (each file
+    is parsed twice); dtype="float32" stores half-size blocks.
+    """
+    if dtype not in ("float64", "float32"):
+        raise ValueError(f"unknown dtype: {dtype}")
+    os.makedirs(store_dir, exist_ok=True)
+    stats = _source_stats(raw_dir)
+
+    if stream:
+        dates, symbols = _ingest_streaming(raw_dir, store_dir, stats, dtype)
+    else:
+        frames = {}
+        for fname in stats:
+            df = read_raw_csv(os.path.join(raw_dir, fname))
+            if df.empty:
+                print(f"⚠  {fname} has no usable rows, skipping.")
+                continue
+            frames[file_symbol(fname)] = df
+
+        symbols = sorted(frames)
+        dates = pd.DatetimeIndex([])
+        for df in frames.values():
+            dates = dates.union(df.index)
+
+        for field in FIELDS:
+            block = np.full((len(dates), len(symbols)), np.nan, dtype=dtype, order="F")
+            for j, sym in enumerate(symbols):
+                col = frames[sym][field]
+                block[dates.get_indexer(col.index), j] = col.values
+            _save_block(os.path.join(store_dir, f"{field}.npy"), block)
+    _save_block(os.path.join(store_dir, "dates.npy"),
+                dates.values.astype("datetime64[D]"))
+
+    meta = {"symbols": symbols, "fields": FIELDS, "dtype": dtype, "sources": stats}
+    tmp = os.path.join(store_dir, "meta.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(store_dir, "meta.json"))
+    return meta
+
+
+def is_stale(raw_dir: str = RAW_DIR, store_dir: str = STORE_DIR) -> bool:
+    meta_path = os.path.join(store_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return True
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return meta["sources"] != _source_stats(raw_dir)
+
+
+class PricePanel:
+    """
+    Aligned (dates × symbols) OHLCV arrays.
+    Arrays are read-only memmaps (or views of them) wherever possible.
+    """
+
+    def __init__(self, dates, symbols, blocks):
+        self.dates = dates
+        self.symbols = list(symbols)
+        self._blocks = blocks
+        self._col = {s: j for j, s in enumerate(self.symbols)}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def columns(self, symbols) -> list:
+        missing = [s for s in symbols if s not in self._col]
+        if missing:
+            raise KeyError(f"symbols not in price store: {missing}")
+        return [self._col[s] for s in symbols]
+
+    def field(self, name: str, symbols=None) -> np.ndarray:
+        """(dates × symbols) array for one field; a view when the columns are contiguous."""
+        block = self._blocks[name]
+        if symbols is None:
+            return block
+        cols = self.columns(symbols)
+        if cols and cols == list(range(cols[0], cols[0] + len(cols))):
+            return block[:, cols[0]:cols[0] + len(cols)]
+        return block[:, cols]
+
+    def select(self, symbols, how: str = "inner") -> "PricePanel":
+        """
+        Sub-panel for `symbols`. how="inner" keeps only dates on which all
+        of them have a close (what tail-slicing per-symbol CSVs gave us);
+        how="outer" keeps every date on which any of them has one.
+        """
+        symbols = list(symbols)
+        present = ~np.isnan(self.field("close", symbols))
+        rows = present.all(axis=1) if how == "inner" else present.any(axis=1)
+        idx = np.flatnonzero(rows)
+        if len(idx) and idx[-1] - idx[0] + 1 == len(idx):
+            take = slice(idx[0], idx[-1] + 1)
+        else:
+            take = idx
+        blocks = {name: self.field(name, symbols)[take] for name in self._blocks}
+        return PricePanel(self.dates[take], symbols, blocks)
+
+    def slice_dates(self, start=None, end=None) -> "PricePanel":
+        lo = 0 if start is None else np.searchsorted(self.dates, np.datetime64(start, "D"))
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(end, "D"), side="right")
+        blocks = {name: b[lo:hi] for name, b in self._blocks.items()}
+        return PricePanel(self.dates[lo:hi], self.symbols, blocks)
+
+    def frame(self, name: str, symbols=None) -> pd.DataFrame:
+        symbols = self.symbols if symbols is None else list(symbols)
+        return pd.DataFrame(self.field(name, symbols), index=pd.DatetimeIndex(self.dates, name="date"),
+                            columns=symbols, copy=False)
+
+    def ohlcv(self, symbol: str) -> pd.DataFrame:
+        """One symbol's history in the raw-CSV column layout the signal modules expect."""
+        j = self.columns([symbol])[0]
+        rows = ~np.isnan(self._blocks["close"][:, j])
+        df = pd.DataFrame({name: np.asarray(b[rows, j]) for name, b in self._blocks.items()})
+        df.insert(0, "date", pd.DatetimeIndex(self.dates[rows]).strftime("%Y-%m-%d"))
+        return df
+
+
+@trace.traced("load_panel", "io")
+def load_panel(store_dir: str = STORE_DIR, raw_dir: str = RAW_DIR,
+               fields=None, refresh: bool = True) -> PricePanel:
+    """
+    Open the price store, (re)ingesting first if raw CSVs changed.
+    Pass refresh=False to skip the staleness check on huge universes.
+    """
+    meta_path = os.path.join(store_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        ingest(raw_dir, store_dir)
+    elif refresh and is_stale(raw_dir, store_dir):
+        with open(meta_path) as f:
+            dtype = json.load(f).get("dtype", "float64")
+        ingest(raw_dir, store_dir, dtype)     # keep the store's dtype
+    with open(meta_path) as f:
+        meta = json.load(f)
+    fields = meta["fields"] if fields is None else fields
+    blocks = {name: np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode="r") for name in fields}
+    dates = np.load(os.path.join(store_dir, "dates.npy"))
+    return PricePanel(dates, meta["symbols"], blocks)
+
+
+def simple_returns(close: np.ndarray) -> np.ndarray:
+    """Row-wise pct change; first row is NaN like pandas."""
+    close = np.asarray(close, dtype="float64")
+    out = np.empty_like(close)
+    out[0] = np.nan
+    np.divide(close[1:], close[:-1], out=out[1:])
+    out[1:] -= 1.0
+    return out
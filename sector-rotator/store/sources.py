@@ -0,0 +1,164 @@
+"""
+sources.py
+----------
+Where daily bars come from. A PriceSource answers one question —
+"bars for this symbol between these dates" — as a date-indexed float
+frame in the store's FIELDS layout, so the fetcher (store/fetch.py) never
+cares which vendor is behind it.
+
+  YFinanceSource   yfinance.download in a worker thread (auto-adjusted)
+  HTTPSource       plain HTTP/1.1 GET {base}/prices/{symbol}?start=&end=
+                   returning CSV; scripts/price_stub_server.py replays
+                   local CSVs that way, so fetching is testable offline
+
+Both bounds are inclusive dates (YYYY-MM-DD). An unknown symbol gives an
+empty frame; anything else that goes wrong raises and is retried by the
+fetcher.
+
+http_get() and with_retries() are the plain GET and the backoff loop
+behind these, shared with store/fundamentals.py.
+"""
+
+import asyncio
+import random
+from abc import ABC, abstractmethod
+from urllib.parse import urlencode, urlsplit
+
+import pandas as pd
+
+from store.prices import FIELDS, _clean_raw
+
+NAN = float("nan")
+
+
+class PriceSource(ABC):
+    name = "base"
+
+    @abstractmethod
+    async def fetch(self, symbol: str, start: str, end: str) -> pd.DataFrame:
+        """Bars for symbol over [start, end]; empty for an unknown symbol."""
+
+    async def close(self) -> None:
+        """Release whatever the source holds open; store.fetch.refresh() calls it when done."""
+
+
+async def http_get(host: str, port: int, path: str, timeout: float) -> tuple:
+    """One HTTP/1.1 GET (Connection: close) → (status, body bytes); raises on timeout."""
+    async def get():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+            await writer.drain()
+            data = await reader.read()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+        head, _, body = data.partition(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1]) if head else 0
+        return status, body
+
+    return await asyncio.wait_for(get(), timeout)
+
+
+async def with_retries(call, retries: int, backoff: float):
+    """
+    await call() up to retries + 1 times, sleeping backoff · 2^attempt
+    (± 50% jitter) between attempts; the last failure is raised.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await call()
+        except Exception:
+            if attempt == retries:
+                raise
+        await asyncio.sleep(backoff * 2 ** attempt * (0.5 + random.random()))
+
+
+def _empty() -> pd.DataFrame:
+    return pd.DataFrame(columns=FIELDS, index=pd.DatetimeIndex([], name="date"), dtype="float64")
+
+
+class YFinanceSource(PriceSource):
+    name = "yfinance"
+
+    def __init__(self, auto_adjust: bool = True):
+        import yfinance  # only needed when this source is used
+        self._yf = yfinance
+        self.auto_adjust = auto_adjust
+
+    def _download(self, symbol, start, end):
+        stop = (pd.Timestamp(end) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")   # yfinance's end is exclusive
+        df = self._yf.download(symbol, start=start, end=stop, auto_adjust=self.auto_adjust,
+                               progress=False, threads=False)
+        if df is None or df.empty:
+            return _empty()
+        if isinstance(df.columns, pd.MultiIndex):   # (field, ticker) columns on newer yfinance
+            df.columns = df.columns.get_level_values(0)
+        df = df.rename(columns=str.lower).reset_index().rename(columns={"Date": "date", "index": "date"})
+        df["date"] = pd.to_datetime(df["date"]).dt.tz_localize(None)
+        return _clean_raw(df)
+
+    async def fetch(self, symbol, start, end):
+        return await asyncio.to_thread(self._download, symbol, start, end)
+
+
+class HTTPSource(PriceSource):
+    name = "http"
+
+    def __init__(self, base_url: str = "http://127.0.0.1:8765", timeout: float = 10.0):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.prefix = url.path.rstrip("/")
+        self.timeout = timeout
+
+    async def fetch(self, symbol, start, end):
+        path = f"{self.prefix}/prices/{symbol}?{urlencode({'start': start, 'end': end})}"
+        status, body = await http_get(self.host, self.port, path, self.timeout)
+        if status == 404:
+            return _empty()
+        if status != 200:
+            raise IOError(f"{symbol}: HTTP {status}")
+        return _parse_csv(body.decode())
+
+
+def _parse_csv(text: str) -> pd.DataFrame:
+    """
+    Vendor CSV → bar frame. float() is correctly rounded, so writing a
+    value back with repr() reproduces the vendor's text; rows without a
+    date or close are dropped as read_raw_csv() drops them.
+    """
+    header, *lines = text.splitlines()
+    names = [c.strip().lower() for c in header.split(",")]
+    if "date" not in names:
+        raise ValueError(f"no date column in {names}")
+    pos = {f: names.index(f) for f in FIELDS if f in names}
+    dates, rows = [], []
+    for line in lines:
+        cells = line.split(",")
+        if len(cells) != len(names) or not cells[names.index("date")][:1].isdigit():
+            continue
+        row = []
+        for f in FIELDS:
+            try:
+                row.append(float(cells[pos[f]]) if f in pos and cells[pos[f]] else NAN)
+            except ValueError:
+                row.append(NAN)
+        if row[FIELDS.index("close")] == row[FIELDS.index("close")]:
+            dates.append(cells[names.index("date")][:10])
+            rows.append(row)
+    if not rows:
+        return _empty()
+    df = pd.DataFrame(rows, columns=FIELDS, index=pd.DatetimeIndex(dates, name="date"), dtype="float64")
+    return df[~df.index.duplicated(keep="last")].sort_index()
+
+
+SOURCES = {
+    "yfinance": YFinanceSource,
+    "http": HTTPSource,
+}
+
+
+def make_source(name: str, **kwargs) -> PriceSource:
+    if name not in SOURCES:
+        raise ValueError(f"unknown price source: {name} (have {sorted(SOURCES)})")
+    return SOURCES[name](**kwargs)